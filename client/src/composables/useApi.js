@@ -4,8 +4,9 @@ export const api = axios.create({
   baseURL: '/api',
 })
 
-export async function createOrder(data) {
-  const res = await api.post('/orders', data)
+export async function createOrder(data, idempotencyKey = null) {
+  const headers = idempotencyKey ? { 'Idempotency-Key': idempotencyKey } : {}
+  const res = await api.post('/orders', data, { headers })
   return res.data
 }
 
@@ -14,6 +15,16 @@ export async function getOrder(id) {
   return res.data
 }
 
+// Long-poll: resolves once the order's status differs from knownStatus, or
+// with the current status after `timeout` seconds
+export async function waitForOrder(id, knownStatus, timeout = 25) {
+  const res = await api.get(`/orders/${id}/wait`, {
+    params: { known_status: knownStatus, timeout },
+    timeout: (timeout + 10) * 1000,
+  })
+  return res.data
+}
+
 export async function validateCoupon(code) {
   const res = await api.post('/coupons/validate', { code })
   return res.data
@@ -28,3 +39,13 @@ export async function initiateAutopay(orderId) {
   const res = await api.post(`/payments/autopay/initiate/${orderId}`)
   return res.data
 }
+
+export async function getMenuChanges(since) {
+  const res = await api.get('/menu/changes', { params: { since } })
+  return res.data
+}
+
+export async function quoteCart(items, couponCode = null) {
+  const res = await api.post('/cart/quote', { items, coupon_code: couponCode })
+  return res.data
+}
@@ -22,6 +22,23 @@ function calcItemTotal(item) {
   return (item.price + extra) * item.quantity
 }
 
+// The cart as OrderCreate / CartQuoteRequest items
+function orderItems() {
+  return items.value.map(item => ({
+    dish_id: item.dishId,
+    quantity: item.quantity,
+    ingredients: (item.ingredients || []).map(ing => ({
+      name: ing.name,
+      included: ing.included,
+      price: ing.price || 0,
+    })),
+    extras: (item.extras || []).filter(e => e.selected).map(ext => ({
+      name: ext.name,
+      price: ext.price,
+    })),
+  }))
+}
+
 export function useCart() {
   const itemCount = computed(() =>
     items.value.reduce((sum, item) => sum + item.quantity, 0)
@@ -87,6 +104,7 @@ export function useCart() {
     totalPrice,
     meetsMinimum,
     calcItemTotal,
+    orderItems,
     addItem,
     removeItem,
     updateQuantity,
@@ -0,0 +1,70 @@
+import { api } from './useApi'
+
+const RETRY_MIN_MS = 2000
+const RETRY_MAX_MS = 30000
+
+function parseEvent(raw) {
+  let type = 'message'
+  const data = []
+  for (const line of raw.split('\n')) {
+    if (line.startsWith('event:')) type = line.slice(6).trim()
+    else if (line.startsWith('data:')) data.push(line.slice(5).trim())
+  }
+  return { type, data: data.length ? JSON.parse(data.join('\n')) : null }
+}
+
+// Reads a Server-Sent Events stream from the API. fetch() rather than
+// EventSource, so the Authorization header goes along. Reconnects with backoff;
+// onReady fires on every (re)connect once the server has subscribed us — the
+// moment to (re)load current state. Returns a function that closes the stream.
+export function openEventStream(path, { onReady, onEvent }) {
+  const controller = new AbortController()
+  let retryMs = RETRY_MIN_MS
+
+  async function readOnce() {
+    const auth = api.defaults.headers.common['Authorization']
+    const res = await fetch(`${api.defaults.baseURL}${path}`, {
+      headers: { Accept: 'text/event-stream', ...(auth ? { Authorization: auth } : {}) },
+      signal: controller.signal,
+    })
+    if (res.status >= 400 && res.status < 500) return false  // not ours to retry
+    if (!res.ok || !res.body) throw new Error(`HTTP ${res.status}`)
+
+    const reader = res.body.pipeThrough(new TextDecoderStream()).getReader()
+    let buffer = ''
+    for (;;) {
+      const { value, done } = await reader.read()
+      if (done) return true
+      buffer += value
+      let end
+      while ((end = buffer.indexOf('\n\n')) !== -1) {
+        const raw = buffer.slice(0, end)
+        buffer = buffer.slice(end + 2)
+        if (raw.startsWith(':')) continue  // heartbeat
+        const event = parseEvent(raw)
+        if (event.type === 'ready') {
+          retryMs = RETRY_MIN_MS
+          onReady?.()
+        } else {
+          onEvent?.(event.type, event.data)
+        }
+      }
+    }
+  }
+
+  async function run() {
+    while (!controller.signal.aborted) {
+      try {
+        if (!(await readOnce())) return
+      } catch {
+        // network error or server restart — retry below
+      }
+      if (controller.signal.aborted) return
+      await new Promise(resolve => setTimeout(resolve, retryMs))
+      retryMs = Math.min(retryMs * 2, RETRY_MAX_MS)
+    }
+  }
+
+  run()
+  return () => controller.abort()
+}
@@ -1,14 +1,14 @@
 import { ref } from 'vue'
 import { api } from './useApi'
+import { openEventStream } from './useEventStream'
 
 // Module-level singletons so the state survives across component mounts
 const notifications = ref([])  // { id, orderId, status, etaMinutes, message }
-const polling = ref(false)
-let pollTimer = null
+const watching = ref(false)
+let closeStream = null
 let nextId = 1
+const listeners = new Set()
 
-const ACTIVE_STATUSES = new Set(['pending', 'confirmed', 'preparing', 'delivering'])
-const POLL_INTERVAL_MS = 25000
 const LS_KEY = 'order_status_seen'
 
 const statusMessages = {
@@ -27,62 +27,67 @@ function saveSeen(seen) {
   localStorage.setItem(LS_KEY, JSON.stringify(seen))
 }
 
-async function poll() {
+// Records the order's status; notifies if it changed since we last saw it
+function applyStatus(order, seen) {
+  const prev = seen[order.id]
+  const curr = order.status
+  seen[order.id] = curr
+
+  // First time we see this order — just record it, no notification
+  if (prev === undefined || prev === curr) return
+
+  const msgFn = statusMessages[curr]
+  if (msgFn) {
+    notifications.value.push({
+      id: nextId++,
+      orderId: order.id,
+      status: curr,
+      etaMinutes: order.eta_minutes,
+      message: msgFn(order),
+    })
+  }
+}
+
+// Catch up on changes made while the stream was down
+async function refresh() {
   try {
     const res = await api.get('/my-orders')
-    const orders = res.data
     const seen = loadSeen()
-    const updated = { ...seen }
-
-    for (const order of orders) {
-      const prev = seen[order.id]
-      const curr = order.status
-
-      // First time we see this order — just record it, no notification
-      if (prev === undefined) {
-        updated[order.id] = curr
-        continue
-      }
-
-      // Status changed
-      if (prev !== curr) {
-        updated[order.id] = curr
-        const msgFn = statusMessages[curr]
-        if (msgFn) {
-          notifications.value.push({
-            id: nextId++,
-            orderId: order.id,
-            status: curr,
-            etaMinutes: order.eta_minutes,
-            message: msgFn(order),
-          })
-        }
-      }
-    }
-
-    saveSeen(updated)
-
-    // Stop polling once all recent orders are terminal
-    const hasActive = orders.some(o => ACTIVE_STATUSES.has(o.status))
-    if (!hasActive) stopPolling()
+    for (const order of res.data) applyStatus(order, seen)
+    saveSeen(seen)
   } catch {
-    // silent — network error, keep polling
+    // silent — the next reconnect retries
   }
+  listeners.forEach(fn => fn(null))
 }
 
-function startPolling() {
-  if (polling.value) return
-  polling.value = true
-  poll()  // immediate first check
-  pollTimer = setInterval(poll, POLL_INTERVAL_MS)
+function onOrderEvent(type, order) {
+  if (type !== 'order') return
+  const seen = loadSeen()
+  applyStatus(order, seen)
+  saveSeen(seen)
+  listeners.forEach(fn => fn(order))
 }
 
-function stopPolling() {
-  if (pollTimer) {
-    clearInterval(pollTimer)
-    pollTimer = null
+function startWatching() {
+  if (watching.value) return
+  watching.value = true
+  closeStream = openEventStream('/my-orders/events', { onReady: refresh, onEvent: onOrderEvent })
+}
+
+function stopWatching() {
+  if (closeStream) {
+    closeStream()
+    closeStream = null
   }
-  polling.value = false
+  watching.value = false
+}
+
+// fn(order) on each status change of the customer's orders; fn(null) after a
+// reconnect, when anything may have changed. Returns an unsubscribe function.
+function onOrderUpdate(fn) {
+  listeners.add(fn)
+  return () => listeners.delete(fn)
 }
 
 function dismiss(notifId) {
@@ -94,5 +99,5 @@ function dismissAll() {
 }
 
 export function useOrderNotifications() {
-  return { notifications, startPolling, stopPolling, dismiss, dismissAll }
+  return { notifications, startWatching, stopWatching, onOrderUpdate, dismiss, dismissAll }
 }
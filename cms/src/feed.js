@@ -0,0 +1,91 @@
+// Live admin feed over a WebSocket: new orders, status changes, reservations
+// and notifications. One connection shared by every component that listens.
+// Reconnects with backoff and resumes from the last sequence number seen; when
+// the server can't replay what was missed, listeners get a 'reload' event. A gap
+// in the sequence (the server drops events for a slow client) resumes the same way.
+
+const RETRY_MIN_MS = 2000
+const RETRY_MAX_MS = 30000
+const CLOSE_UNAUTHORIZED = 4401
+const CLOSE_FORBIDDEN = 4403
+
+const listeners = new Set()
+let socket = null
+let epoch = null
+let lastSeq = null
+let retryMs = RETRY_MIN_MS
+let retryTimer = null
+
+function emit(type, data) {
+  listeners.forEach(fn => fn(type, data))
+}
+
+function connect() {
+  retryTimer = null
+  const protocol = window.location.protocol === 'https:' ? 'wss' : 'ws'
+  const ws = new WebSocket(`${protocol}://${window.location.host}/api/admin/feed`)
+  socket = ws
+
+  ws.onopen = () => {
+    ws.send(JSON.stringify({
+      token: localStorage.getItem('admin_token'),
+      epoch,
+      seq: lastSeq,
+    }))
+  }
+
+  ws.onmessage = (message) => {
+    const event = JSON.parse(message.data)
+    if (event.type === 'ping') return
+    if (event.type === 'hello') {
+      retryMs = RETRY_MIN_MS
+      if (!event.resumed) {
+        epoch = event.epoch
+        lastSeq = event.seq
+        emit('reload')
+      }
+      return
+    }
+    if (event.seq <= lastSeq) return  // already seen
+    if (event.seq > lastSeq + 1) {
+      // Some were dropped on the way: reconnect to replay them from lastSeq
+      disconnect()
+      connect()
+      return
+    }
+    lastSeq = event.seq
+    emit(event.type, event.data)
+  }
+
+  ws.onclose = (e) => {
+    if (socket !== ws) return  // closed on purpose
+    socket = null
+    if (e.code === CLOSE_UNAUTHORIZED) {
+      localStorage.removeItem('admin_token')
+      window.location.href = '/login'
+      return
+    }
+    if (e.code === CLOSE_FORBIDDEN || !listeners.size) return
+    retryTimer = setTimeout(connect, retryMs)
+    retryMs = Math.min(retryMs * 2, RETRY_MAX_MS)
+  }
+}
+
+function disconnect() {
+  clearTimeout(retryTimer)
+  retryTimer = null
+  const ws = socket
+  socket = null
+  if (ws) ws.close()
+}
+
+// fn(type, data) for every feed event; fn('reload') after (re)connecting when
+// the current state should be fetched again. Returns an unsubscribe function.
+export function onFeedEvent(fn) {
+  listeners.add(fn)
+  if (!socket && !retryTimer) connect()
+  return () => {
+    listeners.delete(fn)
+    if (!listeners.size) disconnect()
+  }
+}
@@ -1,11 +1,15 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy import select
+from datetime import date, datetime, time, timedelta
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from sqlalchemy import and_, false, or_, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
 from admin_schemas import (
     AdminOrderItemResponse,
+    AdminOrderPage,
     AdminOrderResponse,
+    AdminOrderSummary,
     CategoryCreate,
     CategoryResponse,
     CategoryUpdate,
@@ -29,6 +33,7 @@ from admin_schemas import (
     IngredientCreate,
     IngredientResponse,
     NotificationResponse,
+    OrderBulkStatusUpdate,
     OrderStatusUpdate,
     ReservationResponse,
     ReservationUpdate,
@@ -38,8 +43,27 @@ from admin_schemas import (
     TableResponse,
     TableUpdate,
 )
+from admin_serializers import (
+    notification_to_response,
+    order_item_to_response,
+    order_to_response,
+    order_to_summary,
+    reservation_to_response,
+)
 from auth import require_admin
 from database import get_db
+from http_cache import RowValidators, cached_response
+import admin_feed
+import admin_stats
+import coupon_cache
+import coupon_redemption
+import events
+import menu_cache
+import order_archive
+import order_slots
+import sales_rollup
+import site_cache
+import slot_capacity
 from models import (
     Category,
     Coupon,
@@ -51,7 +75,9 @@ from models import (
     Ingredient,
     Notification,
     Order,
+    OrderArchive,
     OrderItem,
+    OrderItemArchive,
     Reservation,
     RestaurantTable,
     SiteSetting,
@@ -146,7 +172,10 @@ async def create_dish(data: DishCreate, db: AsyncSession = Depends(get_db)):
         display_order=data.display_order,
     )
     db.add(dish)
+    await db.flush()
+    await menu_cache.record_change(db, dish.id)
     await db.commit()
+    menu_cache.invalidate()
     return _dish_to_response(await _get_dish_loaded(dish.id, db))
 
 
@@ -155,7 +184,9 @@ async def update_dish(dish_id: int, data: DishUpdate, db: AsyncSession = Depends
     dish = await _get_dish_loaded(dish_id, db)
     for field, value in data.model_dump(exclude_unset=True).items():
         setattr(dish, field, value)
+    await menu_cache.record_change(db, dish_id)
     await db.commit()
+    menu_cache.invalidate()
     return _dish_to_response(await _get_dish_loaded(dish_id, db))
 
 
@@ -163,7 +194,9 @@ async def update_dish(dish_id: int, data: DishUpdate, db: AsyncSession = Depends
 async def delete_dish(dish_id: int, db: AsyncSession = Depends(get_db)):
     dish = await _get_dish_loaded(dish_id, db)
     await db.delete(dish)
+    await menu_cache.record_change(db, dish_id)
     await db.commit()
+    menu_cache.invalidate()
 
 
 # --- Dish ingredients ---
@@ -189,7 +222,9 @@ async def add_dish_ingredient(
         display_order=data.display_order,
     )
     db.add(di)
+    await menu_cache.record_change(db, dish_id)
     await db.commit()
+    menu_cache.invalidate()
     await db.refresh(di)
 
     return DishIngredientResponse(
@@ -217,7 +252,9 @@ async def update_dish_ingredient(
 
     for field, value in data.model_dump(exclude_unset=True).items():
         setattr(di, field, value)
+    await menu_cache.record_change(db, dish_id)
     await db.commit()
+    menu_cache.invalidate()
     await db.refresh(di)
 
     return DishIngredientResponse(
@@ -242,7 +279,9 @@ async def delete_dish_ingredient(
         raise HTTPException(status_code=404, detail="Składnik dania nie znaleziony")
 
     await db.delete(di)
+    await menu_cache.record_change(db, dish_id)
     await db.commit()
+    menu_cache.invalidate()
 
 
 # --- Dish extras ---
@@ -265,7 +304,9 @@ async def add_dish_extra(
         display_order=data.display_order,
     )
     db.add(de)
+    await menu_cache.record_change(db, dish_id)
     await db.commit()
+    menu_cache.invalidate()
     await db.refresh(de)
 
     return DishExtraResponse(
@@ -292,7 +333,9 @@ async def update_dish_extra(
 
     for field, value in data.model_dump(exclude_unset=True).items():
         setattr(de, field, value)
+    await menu_cache.record_change(db, dish_id)
     await db.commit()
+    menu_cache.invalidate()
     await db.refresh(de)
 
     return DishExtraResponse(
@@ -316,7 +359,9 @@ async def delete_dish_extra(
         raise HTTPException(status_code=404, detail="Dodatek dania nie znaleziony")
 
     await db.delete(de)
+    await menu_cache.record_change(db, dish_id)
     await db.commit()
+    menu_cache.invalidate()
 
 
 # --- Categories ---
@@ -342,6 +387,7 @@ async def create_category(data: CategoryCreate, db: AsyncSession = Depends(get_d
     )
     db.add(cat)
     await db.commit()
+    menu_cache.invalidate()
     await db.refresh(cat)
     return CategoryResponse(
         id=cat.id, key=cat.key, label=cat.label,
@@ -360,7 +406,11 @@ async def update_category(
 
     for field, value in data.model_dump(exclude_unset=True).items():
         setattr(cat, field, value)
+    # Menu items carry the category key, so every dish in it changes too
+    dish_ids = await db.execute(select(Dish.id).where(Dish.category_id == cat_id))
+    await menu_cache.record_change(db, *dish_ids.scalars().all())
     await db.commit()
+    menu_cache.invalidate()
     await db.refresh(cat)
     return CategoryResponse(
         id=cat.id, key=cat.key, label=cat.label,
@@ -377,6 +427,7 @@ async def delete_category(cat_id: int, db: AsyncSession = Depends(get_db)):
 
     await db.delete(cat)
     await db.commit()
+    menu_cache.invalidate()
 
 
 # --- Ingredients (master list) ---
@@ -396,6 +447,7 @@ async def create_ingredient(data: IngredientCreate, db: AsyncSession = Depends(g
     ing = Ingredient(name=data.name)
     db.add(ing)
     await db.commit()
+    menu_cache.invalidate()
     await db.refresh(ing)
     return IngredientResponse(id=ing.id, name=ing.name, is_active=ing.is_active)
 
@@ -417,6 +469,7 @@ async def create_extra(data: ExtraCreate, db: AsyncSession = Depends(get_db)):
     ext = Extra(name=data.name)
     db.add(ext)
     await db.commit()
+    menu_cache.invalidate()
     await db.refresh(ext)
     return ExtraResponse(id=ext.id, name=ext.name, is_active=ext.is_active)
 
@@ -424,17 +477,21 @@ async def create_extra(data: ExtraCreate, db: AsyncSession = Depends(get_db)):
 # --- Coupons ---
 
 
+def _coupon_to_response(coupon: Coupon) -> CouponResponse:
+    return CouponResponse(
+        id=coupon.id, code=coupon.code, discount_type=coupon.discount_type,
+        discount_percent=coupon.discount_percent, discount_amount=coupon.discount_amount,
+        is_active=coupon.is_active,
+        max_redemptions=coupon.max_redemptions, max_per_user=coupon.max_per_user,
+        valid_from=coupon.valid_from, valid_until=coupon.valid_until,
+        redemption_count=coupon.redemption_count,
+    )
+
+
 @router.get("/coupons", response_model=list[CouponResponse])
 async def list_coupons(db: AsyncSession = Depends(get_db)):
     result = await db.execute(select(Coupon).order_by(Coupon.created_at.desc()))
-    return [
-        CouponResponse(
-            id=c.id, code=c.code, discount_type=c.discount_type,
-            discount_percent=c.discount_percent, discount_amount=c.discount_amount,
-            is_active=c.is_active,
-        )
-        for c in result.scalars().all()
-    ]
+    return [_coupon_to_response(c) for c in result.scalars().all()]
 
 
 @router.post("/coupons", status_code=201, response_model=CouponResponse)
@@ -445,15 +502,16 @@ async def create_coupon(data: CouponCreate, db: AsyncSession = Depends(get_db)):
         discount_percent=data.discount_percent,
         discount_amount=data.discount_amount,
         is_active=data.is_active,
+        max_redemptions=data.max_redemptions,
+        max_per_user=data.max_per_user,
+        valid_from=data.valid_from,
+        valid_until=data.valid_until,
     )
     db.add(coupon)
     await db.commit()
     await db.refresh(coupon)
-    return CouponResponse(
-        id=coupon.id, code=coupon.code, discount_type=coupon.discount_type,
-        discount_percent=coupon.discount_percent, discount_amount=coupon.discount_amount,
-        is_active=coupon.is_active,
-    )
+    coupon_cache.upsert(coupon)
+    return _coupon_to_response(coupon)
 
 
 @router.patch("/coupons/{coupon_id}", response_model=CouponResponse)
@@ -465,17 +523,15 @@ async def update_coupon(
     if not coupon:
         raise HTTPException(status_code=404, detail="Kupon nie znaleziony")
 
+    old_code = coupon.code
     for field, value in data.model_dump(exclude_unset=True).items():
         if field == "code" and value is not None:
             value = value.upper()
         setattr(coupon, field, value)
     await db.commit()
     await db.refresh(coupon)
-    return CouponResponse(
-        id=coupon.id, code=coupon.code, discount_type=coupon.discount_type,
-        discount_percent=coupon.discount_percent, discount_amount=coupon.discount_amount,
-        is_active=coupon.is_active,
-    )
+    coupon_cache.upsert(coupon, old_code=old_code)
+    return _coupon_to_response(coupon)
 
 
 @router.delete("/coupons/{coupon_id}", status_code=204)
@@ -487,6 +543,7 @@ async def delete_coupon(coupon_id: int, db: AsyncSession = Depends(get_db)):
 
     await db.delete(coupon)
     await db.commit()
+    coupon_cache.discard(coupon.code)
 
 
 # --- Event banners ---
@@ -512,6 +569,7 @@ async def create_event_banner(data: EventBannerCreate, db: AsyncSession = Depend
     )
     db.add(banner)
     await db.commit()
+    site_cache.banners.invalidate()
     await db.refresh(banner)
     return EventBannerResponse(
         id=banner.id, title=banner.title, subtitle=banner.subtitle,
@@ -531,6 +589,7 @@ async def update_event_banner(
     for field, value in data.model_dump(exclude_unset=True).items():
         setattr(banner, field, value)
     await db.commit()
+    site_cache.banners.invalidate()
     await db.refresh(banner)
     return EventBannerResponse(
         id=banner.id, title=banner.title, subtitle=banner.subtitle,
@@ -546,6 +605,7 @@ async def delete_event_banner(banner_id: int, db: AsyncSession = Depends(get_db)
         raise HTTPException(status_code=404, detail="Baner nie znaleziony")
     await db.delete(banner)
     await db.commit()
+    site_cache.banners.invalidate()
 
 
 # --- Site settings ---
@@ -611,62 +671,129 @@ async def delete_table(table_id: int, db: AsyncSession = Depends(get_db)):
     await db.commit()
 
 
+# --- Dashboard ---
+
+
+@router.get("/stats")
+async def get_stats(request: Request, db: AsyncSession = Depends(get_db)):
+    return cached_response(request, await admin_stats.stats.get(db))
+
+
 # --- Orders ---
 
 
-@router.get("/orders", response_model=list[AdminOrderResponse])
+ORDERS_PAGE_SIZE = 50
+ORDERS_PAGE_MAX = 200
+
+
+@router.get("/orders", response_model=AdminOrderPage)
 async def list_orders(
+    request: Request,
+    response: Response,
     status: str | None = None,
+    delivery_mode: str | None = None,
+    payment_method: str | None = None,
+    date_from: date | None = None,
+    date_to: date | None = None,
+    after: int | None = None,
+    limit: int = Query(ORDERS_PAGE_SIZE, ge=1, le=ORDERS_PAGE_MAX),
     db: AsyncSession = Depends(get_db),
 ):
-    query = (
-        select(Order)
-        .options(selectinload(Order.items))
-        .order_by(Order.created_at.desc())
-    )
-    if status:
-        query = query.where(Order.status == status)
-    result = await db.execute(query)
-    return [
-        AdminOrderResponse(
-            id=o.id,
-            status=o.status,
-            delivery_mode=o.delivery_mode,
-            first_name=o.first_name,
-            last_name=o.last_name,
-            phone=o.phone,
-            email=o.email,
-            city=o.city,
-            street=o.street,
-            house_number=o.house_number,
-            apartment=o.apartment,
-            notes=o.notes,
-            payment_method=o.payment_method,
-            coupon_code=o.coupon_code,
-            scheduled_date=o.scheduled_date.isoformat() if o.scheduled_date else None,
-            scheduled_time=o.scheduled_time,
-            eta_minutes=o.eta_minutes,
-            items_total=o.items_total,
-            delivery_fee=o.delivery_fee,
-            discount=o.discount,
-            total=o.total,
-            created_at=o.created_at.isoformat() if o.created_at else "",
-            items=[
-                AdminOrderItemResponse(
-                    id=item.id,
-                    dish_id=item.dish_id,
-                    dish_name=item.dish_name,
-                    base_price=item.base_price,
-                    quantity=item.quantity,
-                    ingredients_snapshot=item.ingredients_snapshot,
-                    extras_snapshot=item.extras_snapshot,
-                    item_total=item.item_total,
-                )
-                for item in o.items
-            ],
+    """
+    Newest first, a page at a time, without items (GET /orders/{id}/items on
+    expand), archived orders included. Pages are keyed on (created_at, id) of
+    the last order of the previous one, so every page is an index range scan
+    of both tables however far back it is.
+    """
+
+    def where(c) -> list:
+        conditions = []
+        if status:
+            conditions.append(c.status == status)
+        if delivery_mode:
+            conditions.append(c.delivery_mode == delivery_mode)
+        if payment_method:
+            conditions.append(c.payment_method == payment_method)
+        if date_from:
+            conditions.append(c.created_at >= datetime.combine(date_from, time.min))
+        if date_to:
+            conditions.append(c.created_at < datetime.combine(date_to + timedelta(days=1), time.min))
+        if after is not None:
+            conditions.append(or_(
+                c.created_at < after_created,
+                and_(c.created_at == after_created, c.id < after),
+            ))
+        return conditions
+
+    # Compared with the stored value rather than one round-tripped through
+    # the cursor, so precision and formatting can't skip or repeat rows
+    cursor = order_archive.order_history(lambda c: [c.id == after])
+    after_created = select(cursor.c.created_at).scalar_subquery()
+    # One extra row tells whether there's a next page
+    orders = order_archive.order_history(where, limit + 1)
+    order_by = (orders.c.created_at.desc(), orders.c.id.desc())
+
+    validators = await RowValidators.load(
+        db, orders.c, order_by=order_by, limit=limit,
+        scope=(status, delivery_mode, payment_method, date_from, date_to, after),
+    )
+    if (not_modified := validators.response_if_current(request, response)) is not None:
+        return not_modified
+    rows = (await db.execute(select(orders).order_by(*order_by).limit(limit + 1))).all()
+    return AdminOrderPage(
+        orders=[order_to_summary(o) for o in rows[:limit]],
+        next_cursor=rows[limit - 1].id if len(rows) > limit else None,
+    )
+
+
+@router.get("/orders/{order_id}/items", response_model=list[AdminOrderItemResponse])
+async def list_order_items(order_id: int, db: AsyncSession = Depends(get_db)):
+    for order_model, item_model in ((Order, OrderItem), (OrderArchive, OrderItemArchive)):
+        result = await db.execute(
+            select(item_model).where(item_model.order_id == order_id).order_by(item_model.id)
         )
-        for o in result.scalars().all()
-    ]
+        items = result.scalars().all()
+        if items or await db.get(order_model, order_id) is not None:
+            return [order_item_to_response(item) for item in items]
+    raise HTTPException(status_code=404, detail="Zamówienie nie znalezione")
+
+
+@router.patch("/orders/bulk", response_model=list[AdminOrderSummary])
+async def update_order_statuses(data: OrderBulkStatusUpdate, db: AsyncSession = Depends(get_db)):
+    """One status (and ETA) for a batch of orders, e.g. the pizzas leaving together."""
+    ids = sorted(set(data.ids))
+    # Locked until the commit, so the old statuses the hooks compare against hold
+    result = await db.execute(
+        select(Order.id, Order.status)
+        .where(Order.id.in_(ids))
+        .order_by(Order.id)
+        .with_for_update()
+    )
+    old_status = dict(result.all())
+    if len(old_status) != len(ids):
+        raise HTTPException(status_code=404, detail="Zamówienie nie znalezione")
+
+    values = {"status": data.status}
+    if data.eta_minutes is not None:
+        values["eta_minutes"] = data.eta_minutes
+    result = await db.execute(
+        update(Order).where(Order.id.in_(ids)).values(values).returning(Order)
+    )
+    orders = sorted(result.scalars().all(), key=lambda o: o.id)
+    # Summed per slot, coupon and day, so each shared row is updated once
+    changed = [(o, old_status[o.id]) for o in orders if o.status != old_status[o.id]]
+    await slot_capacity.statuses_changed(db, changed)
+    await coupon_redemption.statuses_changed(db, changed)
+    await sales_rollup.statuses_changed(db, changed)
+    await db.commit()
+
+    for o, old in changed:
+        order_slots.status_changed(o, old)
+    for o in orders:
+        # Each order has its own watchers
+        events.publish_order(o)
+    admin_feed.order_statuses_changed(orders)
+    return [order_to_summary(o) for o in orders]
 
 
 @router.patch("/orders/{order_id}", response_model=AdminOrderResponse)
@@ -679,47 +806,19 @@ async def update_order_status(
     o = result.scalar_one_or_none()
     if not o:
         raise HTTPException(status_code=404, detail="Zamówienie nie znalezione")
+    old_status = o.status
     o.status = data.status
     if data.eta_minutes is not None:
         o.eta_minutes = data.eta_minutes
+    await slot_capacity.status_changed(db, o, old_status)
+    await coupon_redemption.status_changed(db, o, old_status)
+    await sales_rollup.status_changed(db, o, old_status)
     await db.commit()
     await db.refresh(o)
-    return AdminOrderResponse(
-        id=o.id,
-        status=o.status,
-        delivery_mode=o.delivery_mode,
-        first_name=o.first_name,
-        last_name=o.last_name,
-        phone=o.phone,
-        email=o.email,
-        city=o.city,
-        street=o.street,
-        house_number=o.house_number,
-        apartment=o.apartment,
-        notes=o.notes,
-        payment_method=o.payment_method,
-        coupon_code=o.coupon_code,
-        scheduled_date=o.scheduled_date.isoformat() if o.scheduled_date else None,
-        scheduled_time=o.scheduled_time,
-        items_total=o.items_total,
-        delivery_fee=o.delivery_fee,
-        discount=o.discount,
-        total=o.total,
-        created_at=o.created_at.isoformat() if o.created_at else "",
-        items=[
-            AdminOrderItemResponse(
-                id=item.id,
-                dish_id=item.dish_id,
-                dish_name=item.dish_name,
-                base_price=item.base_price,
-                quantity=item.quantity,
-                ingredients_snapshot=item.ingredients_snapshot,
-                extras_snapshot=item.extras_snapshot,
-                item_total=item.item_total,
-            )
-            for item in o.items
-        ],
-    )
+    order_slots.status_changed(o, old_status)
+    events.publish_order(o)
+    admin_feed.order_status_changed(o)
+    return order_to_response(o)
 
 
 # --- Reservations ---
@@ -740,17 +839,7 @@ async def list_reservations(
     if date_from:
         query = query.where(Reservation.reservation_date >= date_type.fromisoformat(date_from))
     result = await db.execute(query)
-    return [
-        ReservationResponse(
-            id=r.id, table_id=r.table_id, table_label=r.table.label,
-            user_id=r.user_id, guest_name=r.guest_name, guest_phone=r.guest_phone,
-            reservation_date=r.reservation_date.isoformat(),
-            start_time=r.start_time, guests_count=r.guests_count,
-            status=r.status, notes=r.notes,
-            created_at=r.created_at.isoformat() if r.created_at else "",
-        )
-        for r in result.scalars().all()
-    ]
+    return [reservation_to_response(r, r.table.label) for r in result.scalars().all()]
 
 
 @router.patch("/reservations/{res_id}", response_model=ReservationResponse)
@@ -768,14 +857,8 @@ async def update_reservation(
         setattr(r, field, value)
     await db.commit()
     await db.refresh(r)
-    return ReservationResponse(
-        id=r.id, table_id=r.table_id, table_label=r.table.label,
-        user_id=r.user_id, guest_name=r.guest_name, guest_phone=r.guest_phone,
-        reservation_date=r.reservation_date.isoformat(),
-        start_time=r.start_time, guests_count=r.guests_count,
-        status=r.status, notes=r.notes,
-        created_at=r.created_at.isoformat() if r.created_at else "",
-    )
+    admin_feed.reservation_changed(r, r.table.label)
+    return reservation_to_response(r, r.table.label)
 
 
 @router.delete("/reservations/{res_id}", status_code=204)
@@ -786,6 +869,7 @@ async def delete_reservation(res_id: int, db: AsyncSession = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Rezerwacja nie znaleziona")
     await db.delete(r)
     await db.commit()
+    admin_feed.reservation_deleted(res_id)
 
 
 # --- Notifications ---
@@ -795,16 +879,10 @@ async def delete_reservation(res_id: int, db: AsyncSession = Depends(get_db)):
 async def list_notifications(unread_only: bool = False, db: AsyncSession = Depends(get_db)):
     query = select(Notification).order_by(Notification.created_at.desc())
     if unread_only:
-        query = query.where(Notification.is_read.is_(False))
+        # "= false" rather than "IS false", which Postgres can't match to an index
+        query = query.where(Notification.is_read == false())
     result = await db.execute(query)
-    return [
-        NotificationResponse(
-            id=n.id, type=n.type, title=n.title, message=n.message,
-            is_read=n.is_read,
-            created_at=n.created_at.isoformat() if n.created_at else "",
-        )
-        for n in result.scalars().all()
-    ]
+    return [notification_to_response(n) for n in result.scalars().all()]
 
 
 @router.patch("/notifications/{notif_id}")
@@ -813,17 +891,22 @@ async def mark_notification_read(notif_id: int, db: AsyncSession = Depends(get_d
     n = result.scalar_one_or_none()
     if not n:
         raise HTTPException(status_code=404, detail="Powiadomienie nie znalezione")
+    was_unread = not n.is_read
     n.is_read = True
     await db.commit()
+    if was_unread:
+        admin_feed.notifications_read([n])
     return {"ok": True}
 
 
 @router.post("/notifications/read-all")
 async def mark_all_read(db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(Notification).where(Notification.is_read.is_(False)))
-    for n in result.scalars().all():
+    result = await db.execute(select(Notification).where(Notification.is_read == false()))
+    read = result.scalars().all()
+    for n in read:
         n.is_read = True
     await db.commit()
+    admin_feed.notifications_read(read)
     return {"ok": True}
 
 
@@ -839,6 +922,8 @@ async def get_settings(db: AsyncSession = Depends(get_db)):
         reservation_duration=settings.get("reservation_duration", "2"),
         eta_step=settings.get("eta_step", "10"),
         eta_default=settings.get("eta_default", "40"),
+        slot_max_orders=settings.get("slot_max_orders", slot_capacity.LIMIT_SETTINGS["slot_max_orders"]),
+        slot_max_items=settings.get("slot_max_items", slot_capacity.LIMIT_SETTINGS["slot_max_items"]),
     )
 
 
@@ -853,6 +938,8 @@ async def update_settings(data: SettingsUpdate, db: AsyncSession = Depends(get_d
         else:
             db.add(SiteSetting(key=key, value=value))
     await db.commit()
+    site_cache.site_config.invalidate()
+    slot_capacity.invalidate()
 
     result = await db.execute(select(SiteSetting))
     settings = {s.key: s.value for s in result.scalars().all()}
@@ -861,4 +948,6 @@ async def update_settings(data: SettingsUpdate, db: AsyncSession = Depends(get_d
         reservation_duration=settings.get("reservation_duration", "2"),
         eta_step=settings.get("eta_step", "10"),
         eta_default=settings.get("eta_default", "40"),
+        slot_max_orders=settings.get("slot_max_orders", slot_capacity.LIMIT_SETTINGS["slot_max_orders"]),
+        slot_max_items=settings.get("slot_max_items", slot_capacity.LIMIT_SETTINGS["slot_max_items"]),
     )
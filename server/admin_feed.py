@@ -0,0 +1,222 @@
+"""
+Live feed for the CMS over a WebSocket: new orders, reservations, status
+changes and notifications with their unread-count deltas, as they happen.
+
+Every feed event carries a sequence number. The last FEED_BACKLOG events are
+kept in memory so a reconnecting panel can resume where it left off. The client
+opens /api/admin/feed and sends {"token", "epoch", "seq"} as its first message
+(browsers can't set headers on a WebSocket, and a token in the URL ends up in
+access logs). The server answers {"type": "hello", "epoch", "seq", "resumed"}:
+
+* resumed=true — the events after the client's seq follow, then live ones;
+* resumed=false — first connect, a restarted server (new epoch) or a gap
+  longer than the backlog; the client reloads its lists. It is subscribed by
+  then, so nothing published in between is lost.
+
+Like the event bus it is built on, the feed lives in this process only.
+"""
+
+import asyncio
+import os
+import secrets
+from collections import deque
+
+from fastapi import APIRouter, Depends, WebSocket
+from sqlalchemy import inspect
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm.attributes import set_committed_value
+
+from admin_serializers import (
+    notification_to_response,
+    order_to_response,
+    reservation_to_response,
+)
+from auth import decode_token
+from database import get_db
+import events
+from models import Notification, Order, Reservation, User
+
+FEED_BACKLOG = int(os.getenv("ADMIN_FEED_BACKLOG", "500"))
+AUTH_TIMEOUT = 10
+ADMIN_TOPIC = "admin"
+
+# WebSocket close codes (4000-4999 are free for applications)
+CLOSE_UNAUTHORIZED = 4401
+CLOSE_FORBIDDEN = 4403
+
+
+class AdminFeed:
+    def __init__(self, backlog: int = FEED_BACKLOG):
+        # Sequence numbers restart with the process; the epoch tells clients so
+        self.epoch = secrets.token_hex(8)
+        self.seq = 0
+        self._backlog: deque[dict] = deque(maxlen=backlog)
+
+    def publish(self, type: str, data: dict) -> None:
+        self.seq += 1
+        event = {"seq": self.seq, "type": type, "data": data}
+        self._backlog.append(event)
+        events.bus.publish(ADMIN_TOPIC, event)
+
+    def since(self, seq: int) -> list[dict] | None:
+        """The events after *seq*, or None if they're no longer all kept."""
+        if seq > self.seq:
+            return None
+        if seq < self.seq and (not self._backlog or self._backlog[0]["seq"] > seq + 1):
+            return None
+        return [event for event in self._backlog if event["seq"] > seq]
+
+
+feed = AdminFeed()
+
+
+# --- Publishing (after the change is committed) ---
+
+
+def _notification_event(n: Notification) -> dict:
+    return {
+        "notification": notification_to_response(n).model_dump(mode="json"),
+        "unread": {n.type: 1},
+    }
+
+
+def notification_added(n: Notification) -> None:
+    feed.publish("notification.created", _notification_event(n))
+
+
+def notifications_read(read: list[Notification]) -> None:
+    """*read* — the notifications that just went from unread to read."""
+    if not read:
+        return
+    unread: dict[str, int] = {}
+    for n in read:
+        unread[n.type] = unread.get(n.type, 0) - 1
+    feed.publish("notifications.read", {"ids": [n.id for n in read], "unread": unread})
+
+
+def new_order_events(order: Order, notification: Notification) -> list[tuple[str, dict]]:
+    """
+    The feed events for a new order, built while its session still has it
+    loaded, for publish_all() to send once the transaction commits.
+    """
+    if "items" in inspect(order).unloaded:
+        # Built without items: it has none, and loading them would need a query
+        set_committed_value(order, "items", [])
+    return [
+        ("order.created", {"order": order_to_response(order).model_dump(mode="json")}),
+        ("notification.created", _notification_event(notification)),
+    ]
+
+
+def publish_all(pending: list[tuple[str, dict]]) -> None:
+    for type, data in pending:
+        feed.publish(type, data)
+
+
+def order_placed(order: Order, notification: Notification) -> None:
+    publish_all(new_order_events(order, notification))
+
+
+def _order_status(order: Order) -> dict:
+    return {"id": order.id, "status": order.status, "eta_minutes": order.eta_minutes}
+
+
+def order_status_changed(order: Order) -> None:
+    feed.publish("order.status", _order_status(order))
+
+
+def order_statuses_changed(orders: list[Order]) -> None:
+    """A batch change as one event, so the panel updates once."""
+    if orders:
+        feed.publish("orders.status", {"orders": [_order_status(o) for o in orders]})
+
+
+def reservation_placed(r: Reservation, table_label: str, notification: Notification) -> None:
+    feed.publish("reservation.created", {
+        "reservation": reservation_to_response(r, table_label).model_dump(mode="json"),
+    })
+    notification_added(notification)
+
+
+def reservation_changed(r: Reservation, table_label: str) -> None:
+    feed.publish("reservation.updated", {
+        "reservation": reservation_to_response(r, table_label).model_dump(mode="json"),
+    })
+
+
+def reservation_deleted(res_id: int) -> None:
+    feed.publish("reservation.deleted", {"id": res_id})
+
+
+# --- WebSocket ---
+
+router = APIRouter()
+
+
+async def _authenticate(websocket: WebSocket, db: AsyncSession) -> dict | None:
+    """Read the client's first message; close the socket unless it's from an admin."""
+    try:
+        hello = await asyncio.wait_for(websocket.receive_json(), AUTH_TIMEOUT)
+        user_id = decode_token(str(hello["token"]))
+    except Exception:
+        user_id = None
+        hello = None
+    user = await db.get(User, user_id) if user_id else None
+    # The session isn't needed for the rest of the connection
+    await db.close()
+    if user is None:
+        await websocket.close(code=CLOSE_UNAUTHORIZED)
+        return None
+    if user.role != "admin":
+        await websocket.close(code=CLOSE_FORBIDDEN)
+        return None
+    return hello
+
+
+async def _forward(websocket: WebSocket, queue: asyncio.Queue) -> None:
+    while True:
+        try:
+            event = await asyncio.wait_for(queue.get(), events.SSE_HEARTBEAT)
+        except asyncio.TimeoutError:
+            # Keeps proxies from closing an idle connection
+            event = {"type": "ping"}
+        await websocket.send_json(event)
+
+
+async def _wait_closed(websocket: WebSocket) -> None:
+    while (await websocket.receive())["type"] != "websocket.disconnect":
+        pass
+
+
+@router.websocket("/api/admin/feed")
+async def admin_feed_socket(websocket: WebSocket, db: AsyncSession = Depends(get_db)):
+    await websocket.accept()
+    hello = await _authenticate(websocket, db)
+    if hello is None:
+        return
+
+    with events.bus.subscribe(ADMIN_TOPIC) as queue:
+        # Taken right after subscribing, with no await in between, so the
+        # backlog and the queue neither overlap nor leave a gap
+        missed = None
+        if hello.get("epoch") == feed.epoch and isinstance(hello.get("seq"), int):
+            missed = feed.since(hello["seq"])
+        seq = feed.seq
+
+        await websocket.send_json({
+            "type": "hello", "epoch": feed.epoch, "seq": seq, "resumed": missed is not None,
+        })
+        for event in missed or ():
+            await websocket.send_json(event)
+
+        tasks = [
+            asyncio.create_task(_forward(websocket, queue)),
+            asyncio.create_task(_wait_closed(websocket)),
+        ]
+        try:
+            await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in tasks:
+                task.cancel()
+            # Collect the outcome so a failed send (client gone) isn't logged
+            await asyncio.gather(*tasks, return_exceptions=True)
@@ -1,7 +1,10 @@
+from datetime import datetime
 from decimal import Decimal
 from typing import Optional
 
-from pydantic import BaseModel, model_validator
+from pydantic import BaseModel, Field, field_validator, model_validator
+
+from schemas import ExtraSnapshot, IngredientChanges, ingredient_changes
 
 
 # --- Categories ---
@@ -145,12 +148,25 @@ class DishResponse(BaseModel):
 # --- Coupons ---
 
 
+def _local_naive(value: Optional[datetime]) -> Optional[datetime]:
+    # Coupon windows are stored and compared as naive local time
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone().replace(tzinfo=None)
+    return value
+
+
 class CouponCreate(BaseModel):
     code: str
     discount_type: str = "percent"  # percent, fixed
     discount_percent: int = 0
     discount_amount: Optional[Decimal] = None
     is_active: bool = True
+    max_redemptions: Optional[int] = None
+    max_per_user: Optional[int] = None
+    valid_from: Optional[datetime] = None
+    valid_until: Optional[datetime] = None
+
+    _naive_window = field_validator("valid_from", "valid_until")(_local_naive)
 
 
 class CouponUpdate(BaseModel):
@@ -159,6 +175,12 @@ class CouponUpdate(BaseModel):
     discount_percent: Optional[int] = None
     discount_amount: Optional[Decimal] = None
     is_active: Optional[bool] = None
+    max_redemptions: Optional[int] = None
+    max_per_user: Optional[int] = None
+    valid_from: Optional[datetime] = None
+    valid_until: Optional[datetime] = None
+
+    _naive_window = field_validator("valid_from", "valid_until")(_local_naive)
 
 
 class CouponResponse(BaseModel):
@@ -168,6 +190,11 @@ class CouponResponse(BaseModel):
     discount_percent: int
     discount_amount: Optional[Decimal] = None
     is_active: bool
+    max_redemptions: Optional[int] = None
+    max_per_user: Optional[int] = None
+    valid_from: Optional[datetime] = None
+    valid_until: Optional[datetime] = None
+    redemption_count: int = 0
 
 
 # --- Event banners ---
@@ -278,12 +305,14 @@ class AdminOrderItemResponse(BaseModel):
     dish_name: str
     base_price: Decimal
     quantity: int
-    ingredients_snapshot: Optional[str] = None
-    extras_snapshot: Optional[str] = None
+    ingredients_snapshot: Optional[IngredientChanges] = None
+    extras_snapshot: Optional[list[ExtraSnapshot]] = None
     item_total: Decimal
 
+    _changes = field_validator("ingredients_snapshot", mode="before")(ingredient_changes)
+
 
-class AdminOrderResponse(BaseModel):
+class AdminOrderSummary(BaseModel):
     id: int
     status: str
     delivery_mode: str
@@ -306,14 +335,27 @@ class AdminOrderResponse(BaseModel):
     discount: Decimal
     total: Decimal
     created_at: str
+
+
+class AdminOrderResponse(AdminOrderSummary):
     items: list[AdminOrderItemResponse]
 
 
+class AdminOrderPage(BaseModel):
+    orders: list[AdminOrderSummary]
+    # Pass as ?after= for the next page; None on the last one
+    next_cursor: Optional[int] = None
+
+
 class OrderStatusUpdate(BaseModel):
     status: str
     eta_minutes: Optional[int] = None
 
 
+class OrderBulkStatusUpdate(OrderStatusUpdate):
+    ids: list[int] = Field(min_length=1, max_length=200)
+
+
 # --- Site settings ---
 
 
@@ -322,6 +364,8 @@ class SettingsUpdate(BaseModel):
     reservation_duration: Optional[str] = None
     eta_step: Optional[str] = None
     eta_default: Optional[str] = None
+    slot_max_orders: Optional[str] = None
+    slot_max_items: Optional[str] = None
 
 
 class SettingsResponse(BaseModel):
@@ -329,3 +373,5 @@ class SettingsResponse(BaseModel):
     reservation_duration: str
     eta_step: str
     eta_default: str
+    slot_max_orders: str
+    slot_max_items: str
@@ -0,0 +1,85 @@
+"""
+Admin API representations of orders, reservations and notifications, shared by
+the admin endpoints and the CMS live feed.
+"""
+
+from admin_schemas import (
+    AdminOrderItemResponse,
+    AdminOrderResponse,
+    AdminOrderSummary,
+    NotificationResponse,
+    ReservationResponse,
+)
+from models import Notification, Order, OrderItem, OrderItemArchive, Reservation
+
+
+def _order_fields(o) -> dict:
+    # Also takes archived orders and rows of order_archive.order_history()
+    return dict(
+        id=o.id,
+        status=o.status,
+        delivery_mode=o.delivery_mode,
+        first_name=o.first_name,
+        last_name=o.last_name,
+        phone=o.phone,
+        email=o.email,
+        city=o.city,
+        street=o.street,
+        house_number=o.house_number,
+        apartment=o.apartment,
+        notes=o.notes,
+        payment_method=o.payment_method,
+        coupon_code=o.coupon_code,
+        scheduled_date=o.scheduled_date.isoformat() if o.scheduled_date else None,
+        scheduled_time=o.scheduled_time,
+        eta_minutes=o.eta_minutes,
+        items_total=o.items_total,
+        delivery_fee=o.delivery_fee,
+        discount=o.discount,
+        total=o.total,
+        created_at=o.created_at.isoformat() if o.created_at else "",
+    )
+
+
+def order_item_to_response(item: OrderItem | OrderItemArchive) -> AdminOrderItemResponse:
+    return AdminOrderItemResponse(
+        id=item.id,
+        dish_id=item.dish_id,
+        dish_name=item.dish_name,
+        base_price=item.base_price,
+        quantity=item.quantity,
+        ingredients_snapshot=item.ingredients_snapshot,
+        extras_snapshot=item.extras_snapshot,
+        item_total=item.item_total,
+    )
+
+
+def order_to_summary(o) -> AdminOrderSummary:
+    """The order without its items, for lists."""
+    return AdminOrderSummary(**_order_fields(o))
+
+
+def order_to_response(o: Order) -> AdminOrderResponse:
+    return AdminOrderResponse(
+        **_order_fields(o),
+        items=[order_item_to_response(item) for item in o.items],
+    )
+
+
+def reservation_to_response(r: Reservation, table_label: str) -> ReservationResponse:
+    return ReservationResponse(
+        id=r.id, table_id=r.table_id, table_label=table_label,
+        user_id=r.user_id, guest_name=r.guest_name, guest_phone=r.guest_phone,
+        reservation_date=r.reservation_date.isoformat(),
+        start_time=r.start_time, guests_count=r.guests_count,
+        status=r.status, notes=r.notes,
+        created_at=r.created_at.isoformat() if r.created_at else "",
+    )
+
+
+def notification_to_response(n: Notification) -> NotificationResponse:
+    return NotificationResponse(
+        id=n.id, type=n.type, title=n.title, message=n.message,
+        is_read=n.is_read,
+        created_at=n.created_at.isoformat() if n.created_at else "",
+    )
@@ -0,0 +1,62 @@
+"""
+Dashboard figures for the CMS, computed with SQL aggregates and cached for
+ADMIN_STATS_TTL seconds, so opening the dashboard costs a handful of COUNT/SUM
+queries at most and usually nothing.
+"""
+
+import os
+from decimal import Decimal
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from http_cache import PayloadCache
+from models import Category, Coupon, DailySales, Dish, Order, OrderArchive
+import sales_rollup
+
+ADMIN_STATS_TTL = float(os.getenv("ADMIN_STATS_TTL", "15"))
+
+
+def _money(value) -> str:
+    return str(Decimal(str(value or 0)).quantize(Decimal("0.01")))
+
+
+async def _load_stats(db: AsyncSession) -> dict:
+    by_status: dict[str, int] = {}
+    for model in (Order, OrderArchive):
+        result = await db.execute(select(model.status, func.count()).group_by(model.status))
+        for status, count in result.all():
+            by_status[status] = by_status.get(status, 0) + count
+
+    # From the day's rollup row rather than a scan of today's orders
+    today = await db.get(DailySales, await sales_rollup.today(db))
+    orders_today = today.orders if today else 0
+    revenue = today.revenue if today else 0
+    average = revenue / orders_today if orders_today else 0
+
+    dishes, categories, coupons = (await db.execute(select(
+        select(func.count()).select_from(Dish)
+        .where(Dish.is_active.is_(True)).scalar_subquery(),
+        select(func.count()).select_from(Category).scalar_subquery(),
+        select(func.count()).select_from(Coupon)
+        .where(Coupon.is_active.is_(True)).scalar_subquery(),
+    ))).one()
+
+    return {
+        "orders_by_status": by_status,
+        "today": {
+            "orders": orders_today,
+            "revenue": _money(revenue),
+            "average_basket": _money(average),
+        },
+        "active_dishes": dishes,
+        "categories": categories,
+        "active_coupons": coupons,
+    }
+
+
+stats = PayloadCache(_load_stats, ADMIN_STATS_TTL)
+
+
+def reset() -> None:
+    stats.reset()
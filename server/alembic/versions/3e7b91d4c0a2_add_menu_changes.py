@@ -0,0 +1,32 @@
+"""add menu_changes
+
+Revision ID: 3e7b91d4c0a2
+Revises: c98158ee58dd
+Create Date: 2026-10-16 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "3e7b91d4c0a2"
+down_revision: Union[str, None] = "c98158ee58dd"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "menu_changes",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("dish_id", sa.Integer(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), server_default=sa.func.now(), nullable=False),
+    )
+    op.create_index("ix_menu_changes_dish_id", "menu_changes", ["dish_id"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_menu_changes_dish_id", table_name="menu_changes")
+    op.drop_table("menu_changes")
@@ -0,0 +1,49 @@
+"""add coupon usage limits
+
+Revision ID: 5a0d6e2b9f17
+Revises: 3e7b91d4c0a2
+Create Date: 2026-10-16 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "5a0d6e2b9f17"
+down_revision: Union[str, None] = "3e7b91d4c0a2"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("coupons", sa.Column("max_redemptions", sa.Integer(), nullable=True))
+    op.add_column("coupons", sa.Column("max_per_user", sa.Integer(), nullable=True))
+    op.add_column("coupons", sa.Column("valid_from", sa.DateTime(), nullable=True))
+    op.add_column("coupons", sa.Column("valid_until", sa.DateTime(), nullable=True))
+    op.add_column("coupons", sa.Column(
+        "redemption_count", sa.Integer(), nullable=False, server_default="0",
+    ))
+
+    op.create_table(
+        "coupon_usage",
+        sa.Column(
+            "coupon_id", sa.Integer(),
+            sa.ForeignKey("coupons.id", ondelete="CASCADE"), primary_key=True,
+        ),
+        sa.Column(
+            "user_id", sa.Integer(),
+            sa.ForeignKey("users.id", ondelete="CASCADE"), primary_key=True,
+        ),
+        sa.Column("redemptions", sa.Integer(), nullable=False),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("coupon_usage")
+    op.drop_column("coupons", "redemption_count")
+    op.drop_column("coupons", "valid_until")
+    op.drop_column("coupons", "valid_from")
+    op.drop_column("coupons", "max_per_user")
+    op.drop_column("coupons", "max_redemptions")
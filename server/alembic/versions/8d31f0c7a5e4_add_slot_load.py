@@ -0,0 +1,33 @@
+"""add slot_load
+
+Revision ID: 8d31f0c7a5e4
+Revises: 5a0d6e2b9f17
+Create Date: 2026-10-16 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "8d31f0c7a5e4"
+down_revision: Union[str, None] = "5a0d6e2b9f17"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Rows are created on first use from the orders already in the slot,
+    # so existing data needs no backfill
+    op.create_table(
+        "slot_load",
+        sa.Column("scheduled_date", sa.Date(), primary_key=True),
+        sa.Column("scheduled_time", sa.String(5), primary_key=True),
+        sa.Column("orders", sa.Integer(), nullable=False),
+        sa.Column("items", sa.Integer(), nullable=False),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("slot_load")
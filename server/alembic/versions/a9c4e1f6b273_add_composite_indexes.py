@@ -0,0 +1,39 @@
+"""add composite indexes for the hot query shapes
+
+Revision ID: a9c4e1f6b273
+Revises: f2b8d6e1c047
+Create Date: 2026-10-16 21:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+revision: str = "a9c4e1f6b273"
+down_revision: Union[str, None] = "f2b8d6e1c047"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# name -> (table, columns)
+INDEXES = {
+    "ix_orders_status_created_at": ("orders", ["status", "created_at"]),
+    "ix_orders_user_id_status": ("orders", ["user_id", "status"]),
+    "ix_orders_scheduled_date_time": ("orders", ["scheduled_date", "scheduled_time"]),
+    "ix_order_items_order_id": ("order_items", ["order_id"]),
+    "ix_reservations_date_status_table": ("reservations", ["reservation_date", "status", "table_id"]),
+    "ix_reservations_user_id_date": ("reservations", ["user_id", "reservation_date"]),
+    "ix_notifications_is_read_created_at": ("notifications", ["is_read", "created_at"]),
+    # Dashboard counts by status over the archive
+    "ix_orders_archive_status": ("orders_archive", ["status"]),
+}
+
+
+def upgrade() -> None:
+    for name, (table, columns) in INDEXES.items():
+        op.create_index(name, table, columns)
+
+
+def downgrade() -> None:
+    for name, (table, _) in INDEXES.items():
+        op.drop_index(name, table_name=table)
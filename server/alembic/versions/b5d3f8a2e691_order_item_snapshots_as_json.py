@@ -0,0 +1,82 @@
+"""order item snapshots as JSON, changes only
+
+Revision ID: b5d3f8a2e691
+Revises: a9c4e1f6b273
+Create Date: 2026-10-17 09:00:00.000000
+
+"""
+import json
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+revision: str = "b5d3f8a2e691"
+down_revision: Union[str, None] = "a9c4e1f6b273"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TABLES = ("order_items", "order_items_archive")
+COLUMNS = ("ingredients_snapshot", "extras_snapshot")
+BATCH = 1000
+
+
+# Existing rows keep the full ingredient list they were stored with: compacting
+# them would need the dish's defaults at the time of the order, which aren't
+# kept. The API reads both shapes (schemas.ingredient_changes).
+
+
+def upgrade() -> None:
+    if op.get_bind().dialect.name != "postgresql":
+        return  # JSON is text there already
+    for table in TABLES:
+        for column in COLUMNS:
+            op.alter_column(
+                table, column, type_=postgresql.JSONB(),
+                postgresql_using=f"{column}::jsonb",
+            )
+
+
+def _expand(changes: dict) -> list:
+    # Unchanged ingredients weren't stored, so the list holds the changes only
+    listed = [{"name": name, "included": False, "price": 0} for name in changes.get("removed", [])]
+    listed += [
+        {"name": ing["name"], "included": True, "price": float(ing.get("price", 0))}
+        for ing in changes.get("added", [])
+    ]
+    return listed
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    cast = "CAST(:value AS JSONB)" if bind.dialect.name == "postgresql" else ":value"
+    for table in TABLES:
+        # Back to the list shape the old code reads, for items stored as changes
+        last_id = 0
+        while True:
+            rows = bind.execute(sa.text(
+                f"SELECT id, ingredients_snapshot FROM {table} "
+                "WHERE id > :last_id AND ingredients_snapshot IS NOT NULL ORDER BY id LIMIT :batch"
+            ), {"last_id": last_id, "batch": BATCH}).all()
+            if not rows:
+                break
+            updates = []
+            for id_, value in rows:
+                value = json.loads(value) if isinstance(value, str) else value
+                if isinstance(value, dict):
+                    updates.append({"id": id_, "value": json.dumps(_expand(value))})
+            if updates:
+                bind.execute(sa.text(
+                    f"UPDATE {table} SET ingredients_snapshot = {cast} WHERE id = :id"
+                ), updates)
+            last_id = rows[-1][0]
+
+    if bind.dialect.name == "postgresql":
+        for table in TABLES:
+            for column in COLUMNS:
+                op.alter_column(
+                    table, column, type_=sa.Text(),
+                    postgresql_using=f"{column}::text",
+                )
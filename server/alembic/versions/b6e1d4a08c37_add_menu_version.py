@@ -0,0 +1,42 @@
+"""add menu_version
+
+Revision ID: b6e1d4a08c37
+Revises: 8d31f0c7a5e4
+Create Date: 2026-10-16 16:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "b6e1d4a08c37"
+down_revision: Union[str, None] = "8d31f0c7a5e4"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Existing changes keep their id as their version, so clients that have
+    # synced to an id stay in step
+    op.add_column("menu_changes", sa.Column("version", sa.Integer(), nullable=True))
+    op.execute("UPDATE menu_changes SET version = id")
+    op.alter_column("menu_changes", "version", nullable=False)
+    op.create_index("ix_menu_changes_version", "menu_changes", ["version"])
+
+    op.create_table(
+        "menu_version",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("version", sa.Integer(), nullable=False),
+    )
+    op.execute(
+        "INSERT INTO menu_version (id, version) "
+        "SELECT 1, COALESCE(MAX(id), 0) FROM menu_changes"
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("menu_version")
+    op.drop_index("ix_menu_changes_version", table_name="menu_changes")
+    op.drop_column("menu_changes", "version")
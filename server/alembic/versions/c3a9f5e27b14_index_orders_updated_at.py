@@ -0,0 +1,24 @@
+"""index orders.updated_at
+
+Revision ID: c3a9f5e27b14
+Revises: b6e1d4a08c37
+Create Date: 2026-10-16 17:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+revision: str = "c3a9f5e27b14"
+down_revision: Union[str, None] = "b6e1d4a08c37"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index("ix_orders_updated_at", "orders", ["updated_at"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_orders_updated_at", table_name="orders")
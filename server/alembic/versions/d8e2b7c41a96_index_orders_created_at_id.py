@@ -0,0 +1,24 @@
+"""index orders (created_at, id) for the admin order list
+
+Revision ID: d8e2b7c41a96
+Revises: c3a9f5e27b14
+Create Date: 2026-10-16 18:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+revision: str = "d8e2b7c41a96"
+down_revision: Union[str, None] = "c3a9f5e27b14"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index("ix_orders_created_at_id", "orders", ["created_at", "id"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_orders_created_at_id", table_name="orders")
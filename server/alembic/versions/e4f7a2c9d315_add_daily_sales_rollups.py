@@ -0,0 +1,44 @@
+"""add daily sales rollups
+
+Revision ID: e4f7a2c9d315
+Revises: d8e2b7c41a96
+Create Date: 2026-10-16 19:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "e4f7a2c9d315"
+down_revision: Union[str, None] = "d8e2b7c41a96"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Filled for existing orders by `python sales_rollup.py`
+    op.create_table(
+        "daily_sales",
+        sa.Column("day", sa.Date(), primary_key=True),
+        sa.Column("orders", sa.Integer(), nullable=False),
+        sa.Column("completed", sa.Integer(), nullable=False),
+        sa.Column("cancelled", sa.Integer(), nullable=False),
+        sa.Column("revenue", sa.Numeric(), nullable=False),
+        sa.Column("discount", sa.Numeric(), nullable=False),
+        sa.Column("delivery_orders", sa.Integer(), nullable=False),
+        sa.Column("pickup_orders", sa.Integer(), nullable=False),
+    )
+    op.create_table(
+        "daily_dish_sales",
+        sa.Column("day", sa.Date(), primary_key=True),
+        sa.Column("dish_id", sa.Integer(), primary_key=True),
+        sa.Column("quantity", sa.Integer(), nullable=False),
+        sa.Column("revenue", sa.Numeric(), nullable=False),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("daily_dish_sales")
+    op.drop_table("daily_sales")
@@ -0,0 +1,75 @@
+"""add orders_archive and order_items_archive
+
+Revision ID: f2b8d6e1c047
+Revises: e4f7a2c9d315
+Create Date: 2026-10-16 20:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "f2b8d6e1c047"
+down_revision: Union[str, None] = "e4f7a2c9d315"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "orders_archive",
+        sa.Column("id", sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column("user_id", sa.Integer(), nullable=True),
+        sa.Column("status", sa.String(length=20), nullable=False),
+        sa.Column("delivery_mode", sa.String(length=20), nullable=False),
+        sa.Column("first_name", sa.String(length=100), nullable=False),
+        sa.Column("last_name", sa.String(length=100), nullable=True),
+        sa.Column("phone", sa.String(length=20), nullable=False),
+        sa.Column("email", sa.String(length=255), nullable=True),
+        sa.Column("city", sa.String(length=100), nullable=True),
+        sa.Column("street", sa.String(length=200), nullable=True),
+        sa.Column("house_number", sa.String(length=20), nullable=True),
+        sa.Column("apartment", sa.String(length=20), nullable=True),
+        sa.Column("notes", sa.Text(), nullable=True),
+        sa.Column("payment_method", sa.String(length=30), nullable=False),
+        sa.Column("coupon_code", sa.String(length=50), nullable=True),
+        sa.Column("scheduled_date", sa.Date(), nullable=True),
+        sa.Column("scheduled_time", sa.String(length=5), nullable=True),
+        sa.Column("eta_minutes", sa.Integer(), nullable=True),
+        sa.Column("items_total", sa.Numeric(), nullable=False),
+        sa.Column("delivery_fee", sa.Numeric(), nullable=False),
+        sa.Column("discount", sa.Numeric(), nullable=False),
+        sa.Column("total", sa.Numeric(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"], ondelete="SET NULL"),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_orders_archive_created_at_id", "orders_archive", ["created_at", "id"])
+    op.create_index("ix_orders_archive_user_id", "orders_archive", ["user_id"])
+
+    op.create_table(
+        "order_items_archive",
+        sa.Column("id", sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column("order_id", sa.Integer(), nullable=False),
+        sa.Column("dish_id", sa.Integer(), nullable=False),
+        sa.Column("dish_name", sa.String(length=200), nullable=False),
+        sa.Column("base_price", sa.Numeric(), nullable=False),
+        sa.Column("quantity", sa.Integer(), nullable=False),
+        sa.Column("ingredients_snapshot", sa.Text(), nullable=True),
+        sa.Column("extras_snapshot", sa.Text(), nullable=True),
+        sa.Column("item_total", sa.Numeric(), nullable=False),
+        sa.ForeignKeyConstraint(["order_id"], ["orders_archive.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_order_items_archive_order_id", "order_items_archive", ["order_id"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_order_items_archive_order_id", table_name="order_items_archive")
+    op.drop_table("order_items_archive")
+    op.drop_index("ix_orders_archive_user_id", table_name="orders_archive")
+    op.drop_index("ix_orders_archive_created_at_id", table_name="orders_archive")
+    op.drop_table("orders_archive")
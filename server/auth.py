@@ -53,6 +53,11 @@ async def get_current_user(
     return result.scalar_one_or_none()
 
 
+async def get_current_user_id(token: str | None = Depends(oauth2_scheme)) -> int | None:
+    """The caller's user id from their token, without loading the user."""
+    return decode_token(token) if token else None
+
+
 async def require_user(user: User | None = Depends(get_current_user)) -> User:
     if not user:
         raise HTTPException(status_code=401, detail="Wymagane zalogowanie")
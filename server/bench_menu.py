@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Benchmark the menu loaders: the flattened Core loader (menu_cache.load_menu)
+against the selectinload ORM loader it replaced (menu_cache.load_menu_orm).
+
+For each menu size it reports SQL round trips, median wall time and peak
+Python memory (tracemalloc) of one full menu load.
+
+Usage (from server/ with the venv activated):
+    python bench_menu.py                       # in-memory SQLite, 16/500/5000 dishes
+    python bench_menu.py --sizes 16 500 --repeat 20
+    python bench_menu.py --url postgresql+asyncpg://.../scratch_db
+
+--url must point at a SCRATCH database: all tables are created and dropped.
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+import tracemalloc
+from decimal import Decimal
+
+from sqlalchemy import event, insert
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from menu_cache import load_menu, load_menu_orm
+from models import Base, Category, Dish, DishExtra, DishIngredient, Extra, Ingredient
+
+# Roughly the shape of the real menu (see seed.py): ~5 ingredients, ~3 extras per dish
+INGREDIENTS_PER_DISH = 5
+EXTRAS_PER_DISH = 3
+
+
+async def _seed(engine, n_dishes: int) -> None:
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+
+        await conn.execute(insert(Category), [
+            {"id": i + 1, "key": f"cat{i}", "label": f"Kategoria {i}", "display_order": i}
+            for i in range(4)
+        ])
+        await conn.execute(insert(Ingredient), [
+            {"id": i + 1, "name": f"Składnik {i}"} for i in range(40)
+        ])
+        await conn.execute(insert(Extra), [
+            {"id": i + 1, "name": f"Dodatek {i}"} for i in range(20)
+        ])
+        await conn.execute(insert(Dish), [
+            {
+                "id": d + 1,
+                "name": f"Danie {d}",
+                "category_id": d % 4 + 1,
+                "base_price": Decimal("28") + d % 20,
+                "image_url": f"https://images.unsplash.com/photo-{d}?w=600",
+                "display_order": d,
+            }
+            for d in range(n_dishes)
+        ])
+        await conn.execute(insert(DishIngredient), [
+            {
+                "dish_id": d + 1,
+                "ingredient_id": (d + i) % 40 + 1,
+                "is_included_by_default": i < 3,
+                "additional_price": Decimal("0") if i < 3 else Decimal("4"),
+                "display_order": i,
+            }
+            for d in range(n_dishes) for i in range(INGREDIENTS_PER_DISH)
+        ])
+        await conn.execute(insert(DishExtra), [
+            {
+                "dish_id": d + 1,
+                "extra_id": (d + e) % 20 + 1,
+                "price": Decimal("3") + e,
+                "display_order": e,
+            }
+            for d in range(n_dishes) for e in range(EXTRAS_PER_DISH)
+        ])
+
+
+async def _measure(session_factory, loader, counter: list[int], repeat: int) -> dict:
+    times = []
+    for _ in range(repeat):
+        async with session_factory() as db:
+            start = time.perf_counter()
+            await loader(db)
+            times.append(time.perf_counter() - start)
+
+    # Round trips and memory from one separate, untimed run
+    async with session_factory() as db:
+        counter[0] = 0
+        tracemalloc.start()
+        await loader(db)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        round_trips = counter[0]
+
+    return {
+        "round_trips": round_trips,
+        "median_ms": statistics.median(times) * 1000,
+        "peak_kib": peak / 1024,
+    }
+
+
+async def main(url: str, sizes: list[int], repeat: int) -> None:
+    engine = create_async_engine(url, echo=False)
+    session_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    counter = [0]
+
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def _count(*_args):
+        counter[0] += 1
+
+    loaders = [("selectinload ORM", load_menu_orm), ("flattened Core", load_menu)]
+
+    print(f"{'dishes':>7}  {'loader':<17} {'round trips':>11} {'median ms':>10} {'peak KiB':>9}")
+    for n in sizes:
+        await _seed(engine, n)
+        async with session_factory() as db:
+            menu, _ = await load_menu(db)
+            assert menu == await load_menu_orm(db), "loaders disagree"
+        for label, loader in loaders:
+            r = await _measure(session_factory, loader, counter, repeat)
+            print(
+                f"{n:>7}  {label:<17} {r['round_trips']:>11} "
+                f"{r['median_ms']:>10.2f} {r['peak_kib']:>9.0f}"
+            )
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--url", default="sqlite+aiosqlite:///:memory:")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[16, 500, 5000])
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+    asyncio.run(main(args.url, args.sizes, args.repeat))
@@ -14,6 +14,13 @@ from models import (
 from auth import hash_password, create_access_token
 from database import get_db
 from main import app
+import admin_stats
+import coupon_cache
+import idempotency
+import menu_cache
+import order_slots
+import site_cache
+import slot_capacity
 
 
 TEST_DB_URL = "sqlite+aiosqlite:///:memory:"
@@ -30,6 +37,23 @@ async def db_engine():
     await engine.dispose()
 
 
+@pytest.fixture
+async def file_db_engine(tmp_path):
+    """
+    A file database instead of the shared in-memory one, so concurrent
+    requests run in their own connections and transactions. Test modules
+    that need it override db_engine with this.
+    """
+    engine = create_async_engine(
+        f"sqlite+aiosqlite:///{tmp_path / 'test.db'}",
+        pool_size=20, pool_timeout=60, connect_args={"timeout": 60},
+    )
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield engine
+    await engine.dispose()
+
+
 @pytest.fixture
 async def db_session(db_engine):
     session_factory = async_sessionmaker(
@@ -50,10 +74,24 @@ async def client(db_engine):
             yield session
 
     app.dependency_overrides[get_db] = override_get_db
+    menu_cache.reset()
+    order_slots.reset()
+    admin_stats.reset()
+    coupon_cache.reset()
+    site_cache.reset()
+    slot_capacity.invalidate()
+    idempotency.orders.clear()
     transport = ASGITransport(app=app)
     async with AsyncClient(transport=transport, base_url="http://test") as c:
         yield c
     app.dependency_overrides.clear()
+    menu_cache.reset()
+    order_slots.reset()
+    admin_stats.reset()
+    coupon_cache.reset()
+    site_cache.reset()
+    slot_capacity.invalidate()
+    idempotency.orders.clear()
 
 
 @pytest.fixture
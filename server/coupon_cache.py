@@ -0,0 +1,123 @@
+"""
+In-memory registry of active coupons, keyed by normalized (upper-case) code.
+
+The cart calls /api/coupons/validate on every keystroke debounce during promo
+campaigns, and create_order prices the discount on every checkout — both now
+look the code up here instead of running a SELECT per call.
+
+The registry is loaded at startup (and lazily, if a request gets there first).
+The admin coupon endpoints keep it in sync with upsert()/discard() after
+committing. As with the menu snapshot it lives in this process only, so it is
+also reloaded every COUPON_CACHE_TTL seconds (default 60) to pick up edits
+made through other workers.
+"""
+
+import asyncio
+import os
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from decimal import Decimal
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import Coupon
+
+COUPON_CACHE_TTL = float(os.getenv("COUPON_CACHE_TTL", "60"))
+
+
+@dataclass(frozen=True)
+class CouponInfo:
+    id: int
+    code: str
+    discount_type: str
+    discount_percent: int
+    discount_amount: Decimal | None
+    max_redemptions: int | None = None
+    max_per_user: int | None = None
+    valid_from: datetime | None = None
+    valid_until: datetime | None = None
+
+    @classmethod
+    def from_model(cls, coupon: Coupon) -> "CouponInfo":
+        return cls(
+            id=coupon.id,
+            code=coupon.code,
+            discount_type=coupon.discount_type,
+            discount_percent=coupon.discount_percent,
+            discount_amount=coupon.discount_amount,
+            max_redemptions=coupon.max_redemptions,
+            max_per_user=coupon.max_per_user,
+            valid_from=coupon.valid_from,
+            valid_until=coupon.valid_until,
+        )
+
+
+_coupons: dict[str, CouponInfo] | None = None
+_loaded_at = 0.0
+_generation = 0
+_lock = asyncio.Lock()
+
+
+def normalize(code: str) -> str:
+    return code.upper()
+
+
+def reset() -> None:
+    """Forget all cached state (tests run each case on a fresh database)."""
+    global _coupons, _generation, _lock
+    _coupons = None
+    _generation += 1
+    _lock = asyncio.Lock()
+
+
+def upsert(coupon: Coupon, old_code: str | None = None) -> None:
+    """Mirror a committed create/update; *old_code* is the code before a rename."""
+    global _generation
+    _generation += 1
+    if _coupons is None:
+        return  # not loaded yet — the first lookup reads it from the DB
+    if old_code:
+        _coupons.pop(normalize(old_code), None)
+    if coupon.is_active:
+        _coupons[normalize(coupon.code)] = CouponInfo.from_model(coupon)
+    else:
+        _coupons.pop(normalize(coupon.code), None)
+
+
+def discard(code: str) -> None:
+    """Mirror a committed delete."""
+    global _generation
+    _generation += 1
+    if _coupons is not None:
+        _coupons.pop(normalize(code), None)
+
+
+async def load(db: AsyncSession) -> None:
+    global _coupons, _loaded_at
+    async with _lock:
+        generation = _generation
+        result = await db.execute(select(Coupon).where(Coupon.is_active.is_(True)))
+        coupons = {normalize(c.code): CouponInfo.from_model(c) for c in result.scalars().all()}
+        # An admin change landed while we were reading — keep the in-place
+        # state instead (or stay unloaded, and let the next lookup retry).
+        if generation == _generation:
+            _coupons = coupons
+            _loaded_at = time.monotonic()
+
+
+async def lookup(db: AsyncSession, code: str | None) -> CouponInfo | None:
+    """Active coupon for *code*, or None."""
+    if not code:
+        return None
+    if _coupons is None or time.monotonic() - _loaded_at >= COUPON_CACHE_TTL:
+        await load(db)
+    if _coupons is None:
+        # Lost a race with an admin edit while loading — fall back to the DB
+        result = await db.execute(
+            select(Coupon).where(Coupon.code == normalize(code), Coupon.is_active.is_(True))
+        )
+        coupon = result.scalar_one_or_none()
+        return CouponInfo.from_model(coupon) if coupon else None
+    return _coupons.get(normalize(code))
@@ -0,0 +1,177 @@
+"""
+Coupon usage limits — validity windows, a per-user cap and a global cap
+("first 500 orders").
+
+Windows and the log-in requirement of per-user coupons are checked against the
+in-memory registry (coupon_cache), so /api/coupons/validate still needs no
+query. The caps are claimed at checkout, inside the order's transaction, by
+conditional UPDATE ... RETURNING statements:
+
+    UPDATE coupons SET redemption_count = redemption_count + 1
+    WHERE id = :id AND redemption_count < max_redemptions
+    RETURNING redemption_count
+
+There is no read-then-write, so concurrent checkouts cannot overshoot the cap.
+create_order claims as its last statement before COMMIT, so the coupon row lock
+is held for a single round trip. Coupons without max_redemptions skip the
+counter entirely, so a hot unlimited code takes no lock at all.
+
+Cancelling an order gives its use back (and un-cancelling takes it again,
+ignoring the caps, since that is a staff decision), in the same transaction as
+the status change.
+"""
+
+from datetime import datetime
+
+from fastapi import HTTPException
+from sqlalchemy import case, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from coupon_cache import CouponInfo, normalize
+from models import Coupon, CouponUsage, Order
+
+
+def unusable_reason(
+    coupon: CouponInfo, logged_in: bool, now: datetime | None = None,
+) -> str | None:
+    """Why *coupon* can't be applied right now, or None if it can."""
+    now = now or datetime.now()
+    if coupon.valid_from and now < coupon.valid_from:
+        return "Kod rabatowy nie jest jeszcze aktywny"
+    if coupon.valid_until and now >= coupon.valid_until:
+        return "Kod rabatowy wygasł"
+    if coupon.max_per_user and not logged_in:
+        return "Zaloguj się, aby użyć tego kodu rabatowego"
+    return None
+
+
+async def redeem(db: AsyncSession, coupon: CouponInfo, user_id: int | None) -> None:
+    """
+    Claim one use of *coupon* in the current transaction, or raise 409.
+    Call it right before committing the order.
+    """
+    if coupon.max_per_user and not await _claim_for_user(db, coupon, user_id):
+        raise HTTPException(
+            status_code=409,
+            detail="Wykorzystano już limit użyć tego kodu rabatowego",
+        )
+
+    if coupon.max_redemptions is None:
+        return
+    result = await db.execute(
+        update(Coupon)
+        .where(
+            Coupon.id == coupon.id,
+            Coupon.is_active.is_(True),
+            or_(
+                Coupon.max_redemptions.is_(None),
+                Coupon.redemption_count < Coupon.max_redemptions,
+            ),
+        )
+        # Not an admin edit — leave updated_at alone
+        .values(redemption_count=Coupon.redemption_count + 1, updated_at=Coupon.updated_at)
+        .returning(Coupon.redemption_count)
+        .execution_options(synchronize_session=False)
+    )
+    if result.first() is None:
+        raise HTTPException(
+            status_code=409,
+            detail="Limit użyć kodu rabatowego został wyczerpany",
+        )
+
+
+async def _claim_for_user(db: AsyncSession, coupon: CouponInfo, user_id: int) -> bool:
+    claim = (
+        update(CouponUsage)
+        .where(
+            CouponUsage.coupon_id == coupon.id,
+            CouponUsage.user_id == user_id,
+            CouponUsage.redemptions < coupon.max_per_user,
+        )
+        .values(redemptions=CouponUsage.redemptions + 1)
+        .returning(CouponUsage.redemptions)
+        .execution_options(synchronize_session=False)
+    )
+    if (await db.execute(claim)).first() is not None:
+        return True
+
+    # First use by this customer — or the row exists and is at the limit
+    try:
+        async with db.begin_nested():
+            db.add(CouponUsage(coupon_id=coupon.id, user_id=user_id, redemptions=1))
+        return True
+    except IntegrityError:
+        # A concurrent first use won the insert; try the conditional update again
+        return (await db.execute(claim)).first() is not None
+
+
+async def status_changed(db: AsyncSession, order: Order, old_status: str) -> None:
+    """Give back or take again the order's coupon use when it is (un)cancelled, before committing."""
+    await statuses_changed(db, [(order, old_status)])
+
+
+def _at_least_zero(value):
+    # redeem() only counts coupons that have the cap; this keeps a cap added
+    # after the order from going negative
+    return case((value < 0, 0), else_=value)
+
+
+async def statuses_changed(db: AsyncSession, changes: list[tuple[Order, str]]) -> None:
+    """
+    status_changed() for (order, old status) pairs: the uses given back or
+    taken again are summed per coupon and per customer, so each row is
+    updated once however many orders of the batch used it.
+    """
+    coupons: dict[str, int] = {}
+    users: dict[tuple[str, int], int] = {}
+    for order, old_status in changes:
+        if not order.coupon_code or not order.discount:
+            continue  # no coupon was applied
+        was_counted = old_status != "cancelled"
+        is_counted = order.status != "cancelled"
+        if was_counted == is_counted:
+            continue
+        delta = 1 if is_counted else -1
+        code = normalize(order.coupon_code)
+        coupons[code] = coupons.get(code, 0) + delta
+        if order.user_id:
+            users[(code, order.user_id)] = users.get((code, order.user_id), 0) + delta
+    coupons = {code: delta for code, delta in coupons.items() if delta}
+    users = {key: delta for key, delta in users.items() if delta}
+    if not coupons and not users:
+        return
+
+    result = await db.execute(
+        select(Coupon.code, Coupon.id, Coupon.max_redemptions, Coupon.max_per_user)
+        .where(Coupon.code.in_(set(coupons) | {code for code, _ in users}))
+    )
+    found = {coupon.code: coupon for coupon in result.all()}
+
+    for code, delta in sorted(coupons.items()):
+        coupon = found.get(code)
+        if coupon is None or coupon.max_redemptions is None:
+            continue
+        await db.execute(
+            update(Coupon)
+            .where(Coupon.id == coupon.id)
+            .values(
+                redemption_count=_at_least_zero(Coupon.redemption_count + delta),
+                updated_at=Coupon.updated_at,
+            )
+            .execution_options(synchronize_session=False)
+        )
+
+    for (code, user_id), delta in sorted(users.items()):
+        coupon = found.get(code)
+        if coupon is None:
+            continue
+        usage = await db.execute(
+            update(CouponUsage)
+            .where(CouponUsage.coupon_id == coupon.id, CouponUsage.user_id == user_id)
+            .values(redemptions=_at_least_zero(CouponUsage.redemptions + delta))
+            .returning(CouponUsage.redemptions)
+            .execution_options(synchronize_session=False)
+        )
+        if usage.first() is None and delta > 0 and coupon.max_per_user:
+            db.add(CouponUsage(coupon_id=coupon.id, user_id=user_id, redemptions=delta))
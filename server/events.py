@@ -0,0 +1,115 @@
+"""
+In-process event bus, and the Server-Sent Events streams built on it.
+
+Order status changes (admin panel, AutoPay ITN) are published to the bus and
+pushed to customers' open streams, instead of every open tab polling its
+orders. Each stream starts with a "ready" event once it is subscribed.
+Clients load the current state at that point, so nothing published in
+between is missed, even across reconnects.
+
+Every subscriber has its own bounded queue. One that falls behind loses its
+oldest events rather than blocking publishers.
+
+The bus lives in this process only — behind several workers, a change made
+through one worker reaches only the streams held by that worker.
+"""
+
+import asyncio
+import json
+import os
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import AsyncIterator, Iterator
+
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+
+from models import Order
+
+SSE_HEARTBEAT = float(os.getenv("SSE_HEARTBEAT", "15"))
+QUEUE_SIZE = 100
+
+
+class EventBus:
+    def __init__(self, queue_size: int = QUEUE_SIZE):
+        self._queue_size = queue_size
+        self._subscribers: dict[str, set[asyncio.Queue]] = defaultdict(set)
+
+    @contextmanager
+    def subscribe(self, *topics: str) -> Iterator[asyncio.Queue]:
+        queue: asyncio.Queue = asyncio.Queue(self._queue_size)
+        for topic in topics:
+            self._subscribers[topic].add(queue)
+        try:
+            yield queue
+        finally:
+            for topic in topics:
+                subscribers = self._subscribers.get(topic)
+                if subscribers is not None:
+                    subscribers.discard(queue)
+                    if not subscribers:
+                        del self._subscribers[topic]
+
+    def publish(self, topic: str, event: dict) -> None:
+        for queue in self._subscribers.get(topic, ()):
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(event)
+
+    def subscriber_count(self, topic: str) -> int:
+        return len(self._subscribers.get(topic, ()))
+
+
+bus = EventBus()
+
+
+def order_topic(order_id: int) -> str:
+    return f"order:{order_id}"
+
+
+def user_topic(user_id: int) -> str:
+    return f"user:{user_id}"
+
+
+def order_event(order: Order) -> dict:
+    return {
+        "type": "order",
+        "id": order.id,
+        "status": order.status,
+        "eta_minutes": order.eta_minutes,
+    }
+
+
+def publish_order(order: Order) -> None:
+    """Tell the order's watchers (and its owner) about its current status."""
+    event = order_event(order)
+    bus.publish(order_topic(order.id), event)
+    if order.user_id:
+        bus.publish(user_topic(order.user_id), event)
+
+
+def _format(event: dict) -> str:
+    return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+
+async def stream(request: Request, *topics: str) -> AsyncIterator[str]:
+    with bus.subscribe(*topics) as queue:
+        yield _format({"type": "ready"})
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), SSE_HEARTBEAT)
+            except asyncio.TimeoutError:
+                if await request.is_disconnected():
+                    return
+                # Keeps proxies from closing an idle connection
+                yield ": ping\n\n"
+                continue
+            yield _format(event)
+
+
+def sse_response(request: Request, *topics: str) -> StreamingResponse:
+    return StreamingResponse(
+        stream(request, *topics),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,254 @@
+"""
+Pre-serialized JSON payloads with ETag revalidation and precompressed variants.
+
+Public endpoints whose data rarely changes keep the encoded response body, its
+content hash and gzip/brotli variants next to the cached data, so a request
+costs neither a jsonable_encoder pass, a json.dumps nor a compression run, and a
+client that already has the current version gets an empty 304.
+
+Brotli is optional — install the `brotli` package to enable it; without it only
+gzip variants are kept.
+
+Per-customer and admin order reads can't be pre-serialized, but they can be
+revalidated without loading a row: RowValidators derives an ETag and
+Last-Modified from one count(*)/max(updated_at) query over the same filter the
+endpoint would load, and a current client gets a 304 without the SELECT of
+orders and items.
+"""
+
+import asyncio
+import gzip
+import hashlib
+import json
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Awaitable, Callable
+
+from fastapi import Request, Response
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+# Browsers must revalidate before reusing the body — which, with the ETag, is a
+# cheap 304 — so an admin edit shows up on the next page load.
+CACHE_CONTROL = "no-cache"
+
+# For per-user and admin data: revalidate every time, never share
+PRIVATE_CACHE_CONTROL = "private, no-cache"
+
+# Suffixes that make the ETag differ per content-coding, as RFC 9110 requires
+# for strong validators. Matching ignores them: all variants share one source.
+_ETAG_SUFFIX = {"br": "-br", "gzip": "-gz", None: ""}
+
+
+@dataclass(frozen=True)
+class CachedPayload:
+    body: bytes
+    etag: str
+    gzip: bytes | None = None
+    br: bytes | None = None
+
+    @classmethod
+    def from_obj(cls, obj) -> "CachedPayload":
+        # Same encoding as FastAPI's JSONResponse
+        body = json.dumps(
+            obj, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":"),
+        ).encode("utf-8")
+        gz = gzip.compress(body, compresslevel=9, mtime=0)
+        br = brotli.compress(body, quality=11) if brotli is not None else None
+        return cls(
+            body=body,
+            etag=f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"',
+            # Tiny bodies can grow when compressed — only keep real savings
+            gzip=gz if len(gz) < len(body) else None,
+            br=br if br is not None and len(br) < len(body) else None,
+        )
+
+    def variant(self, encoding: str | None) -> bytes:
+        if encoding == "br":
+            return self.br
+        if encoding == "gzip":
+            return self.gzip
+        return self.body
+
+
+def _etag_for(payload: CachedPayload, encoding: str | None) -> str:
+    return f'{payload.etag[:-1]}{_ETAG_SUFFIX[encoding]}"'
+
+
+def _etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    base = etag.strip('"')
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return True
+        # Weak comparison (RFC 9110 §13.1.2) — proxies may weaken our tag
+        tag = candidate.removeprefix("W/").strip('"')
+        if tag.partition("-")[0] == base:
+            return True
+    return False
+
+
+def _pick_encoding(accept_encoding: str | None, payload: CachedPayload) -> str | None:
+    """Best stored content-coding the client accepts, or None for identity."""
+    if not accept_encoding:
+        return None
+    weights = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[coding.strip().lower()] = q
+
+    best, best_q = None, 0.0
+    for coding in ("br", "gzip"):  # br first so it wins ties
+        if payload.variant(coding) is None:
+            continue
+        q = weights.get(coding, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+def cached_response(
+    request: Request, payload: CachedPayload, extra_headers: dict[str, str] | None = None,
+) -> Response:
+    """Serve *payload* in the best accepted encoding, or 304 if the client's copy is current."""
+    encoding = _pick_encoding(request.headers.get("accept-encoding"), payload)
+    headers = {
+        "ETag": _etag_for(payload, encoding),
+        "Cache-Control": CACHE_CONTROL,
+        "Vary": "Accept-Encoding",
+        **(extra_headers or {}),
+    }
+    if _etag_matches(request.headers.get("if-none-match"), payload.etag):
+        return Response(status_code=304, headers=headers)
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(content=payload.variant(encoding), media_type="application/json", headers=headers)
+
+
+@dataclass(frozen=True)
+class RowValidators:
+    """ETag and Last-Modified of a set of rows with an updated_at column."""
+
+    count: int
+    etag: str
+    last_modified: datetime | None
+
+    @classmethod
+    async def load(
+        cls, db: AsyncSession, model, *where,
+        scope: object = None, order_by=(), limit: int | None = None,
+    ) -> "RowValidators":
+        """
+        Validators for the rows of *model* matching *where* — for a page, the
+        same *order_by* and *limit* as the endpoint's query. The count and the
+        sum of ids catch rows joining or leaving the set; *scope* keeps results
+        that share a URL apart (one customer's orders from another's).
+        """
+        rows = (
+            select(model.id, model.updated_at)
+            .where(*where).order_by(*order_by).limit(limit)
+            .subquery()
+        )
+        count, last_modified, ids = (await db.execute(
+            select(func.count(), func.max(rows.c.updated_at), func.sum(rows.c.id))
+        )).one()
+        stamp = last_modified.isoformat() if last_modified else ""
+        digest = hashlib.blake2b(
+            f"{scope}|{count}|{ids}|{stamp}".encode(), digest_size=16,
+        ).hexdigest()
+        return cls(count=count, etag=f'"{digest}"', last_modified=last_modified)
+
+    def headers(self) -> dict[str, str]:
+        headers = {"ETag": f"W/{self.etag}", "Cache-Control": PRIVATE_CACHE_CONTROL}
+        if self.last_modified:
+            headers["Last-Modified"] = format_datetime(self._last_modified_utc(), usegmt=True)
+        return headers
+
+    def _last_modified_utc(self) -> datetime:
+        # updated_at is naive, from the database's clock, which runs on UTC
+        if self.last_modified.tzinfo is None:
+            return self.last_modified.replace(tzinfo=timezone.utc)
+        return self.last_modified.astimezone(timezone.utc)
+
+    def not_modified(self, request: Request) -> bool:
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match is not None:
+            # If-None-Match takes precedence over If-Modified-Since (RFC 9110 §13.2.2)
+            return _etag_matches(if_none_match, self.etag)
+        if_modified_since = request.headers.get("if-modified-since")
+        if not if_modified_since or not self.last_modified:
+            return False
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            return False
+        # HTTP dates have whole seconds, so the echoed Last-Modified must match
+        return self._last_modified_utc().replace(microsecond=0) <= since
+
+    def response_if_current(self, request: Request, response: Response) -> Response | None:
+        """A 304 if the client's copy is current; otherwise set the validators on *response*."""
+        if self.not_modified(request):
+            return Response(status_code=304, headers=self.headers())
+        response.headers.update(self.headers())
+        return None
+
+
+class PayloadCache:
+    """
+    A single public payload built by *loader* and kept until invalidate() or
+    until *ttl* seconds pass (the backstop for other worker processes).
+    """
+
+    def __init__(self, loader: Callable[[AsyncSession], Awaitable[object]], ttl: float):
+        self._loader = loader
+        self._ttl = ttl
+        self._payload: CachedPayload | None = None
+        self._built_at = 0.0
+        self._generation = 0
+        self._lock = asyncio.Lock()
+
+    def invalidate(self) -> None:
+        self._generation += 1
+        self._payload = None
+
+    def reset(self) -> None:
+        self.invalidate()
+        self._lock = asyncio.Lock()
+
+    def _fresh(self) -> CachedPayload | None:
+        if self._payload is not None and time.monotonic() - self._built_at < self._ttl:
+            return self._payload
+        return None
+
+    async def get(self, db: AsyncSession) -> CachedPayload:
+        payload = self._fresh()
+        if payload is not None:
+            return payload
+        async with self._lock:
+            payload = self._fresh()
+            if payload is not None:
+                return payload
+            generation = self._generation
+            payload = CachedPayload.from_obj(await self._loader(db))
+            if generation == self._generation:
+                self._payload = payload
+                self._built_at = time.monotonic()
+            return payload
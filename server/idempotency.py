@@ -0,0 +1,92 @@
+"""
+Idempotency-Key support for POST endpoints that must not run twice.
+
+A retried submit from a flaky mobile connection carries the same key, so the
+store hands back the first attempt's response instead of repricing, inserting
+and pushing to staff again. Entries expire after IDEMPOTENCY_TTL seconds and
+the store keeps at most IDEMPOTENCY_MAX_KEYS of them, oldest evicted first.
+
+A concurrent duplicate (the retry arrives while the first request is still
+running) waits for the first one to finish. A failed attempt stores nothing,
+so the client may retry it with the same key.
+
+The store lives in this process only — behind several workers a retry that
+lands on another worker is not deduplicated.
+"""
+
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, TypeVar
+
+from fastapi import HTTPException
+
+IDEMPOTENCY_TTL = float(os.getenv("IDEMPOTENCY_TTL", str(24 * 3600)))
+IDEMPOTENCY_MAX_KEYS = int(os.getenv("IDEMPOTENCY_MAX_KEYS", "10000"))
+MAX_KEY_LENGTH = 255
+
+T = TypeVar("T")
+
+
+class IdempotencyStore:
+    def __init__(self, ttl: float, max_keys: int):
+        self._ttl = ttl
+        self._max_keys = max_keys
+        # key -> (expires_at, fingerprint, value); insertion order == expiry order
+        self._entries: OrderedDict[str, tuple[float, str, object]] = OrderedDict()
+        self._inflight: dict[str, asyncio.Future] = {}
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._inflight.clear()
+
+    def _evict(self, now: float) -> None:
+        while self._entries:
+            key, (expires_at, _, _) = next(iter(self._entries.items()))
+            if expires_at > now and len(self._entries) <= self._max_keys:
+                break
+            del self._entries[key]
+
+    def _lookup(self, key: str, fingerprint: str) -> tuple[bool, object]:
+        self._evict(time.monotonic())
+        entry = self._entries.get(key)
+        if entry is None:
+            return False, None
+        if entry[1] != fingerprint:
+            raise HTTPException(
+                status_code=422,
+                detail="Klucz Idempotency-Key został już użyty dla innego zamówienia",
+            )
+        return True, entry[2]
+
+    async def run(
+        self, key: str, fingerprint: str, fn: Callable[[], Awaitable[T]],
+    ) -> tuple[T, bool]:
+        """
+        Run *fn* once per *key*. Returns (value, replayed) — replayed is True
+        when the value comes from an earlier request with the same key.
+        """
+        while True:
+            found, value = self._lookup(key, fingerprint)
+            if found:
+                return value, True
+            pending = self._inflight.get(key)
+            if pending is None:
+                break
+            # Resolves when the first attempt finishes, successful or not
+            await asyncio.shield(pending)
+
+        done = asyncio.get_running_loop().create_future()
+        self._inflight[key] = done
+        try:
+            value = await fn()
+            self._entries[key] = (time.monotonic() + self._ttl, fingerprint, value)
+            self._evict(time.monotonic())
+            return value, False
+        finally:
+            self._inflight.pop(key, None)
+            done.set_result(None)
+
+
+orders = IdempotencyStore(IDEMPOTENCY_TTL, IDEMPOTENCY_MAX_KEYS)
@@ -1,13 +1,14 @@
-import json
+import asyncio
+import hashlib
 from contextlib import asynccontextmanager
 from datetime import date, datetime, timedelta
 from decimal import Decimal
 
 from base64 import b64decode
 
-from fastapi import BackgroundTasks, FastAPI, Depends, HTTPException, Request, Response
+from fastapi import BackgroundTasks, FastAPI, Depends, Header, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy import func, select
+from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
@@ -23,28 +24,45 @@ from autopay import (
 from auth import (
     create_access_token,
     get_current_user,
+    get_current_user_id,
     hash_password,
     require_admin,
     require_user,
     verify_password,
 )
 from push import VAPID_PUBLIC_KEY, push_to_all_bg
-from database import engine, get_db
+import coupon_cache
+import coupon_redemption
+import events
+from http_cache import RowValidators, cached_response
+import idempotency
+import menu_cache
+import order_intake
+import order_slots
+from pricing import coupon_discount, price_items
+import sales_rollup
+import site_cache
+import slot_capacity
+from database import async_session, engine, get_db
 from admin import router as admin_router
+import admin_feed
 from models import (
-    Category, Coupon, Dish, DishExtra, DishIngredient, EventBanner, Notification,
-    Order, OrderItem, PushSubscription, Reservation, RestaurantTable, SiteSetting, User, UserAddress,
+    Notification,
+    Order, OrderArchive, OrderItem, PushSubscription, Reservation, RestaurantTable, SiteSetting, User, UserAddress,
 )
 from schemas import (
     AddressCreate,
     AddressResponse,
     AddressUpdate,
+    CartQuoteRequest,
+    CartQuoteResponse,
     CouponValidateRequest,
     CouponValidateResponse,
     LoginRequest,
     OrderCreate,
     OrderItemResponse,
     OrderResponse,
+    QuoteLineResponse,
     RegisterRequest,
     TokenResponse,
     UserResponse,
@@ -52,11 +70,19 @@ from schemas import (
 )
 
 MIN_ORDER = Decimal("50")
+LONG_POLL_TIMEOUT = 25
+LONG_POLL_MAX = 60
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    async with async_session() as db:
+        await coupon_cache.load(db)
+        await order_slots.rebuild(db)
+    if order_intake.INTAKE_MODE == "batched":
+        order_intake.start(async_session)
     yield
+    await order_intake.stop()
     await engine.dispose()
 
 
@@ -71,6 +97,7 @@ app.add_middleware(
 )
 
 app.include_router(admin_router)
+app.include_router(admin_feed.router)
 
 
 # --- Auth endpoints ---
@@ -247,72 +274,59 @@ async def delete_address(
 
 
 @app.get("/api/menu")
-async def get_menu(db: AsyncSession = Depends(get_db)):
-    result = await db.execute(
-        select(Dish)
-        .where(Dish.is_active.is_(True))
-        .options(
-            selectinload(Dish.category),
-            selectinload(Dish.dish_ingredients).selectinload(
-                DishIngredient.ingredient
-            ),
-            selectinload(Dish.dish_extras).selectinload(
-                DishExtra.extra
-            ),
-        )
-        .order_by(Dish.category_id, Dish.display_order)
+async def get_menu(request: Request, db: AsyncSession = Depends(get_db)):
+    snapshot = await menu_cache.get_snapshot(db)
+    return cached_response(
+        request, snapshot.menu_payload, {"X-Menu-Version": str(snapshot.version)},
     )
-    dishes = result.scalars().all()
 
-    return [
-        {
-            "id": d.id,
-            "name": d.name,
-            "category": d.category.key,
-            "price": float(d.base_price),
-            "originalPrice": float(d.original_price) if d.original_price else None,
-            "image": d.image_url,
-            "dailySpecial": d.is_daily_special,
-            "ingredients": [
-                {
-                    "name": di.ingredient.name,
-                    "included": di.is_included_by_default,
-                    **({"price": float(di.additional_price)} if di.additional_price else {}),
-                }
-                for di in sorted(d.dish_ingredients, key=lambda x: x.display_order)
-            ],
-            "extras": [
-                {
-                    "name": de.extra.name,
-                    "price": float(de.price),
-                }
-                for de in sorted(d.dish_extras, key=lambda x: x.display_order)
-            ],
-        }
-        for d in dishes
-    ]
+
+@app.get("/api/menu/changes")
+async def get_menu_changes(since: int, db: AsyncSession = Depends(get_db)):
+    """Dishes added/changed/removed since the X-Menu-Version a client last saw."""
+    return await menu_cache.get_changes(db, since)
 
 
 @app.get("/api/categories")
-async def get_categories(db: AsyncSession = Depends(get_db)):
-    result = await db.execute(
-        select(Category)
-        .where(Category.is_active.is_(True))
-        .order_by(Category.display_order)
-    )
-    return [
-        {"key": c.key, "label": c.label}
-        for c in result.scalars().all()
-    ]
+async def get_categories(request: Request, db: AsyncSession = Depends(get_db)):
+    snapshot = await menu_cache.get_snapshot(db)
+    return cached_response(request, snapshot.categories_payload)
 
 
 @app.post("/api/orders", status_code=201, response_model=OrderResponse)
 async def create_order(
     data: OrderCreate,
     background_tasks: BackgroundTasks,
+    response: Response,
     db: AsyncSession = Depends(get_db),
     user: User | None = Depends(get_current_user),
+    idempotency_key: str | None = Header(default=None),
 ):
+    if not idempotency_key:
+        return await _create_order(data, background_tasks, db, user)
+
+    if len(idempotency_key) > idempotency.MAX_KEY_LENGTH:
+        raise HTTPException(status_code=400, detail="Nieprawidłowy nagłówek Idempotency-Key")
+
+    # Scope keys per customer so one account can't replay another's order
+    scope = f"user:{user.id}" if user else "guest"
+    fingerprint = hashlib.sha256(data.model_dump_json().encode()).hexdigest()
+    order, replayed = await idempotency.orders.run(
+        f"{scope}:{idempotency_key}",
+        fingerprint,
+        lambda: _create_order(data, background_tasks, db, user),
+    )
+    if replayed:
+        response.headers["Idempotent-Replayed"] = "true"
+    return order
+
+
+async def _create_order(
+    data: OrderCreate,
+    background_tasks: BackgroundTasks,
+    db: AsyncSession,
+    user: User | None,
+) -> OrderResponse:
     if not data.items:
         raise HTTPException(status_code=400, detail="Zamówienie musi zawierać przynajmniej jedną pozycję")
 
@@ -320,68 +334,9 @@ async def create_order(
         if not data.city or not data.street or not data.house_number:
             raise HTTPException(status_code=400, detail="Adres dostawy jest wymagany")
 
-    # Fetch all referenced dishes
-    dish_ids = [item.dish_id for item in data.items]
-    result = await db.execute(
-        select(Dish)
-        .where(Dish.id.in_(dish_ids), Dish.is_active.is_(True))
-        .options(
-            selectinload(Dish.dish_ingredients).selectinload(DishIngredient.ingredient),
-            selectinload(Dish.dish_extras).selectinload(DishExtra.extra),
-        )
-    )
-    dishes_by_id = {d.id: d for d in result.scalars().all()}
-
-    # Verify all dishes exist and are active
-    for item in data.items:
-        if item.dish_id not in dishes_by_id:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Danie o ID {item.dish_id} nie istnieje lub jest nieaktywne",
-            )
-
-    # Server-side price calculation
-    items_total = Decimal("0")
-    order_items = []
-
-    for item_data in data.items:
-        dish = dishes_by_id[item_data.dish_id]
-        unit_price = dish.base_price
-
-        # Add price for included (toggled-on) ingredients that have additional_price
-        for ing_snap in item_data.ingredients:
-            if ing_snap.included and ing_snap.price > 0:
-                # Verify this ingredient exists on the dish
-                for di in dish.dish_ingredients:
-                    if di.ingredient.name == ing_snap.name and di.additional_price:
-                        unit_price += di.additional_price
-                        break
-
-        # Add price for selected extras
-        for ext_snap in item_data.extras:
-            for de in dish.dish_extras:
-                if de.extra.name == ext_snap.name:
-                    unit_price += de.price
-                    break
-
-        line_total = unit_price * item_data.quantity
-        items_total += line_total
-
-        order_items.append(
-            OrderItem(
-                dish_id=dish.id,
-                dish_name=dish.name,
-                base_price=dish.base_price,
-                quantity=item_data.quantity,
-                ingredients_snapshot=json.dumps(
-                    [ing.model_dump(mode="json") for ing in item_data.ingredients]
-                ) if item_data.ingredients else None,
-                extras_snapshot=json.dumps(
-                    [ext.model_dump(mode="json") for ext in item_data.extras]
-                ) if item_data.extras else None,
-                item_total=line_total,
-            )
-        )
+    # Server-side price calculation against the cached menu snapshot
+    snapshot = await menu_cache.get_snapshot(db)
+    lines, items_total = price_items(data.items, snapshot.pricing)
 
     if items_total < MIN_ORDER:
         raise HTTPException(
@@ -390,19 +345,12 @@ async def create_order(
         )
 
     # Coupon discount
-    discount = Decimal("0")
-    if data.coupon_code:
-        coupon_result = await db.execute(
-            select(Coupon).where(
-                Coupon.code == data.coupon_code.upper(), Coupon.is_active.is_(True)
-            )
-        )
-        coupon = coupon_result.scalar_one_or_none()
-        if coupon:
-            if coupon.discount_type == "fixed" and coupon.discount_amount:
-                discount = min(coupon.discount_amount, items_total)
-            else:
-                discount = (items_total * Decimal(str(coupon.discount_percent)) / Decimal("100")).quantize(Decimal("1"))
+    coupon = await coupon_cache.lookup(db, data.coupon_code)
+    if coupon:
+        reason = coupon_redemption.unusable_reason(coupon, logged_in=user is not None)
+        if reason:
+            raise HTTPException(status_code=400, detail=reason)
+    discount = coupon_discount(coupon, items_total)
 
     total = items_total - discount
 
@@ -412,45 +360,68 @@ async def create_order(
             scheduled_date = date.fromisoformat(data.scheduled_date)
         except ValueError:
             raise HTTPException(status_code=400, detail="Nieprawidłowy format daty")
+    scheduled = scheduled_date is not None and data.scheduled_time is not None
+    limits = await slot_capacity.get_limits(db) if scheduled else None
+
+    def build_order() -> Order:
+        return Order(
+            user_id=user.id if user else None,
+            status="pending",
+            delivery_mode=data.delivery_mode,
+            first_name=data.first_name,
+            last_name=data.last_name,
+            phone=data.phone,
+            email=data.email,
+            city=data.city,
+            street=data.street,
+            house_number=data.house_number,
+            apartment=data.apartment,
+            notes=data.notes,
+            payment_method=data.payment_method,
+            coupon_code=data.coupon_code,
+            scheduled_date=scheduled_date,
+            scheduled_time=data.scheduled_time,
+            items_total=items_total,
+            delivery_fee=Decimal("0"),
+            discount=discount,
+            total=total,
+            items=[
+                OrderItem(
+                    dish_id=line.dish_id,
+                    dish_name=line.dish_name,
+                    base_price=line.base_price,
+                    quantity=line.quantity,
+                    ingredients_snapshot=line.ingredient_changes,
+                    extras_snapshot=line.extras,
+                    item_total=line.line_total,
+                )
+                for line in lines
+            ],
+        )
 
-    order = Order(
-        user_id=user.id if user else None,
-        status="pending",
-        delivery_mode=data.delivery_mode,
-        first_name=data.first_name,
-        last_name=data.last_name,
-        phone=data.phone,
-        email=data.email,
-        city=data.city,
-        street=data.street,
-        house_number=data.house_number,
-        apartment=data.apartment,
-        notes=data.notes,
-        payment_method=data.payment_method,
-        coupon_code=data.coupon_code,
-        scheduled_date=scheduled_date,
-        scheduled_time=data.scheduled_time,
-        items_total=items_total,
-        delivery_fee=Decimal("0"),
-        discount=discount,
-        total=total,
-        items=order_items,
-    )
-
-    db.add(order)
-    await db.commit()
-    await db.refresh(order, attribute_names=["items"])
+    # Shared rows, touched last before COMMIT so their locks are held briefly;
+    # the conditional slot and coupon claims come after the rollup's counters
+    async def finalize(session: AsyncSession, order: Order) -> None:
+        await sales_rollup.order_placed(session, order)
+        if scheduled:
+            await slot_capacity.book(session, order, limits)
+        if coupon:
+            await coupon_redemption.redeem(session, coupon, order.user_id)
 
-    # TODO: For remote payment methods (blik, card-online, transfer), this notification
-    # should be created only after successful payment confirmation, not at order creation time.
-    # For local payment methods (cash, card-delivery), immediate notification is correct.
-    notification = Notification(
-        type="order",
-        title=f"Nowe zamówienie #{order.id}",
-        message=f"{order.first_name} — {order.delivery_mode}, {order.total} zł, płatność: {order.payment_method}",
-    )
-    db.add(notification)
-    await db.commit()
+    if order_intake.writer is not None:
+        order = await order_intake.writer.submit(build_order, finalize)
+    else:
+        # One transaction: the flush's INSERT ... RETURNING hands back the order
+        # and item ids, so the notification can be added without a refresh
+        order = build_order()
+        db.add(order)
+        await db.flush()
+        notification = order_intake.new_order_notification(order)
+        db.add(notification)
+        await finalize(db, order)
+        await db.commit()
+        admin_feed.order_placed(order, notification)
+    order_slots.order_placed(order)
 
     background_tasks.add_task(push_to_all_bg, {
         "type": "order",
@@ -464,11 +435,22 @@ async def create_order(
 
 
 @app.get("/api/orders/{order_id}", response_model=OrderResponse)
-async def get_order(order_id: int, db: AsyncSession = Depends(get_db)):
+async def get_order(
+    order_id: int, request: Request, response: Response, db: AsyncSession = Depends(get_db),
+):
+    # Old finished orders have been moved to the archive
+    for model in (Order, OrderArchive):
+        validators = await RowValidators.load(db, model, model.id == order_id)
+        if validators.count:
+            break
+    else:
+        raise HTTPException(status_code=404, detail="Zamówienie nie znalezione")
+    if (not_modified := validators.response_if_current(request, response)) is not None:
+        return not_modified
     result = await db.execute(
-        select(Order)
-        .where(Order.id == order_id)
-        .options(selectinload(Order.items))
+        select(model)
+        .where(model.id == order_id)
+        .options(selectinload(model.items))
     )
     order = result.scalar_one_or_none()
     if not order:
@@ -478,25 +460,121 @@ async def get_order(order_id: int, db: AsyncSession = Depends(get_db)):
 
 @app.get("/api/my-orders", response_model=list[OrderResponse])
 async def get_my_orders(
+    request: Request,
+    response: Response,
     user: User = Depends(require_user),
     db: AsyncSession = Depends(get_db),
 ):
     active_statuses = ("pending", "confirmed", "preparing", "delivering")
+    where = (Order.user_id == user.id, Order.status.in_(active_statuses))
+    validators = await RowValidators.load(db, Order, *where, scope=user.id)
+    if (not_modified := validators.response_if_current(request, response)) is not None:
+        return not_modified
     result = await db.execute(
         select(Order)
-        .where(Order.user_id == user.id, Order.status.in_(active_statuses))
+        .where(*where)
         .options(selectinload(Order.items))
         .order_by(Order.created_at.desc())
     )
     return [_order_to_response(o) for o in result.scalars().all()]
 
 
-@app.post("/api/coupons/validate", response_model=CouponValidateResponse)
-async def validate_coupon(data: CouponValidateRequest, db: AsyncSession = Depends(get_db)):
-    result = await db.execute(
-        select(Coupon).where(Coupon.code == data.code.upper(), Coupon.is_active.is_(True))
+@app.get("/api/orders/{order_id}/events")
+async def order_events(order_id: int, request: Request, db: AsyncSession = Depends(get_db)):
+    """Server-Sent Events: the order's status and ETA as they change."""
+    if await db.get(Order, order_id) is None:
+        raise HTTPException(status_code=404, detail="Zamówienie nie znalezione")
+    # The dependency's teardown only runs once the stream ends; give the
+    # connection back to the pool now rather than hold it for hours
+    await db.close()
+    return events.sse_response(request, events.order_topic(order_id))
+
+
+@app.get("/api/orders/{order_id}/wait")
+async def wait_for_order(
+    order_id: int,
+    known_status: str | None = None,
+    timeout: float = Query(LONG_POLL_TIMEOUT, ge=0, le=LONG_POLL_MAX),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Long-poll fallback for clients that can't keep an event stream open: the
+    order's status and ETA as soon as its status differs from *known_status*,
+    or whatever they are once *timeout* seconds pass.
+    """
+    # Subscribe before reading, so a change committed in between still wakes us
+    with events.bus.subscribe(events.order_topic(order_id)) as queue:
+        order = await db.get(Order, order_id)
+        if order is None:
+            raise HTTPException(status_code=404, detail="Zamówienie nie znalezione")
+        current = events.order_event(order)
+        # Don't hold a pool connection while parked — see order_events
+        await db.close()
+        if known_status is None or order.status != known_status:
+            return current
+        try:
+            return await asyncio.wait_for(queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return current
+
+
+@app.get("/api/my-orders/events")
+async def my_order_events(
+    request: Request,
+    user: User = Depends(require_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """Server-Sent Events: status and ETA changes of the customer's orders."""
+    # Same session require_user looked the customer up with — see order_events
+    await db.close()
+    return events.sse_response(request, events.user_topic(user.id))
+
+
+@app.post("/api/cart/quote", response_model=CartQuoteResponse)
+async def quote_cart(
+    data: CartQuoteRequest,
+    db: AsyncSession = Depends(get_db),
+    user_id: int | None = Depends(get_current_user_id),
+):
+    """Price a cart exactly as create_order would, without writing anything."""
+    snapshot = await menu_cache.get_snapshot(db)
+    lines, items_total = price_items(data.items, snapshot.pricing)
+
+    coupon = await coupon_cache.lookup(db, data.coupon_code)
+    if coupon and coupon_redemption.unusable_reason(coupon, logged_in=user_id is not None):
+        coupon = None
+    discount = coupon_discount(coupon, items_total)
+
+    return CartQuoteResponse(
+        lines=[
+            QuoteLineResponse(
+                dish_id=line.dish_id,
+                dish_name=line.dish_name,
+                quantity=line.quantity,
+                unit_price=line.unit_price,
+                line_total=line.line_total,
+            )
+            for line in lines
+        ],
+        items_total=items_total,
+        discount=discount,
+        total=items_total - discount,
+        min_order=MIN_ORDER,
+        meets_minimum=items_total >= MIN_ORDER,
+        coupon_valid=coupon is not None if data.coupon_code else None,
     )
-    coupon = result.scalar_one_or_none()
+
+
+@app.post("/api/coupons/validate", response_model=CouponValidateResponse)
+async def validate_coupon(
+    data: CouponValidateRequest,
+    db: AsyncSession = Depends(get_db),
+    user_id: int | None = Depends(get_current_user_id),
+):
+    coupon = await coupon_cache.lookup(db, data.code)
+    reason = coupon and coupon_redemption.unusable_reason(coupon, logged_in=user_id is not None)
+    if reason:
+        return CouponValidateResponse(valid=False, discount_percent=0, message=reason)
     if coupon:
         if coupon.discount_type == "fixed" and coupon.discount_amount:
             return CouponValidateResponse(
@@ -779,6 +857,7 @@ async def create_reservation(
 
     await db.commit()
     await db.refresh(reservation)
+    admin_feed.reservation_placed(reservation, table.label, notification)
 
     background_tasks.add_task(push_to_all_bg, {
         "type": "reservation",
@@ -807,42 +886,19 @@ async def get_order_slots(date_str: str, db: AsyncSession = Depends(get_db)):
     except ValueError:
         raise HTTPException(status_code=400, detail="Nieprawidłowy format daty")
 
-    result = await db.execute(
-        select(Order.scheduled_time, func.count(Order.id))
-        .where(
-            Order.scheduled_date == target_date,
-            Order.scheduled_time.isnot(None),
-            Order.status.notin_(["cancelled"]),
-        )
-        .group_by(Order.scheduled_time)
-    )
-    slots = {row[0]: row[1] for row in result.all()}
-    return {"date": date_str, "slots": slots}
+    slots = await order_slots.get_slots(db, target_date)
+    limits = await slot_capacity.get_limits(db)
+    return {"date": date_str, "slots": slots, "max_orders": limits.max_orders}
 
 
 @app.get("/api/event-banners")
-async def get_active_banners(db: AsyncSession = Depends(get_db)):
-    result = await db.execute(
-        select(EventBanner).where(EventBanner.is_active.is_(True))
-        .order_by(EventBanner.created_at.desc())
-    )
-    return [
-        {
-            "id": b.id,
-            "title": b.title,
-            "subtitle": b.subtitle,
-            "image_url": b.image_url,
-            "link_url": b.link_url,
-        }
-        for b in result.scalars().all()
-    ]
+async def get_active_banners(request: Request, db: AsyncSession = Depends(get_db)):
+    return cached_response(request, await site_cache.banners.get(db))
 
 
 @app.get("/api/site-config")
-async def get_site_config(db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(SiteSetting))
-    settings = {s.key: s.value for s in result.scalars().all()}
-    return {"phone": settings.get("phone", "+48 123 456 789")}
+async def get_site_config(request: Request, db: AsyncSession = Depends(get_db)):
+    return cached_response(request, await site_cache.site_config.get(db))
 
 
 # --- Push notification endpoints ---
@@ -963,6 +1019,8 @@ async def autopay_itn(request: Request, db: AsyncSession = Depends(get_db)):
                 if order and order.status == "pending":
                     order.status = "confirmed"
                     await db.commit()
+                    events.publish_order(order)
+                    admin_feed.order_status_changed(order)
                 confirmed = True
             except Exception:
                 pass
@@ -971,7 +1029,13 @@ async def autopay_itn(request: Request, db: AsyncSession = Depends(get_db)):
                 order = await db.get(Order, int(order_id_str))
                 if order and order.status == "pending":
                     order.status = "cancelled"
+                    await slot_capacity.status_changed(db, order, "pending")
+                    await coupon_redemption.status_changed(db, order, "pending")
+                    await sales_rollup.status_changed(db, order, "pending")
                     await db.commit()
+                    order_slots.status_changed(order, "pending")
+                    events.publish_order(order)
+                    admin_feed.order_status_changed(order)
             except Exception:
                 pass
             confirmed = True  # hash was valid, we just won't fulfill the order
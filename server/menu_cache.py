@@ -0,0 +1,314 @@
+"""
+In-process menu snapshot — the public menu is read on every page load but
+changes only a few times a day, so GET /api/menu and GET /api/categories serve
+an immutable snapshot (already encoded to JSON, see http_cache) instead of
+running the Dish query (plus its selectinload round trips) per hit.
+
+Admin endpoints that change dishes, categories, ingredients, extras or their
+links call invalidate() after committing; the next reader rebuilds. Edits that
+touch dishes also record_change() in the same transaction. It bumps the
+single-row menu_version counter and logs the dishes in menu_changes under the
+new version, which GET /api/menu/changes diffs against. The counter's row lock
+is held until COMMIT, so versions become visible in the order they were taken.
+(Serial ids would not do: they are handed out at INSERT, and id 10 can commit
+after id 11, behind a client that has already synced to 11.)
+
+The snapshot lives in this process only. With several uvicorn workers an
+invalidation reaches just the worker that served the admin request, so every
+snapshot also expires after MENU_CACHE_TTL seconds (default 60) as a backstop.
+"""
+
+import asyncio
+import os
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+
+from sqlalchemy import insert, literal_column, select, true, union_all, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+
+from http_cache import CachedPayload
+from pricing import DishPricing
+from models import (
+    Category, Dish, DishExtra, DishIngredient, Extra, Ingredient, MenuChange, MenuVersion,
+)
+
+MENU_CACHE_TTL = float(os.getenv("MENU_CACHE_TTL", "60"))
+
+
+@dataclass(frozen=True)
+class MenuSnapshot:
+    """One immutable build of the public menu. Never mutate `menu` in place."""
+
+    generation: int
+    built_at: float
+    version: int
+    menu: tuple[dict, ...]
+    menu_by_id: dict[int, dict]
+    pricing: dict[int, DishPricing]
+    menu_payload: CachedPayload
+    categories_payload: CachedPayload
+
+
+_snapshot: MenuSnapshot | None = None
+_generation = 0
+_lock = asyncio.Lock()
+
+
+def invalidate() -> None:
+    """Drop the current snapshot — call after committing a menu change."""
+    global _snapshot, _generation
+    _generation += 1
+    _snapshot = None
+
+
+def reset() -> None:
+    """Forget all cached state (tests run each case on a fresh database)."""
+    global _lock
+    invalidate()
+    _lock = asyncio.Lock()
+
+
+def _is_fresh(snap: MenuSnapshot | None) -> bool:
+    return snap is not None and time.monotonic() - snap.built_at < MENU_CACHE_TTL
+
+
+async def get_snapshot(db: AsyncSession) -> MenuSnapshot:
+    """Return the current snapshot, building it if it is missing or expired."""
+    global _snapshot
+    snap = _snapshot
+    if _is_fresh(snap):
+        return snap
+
+    # Only one request rebuilds; the rest wait and reuse its result.
+    async with _lock:
+        snap = _snapshot
+        if _is_fresh(snap):
+            return snap
+        generation = _generation
+        # Read the version first: the menu can only be newer, so a delta from
+        # this version may repeat a change but never miss one.
+        version = await _load_version(db)
+        menu, pricing = await load_menu(db)
+        categories = await _load_categories(db)
+        snap = MenuSnapshot(
+            generation=generation,
+            built_at=time.monotonic(),
+            version=version,
+            menu=menu,
+            menu_by_id={item["id"]: item for item in menu},
+            pricing=pricing,
+            menu_payload=CachedPayload.from_obj(list(menu)),
+            categories_payload=CachedPayload.from_obj(categories),
+        )
+        # An admin commit may have landed while we were reading — in that case
+        # serve what we built but don't keep it.
+        if generation == _generation:
+            _snapshot = snap
+        return snap
+
+
+async def record_change(db: AsyncSession, *dish_ids: int) -> None:
+    """Log an edit of *dish_ids* under a new menu version — call right before the commit that makes it."""
+    bump = (
+        update(MenuVersion)
+        .where(MenuVersion.id == 1)
+        .values(version=MenuVersion.version + 1)
+        .returning(MenuVersion.version)
+        .execution_options(synchronize_session=False)
+    )
+    version = (await db.execute(bump)).scalar_one_or_none()
+    if version is None:
+        # First edit ever: create the counter
+        try:
+            async with db.begin_nested():
+                version = (await db.execute(
+                    insert(MenuVersion).values(id=1, version=1).returning(MenuVersion.version)
+                )).scalar_one()
+        except IntegrityError:
+            version = (await db.execute(bump)).scalar_one()
+    db.add_all(MenuChange(dish_id=dish_id, version=version) for dish_id in dish_ids)
+
+
+async def get_changes(db: AsyncSession, since: int) -> dict:
+    """Dishes added, changed or removed after menu version *since*."""
+    snap = await get_snapshot(db)
+    if since > snap.version:
+        # Client is ahead of us (stale worker or a reset database) — have it
+        # re-download the full menu rather than guess.
+        return {"version": snap.version, "reset": True, "changed": [], "removed": []}
+
+    result = await db.execute(
+        select(MenuChange.dish_id)
+        .where(MenuChange.version > since, MenuChange.version <= snap.version)
+        .distinct()
+    )
+    dish_ids = sorted(result.scalars().all())
+    return {
+        "version": snap.version,
+        "reset": False,
+        "changed": [snap.menu_by_id[i] for i in dish_ids if i in snap.menu_by_id],
+        "removed": [i for i in dish_ids if i not in snap.menu_by_id],
+    }
+
+
+async def _load_version(db: AsyncSession) -> int:
+    result = await db.execute(select(MenuVersion.version).where(MenuVersion.id == 1))
+    return result.scalar_one_or_none() or 0
+
+
+async def load_menu(db: AsyncSession) -> tuple[tuple[dict, ...], dict[int, DishPricing]]:
+    """
+    Flattened loader: two Core selects read straight into row tuples — dishes
+    joined to their category, then every ingredient and extra link in one
+    UNION ALL — with no ORM identity-map hydration. See bench_menu.py.
+
+    Returns the public menu and, from the same rows, the pricing index
+    create_order uses (exact Decimals, unlike the menu's floats).
+    """
+    active = Dish.is_active.is_(True)
+    dishes = await db.execute(
+        select(
+            Dish.id, Dish.name, Category.key, Dish.base_price, Dish.original_price,
+            Dish.image_url, Dish.is_daily_special,
+        )
+        .join(Category, Category.id == Dish.category_id)
+        .where(active)
+        .order_by(Dish.category_id, Dish.display_order)
+    )
+
+    links = union_all(
+        select(
+            literal_column("'i'").label("kind"),
+            DishIngredient.dish_id,
+            Ingredient.name,
+            DishIngredient.is_included_by_default.label("included"),
+            DishIngredient.additional_price.label("price"),
+            DishIngredient.display_order,
+            DishIngredient.id,
+        )
+        .join(Ingredient, Ingredient.id == DishIngredient.ingredient_id)
+        .join(Dish, Dish.id == DishIngredient.dish_id)
+        .where(active),
+        select(
+            literal_column("'e'"),
+            DishExtra.dish_id,
+            Extra.name,
+            true(),
+            DishExtra.price,
+            DishExtra.display_order,
+            DishExtra.id,
+        )
+        .join(Extra, Extra.id == DishExtra.extra_id)
+        .join(Dish, Dish.id == DishExtra.dish_id)
+        .where(active),
+    ).subquery()
+    link_rows = await db.execute(
+        select(links).order_by(links.c.display_order, links.c.id)
+    )
+
+    ingredients = defaultdict(list)
+    extras = defaultdict(list)
+    ingredient_prices = defaultdict(dict)
+    ingredient_defaults = defaultdict(dict)
+    extra_prices = defaultdict(dict)
+    for kind, dish_id, name, included, price, _, _ in link_rows:
+        if kind == "i":
+            ingredient_defaults[dish_id].setdefault(name, included)
+            ingredients[dish_id].append({
+                "name": name,
+                "included": included,
+                **({"price": float(price)} if price else {}),
+            })
+            if price:
+                ingredient_prices[dish_id].setdefault(name, price)
+        else:
+            extras[dish_id].append({"name": name, "price": float(price)})
+            extra_prices[dish_id].setdefault(name, price)
+
+    dishes = dishes.all()
+    menu = tuple(
+        {
+            "id": dish_id,
+            "name": name,
+            "category": category,
+            "price": float(base_price),
+            "originalPrice": float(original_price) if original_price else None,
+            "image": image_url,
+            "dailySpecial": daily_special,
+            "ingredients": ingredients.get(dish_id, []),
+            "extras": extras.get(dish_id, []),
+        }
+        for dish_id, name, category, base_price, original_price, image_url, daily_special in dishes
+    )
+    pricing = {
+        dish_id: DishPricing(
+            name=name,
+            base_price=base_price,
+            ingredient_prices=ingredient_prices.get(dish_id, {}),
+            ingredient_defaults=ingredient_defaults.get(dish_id, {}),
+            extra_prices=extra_prices.get(dish_id, {}),
+        )
+        for dish_id, name, _, base_price, *_ in dishes
+    }
+    return menu, pricing
+
+
+async def load_menu_orm(db: AsyncSession) -> tuple[dict, ...]:
+    """The selectinload loader (five round trips) that load_menu replaced — kept as its reference."""
+    result = await db.execute(
+        select(Dish)
+        .where(Dish.is_active.is_(True))
+        .options(
+            selectinload(Dish.category),
+            selectinload(Dish.dish_ingredients).selectinload(
+                DishIngredient.ingredient
+            ),
+            selectinload(Dish.dish_extras).selectinload(
+                DishExtra.extra
+            ),
+        )
+        .order_by(Dish.category_id, Dish.display_order)
+    )
+    return tuple(_dish_to_menu_item(d) for d in result.scalars().all())
+
+
+async def _load_categories(db: AsyncSession) -> list[dict]:
+    result = await db.execute(
+        select(Category)
+        .where(Category.is_active.is_(True))
+        .order_by(Category.display_order)
+    )
+    return [
+        {"key": c.key, "label": c.label}
+        for c in result.scalars().all()
+    ]
+
+
+def _dish_to_menu_item(d: Dish) -> dict:
+    return {
+        "id": d.id,
+        "name": d.name,
+        "category": d.category.key,
+        "price": float(d.base_price),
+        "originalPrice": float(d.original_price) if d.original_price else None,
+        "image": d.image_url,
+        "dailySpecial": d.is_daily_special,
+        "ingredients": [
+            {
+                "name": di.ingredient.name,
+                "included": di.is_included_by_default,
+                **({"price": float(di.additional_price)} if di.additional_price else {}),
+            }
+            for di in sorted(d.dish_ingredients, key=lambda x: x.display_order)
+        ],
+        "extras": [
+            {
+                "name": de.extra.name,
+                "price": float(de.price),
+            }
+            for de in sorted(d.dish_extras, key=lambda x: x.display_order)
+        ],
+    }
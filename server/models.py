@@ -5,13 +5,49 @@ from typing import List, Optional
 from sqlalchemy import (
     CheckConstraint,
     Date,
+    DateTime,
     ForeignKey,
+    Index,
+    JSON,
     String,
     Text,
     UniqueConstraint,
     func,
 )
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
+from sqlalchemy.sql.expression import FunctionElement
+
+# Order item snapshots: only what the customer changed against the dish's
+# defaults, e.g. {"removed": ["Ser"], "added": [{"name": "Bekon", "price": "4.00"}]}
+# and [{"name": "Jalapeño", "price": "5.00"}]; NULL when nothing was changed.
+# Items placed before this format keep the full list they were stored with.
+Snapshot = JSON(none_as_null=True).with_variant(JSONB(none_as_null=True), "postgresql")
+
+
+
+class precise_now(FunctionElement):
+    """The database's clock like now(), but finer than SQLite's whole seconds."""
+
+    type = DateTime()
+    inherit_cache = True
+
+
+@compiles(precise_now)
+def _precise_now(element, compiler, **kw):
+    return "CURRENT_TIMESTAMP"
+
+
+@compiles(precise_now, "postgresql")
+def _precise_now_postgresql(element, compiler, **kw):
+    # now() is the transaction's start, which a later commit can fall behind
+    return "clock_timestamp()"
+
+
+@compiles(precise_now, "sqlite")
+def _precise_now_sqlite(element, compiler, **kw):
+    return "strftime('%Y-%m-%d %H:%M:%f', 'now')"
 
 
 class Base(DeclarativeBase):
@@ -84,6 +120,27 @@ class Dish(Base):
     )
 
 
+class MenuChange(Base):
+    """Append-only log of menu edits, tagged with the menu version they made."""
+
+    __tablename__ = "menu_changes"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    # No FK: the row must outlive a deleted dish so clients learn it is gone
+    dish_id: Mapped[int] = mapped_column(index=True)
+    version: Mapped[int] = mapped_column(index=True)
+    created_at: Mapped[datetime] = mapped_column(server_default=func.now())
+
+
+class MenuVersion(Base):
+    """Single-row counter of menu versions, bumped by every menu edit."""
+
+    __tablename__ = "menu_version"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    version: Mapped[int] = mapped_column(default=0)
+
+
 class Ingredient(Base):
     __tablename__ = "ingredients"
 
@@ -172,6 +229,13 @@ class UserAddress(Base):
 
 class Order(Base):
     __tablename__ = "orders"
+    __table_args__ = (
+        # Keyset pagination of the admin order list
+        Index("ix_orders_created_at_id", "created_at", "id"),
+        Index("ix_orders_status_created_at", "status", "created_at"),
+        Index("ix_orders_user_id_status", "user_id", "status"),
+        Index("ix_orders_scheduled_date_time", "scheduled_date", "scheduled_time"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     user_id: Mapped[Optional[int]] = mapped_column(
@@ -200,8 +264,9 @@ class Order(Base):
     discount: Mapped[Decimal] = mapped_column(default=Decimal("0"))
     total: Mapped[Decimal] = mapped_column()
     created_at: Mapped[datetime] = mapped_column(server_default=func.now())
+    # The order's HTTP validator, so it has to move on every change
     updated_at: Mapped[datetime] = mapped_column(
-        server_default=func.now(), onupdate=func.now()
+        server_default=func.now(), onupdate=precise_now(), index=True
     )
 
     user: Mapped[Optional["User"]] = relationship(back_populates="orders")
@@ -210,6 +275,93 @@ class Order(Base):
     )
 
 
+class OrderArchive(Base):
+    """Completed and cancelled orders moved out of orders by order_archive."""
+
+    __tablename__ = "orders_archive"
+    __table_args__ = (
+        Index("ix_orders_archive_created_at_id", "created_at", "id"),
+        Index("ix_orders_archive_status", "status"),
+    )
+
+    # Same columns as orders, ids kept; no defaults, rows are copied in
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=False)
+    user_id: Mapped[Optional[int]] = mapped_column(
+        ForeignKey("users.id", ondelete="SET NULL"), index=True
+    )
+    status: Mapped[str] = mapped_column(String(20))
+    delivery_mode: Mapped[str] = mapped_column(String(20))
+    first_name: Mapped[str] = mapped_column(String(100))
+    last_name: Mapped[Optional[str]] = mapped_column(String(100))
+    phone: Mapped[str] = mapped_column(String(20))
+    email: Mapped[Optional[str]] = mapped_column(String(255))
+    city: Mapped[Optional[str]] = mapped_column(String(100))
+    street: Mapped[Optional[str]] = mapped_column(String(200))
+    house_number: Mapped[Optional[str]] = mapped_column(String(20))
+    apartment: Mapped[Optional[str]] = mapped_column(String(20))
+    notes: Mapped[Optional[str]] = mapped_column(Text)
+    payment_method: Mapped[str] = mapped_column(String(30))
+    coupon_code: Mapped[Optional[str]] = mapped_column(String(50))
+    scheduled_date: Mapped[Optional[date]] = mapped_column(Date)
+    scheduled_time: Mapped[Optional[str]] = mapped_column(String(5))
+    eta_minutes: Mapped[Optional[int]] = mapped_column(nullable=True)
+    items_total: Mapped[Decimal] = mapped_column()
+    delivery_fee: Mapped[Decimal] = mapped_column()
+    discount: Mapped[Decimal] = mapped_column()
+    total: Mapped[Decimal] = mapped_column()
+    created_at: Mapped[datetime] = mapped_column()
+    updated_at: Mapped[datetime] = mapped_column()
+
+    items: Mapped[List["OrderItemArchive"]] = relationship(
+        back_populates="order", cascade="all, delete-orphan"
+    )
+
+
+class OrderItemArchive(Base):
+    __tablename__ = "order_items_archive"
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=False)
+    order_id: Mapped[int] = mapped_column(
+        ForeignKey("orders_archive.id", ondelete="CASCADE"), index=True
+    )
+    dish_id: Mapped[int] = mapped_column()  # dishes may be gone by now
+    dish_name: Mapped[str] = mapped_column(String(200))
+    base_price: Mapped[Decimal] = mapped_column()
+    quantity: Mapped[int] = mapped_column()
+    ingredients_snapshot: Mapped[Optional[dict | list]] = mapped_column(Snapshot)
+    extras_snapshot: Mapped[Optional[list]] = mapped_column(Snapshot)
+    item_total: Mapped[Decimal] = mapped_column()
+
+    order: Mapped["OrderArchive"] = relationship(back_populates="items")
+
+
+class DailySales(Base):
+    """Per-day totals of the orders placed that day, kept by sales_rollup."""
+
+    __tablename__ = "daily_sales"
+
+    day: Mapped[date] = mapped_column(Date, primary_key=True)
+    orders: Mapped[int] = mapped_column(default=0)  # not cancelled
+    completed: Mapped[int] = mapped_column(default=0)
+    cancelled: Mapped[int] = mapped_column(default=0)
+    revenue: Mapped[Decimal] = mapped_column(default=Decimal("0"))
+    discount: Mapped[Decimal] = mapped_column(default=Decimal("0"))
+    delivery_orders: Mapped[int] = mapped_column(default=0)
+    pickup_orders: Mapped[int] = mapped_column(default=0)
+
+
+class DailyDishSales(Base):
+    """Per-day, per-dish quantities and revenue of orders not cancelled."""
+
+    __tablename__ = "daily_dish_sales"
+
+    day: Mapped[date] = mapped_column(Date, primary_key=True)
+    # No foreign key: history outlives deleted dishes
+    dish_id: Mapped[int] = mapped_column(primary_key=True)
+    quantity: Mapped[int] = mapped_column(default=0)
+    revenue: Mapped[Decimal] = mapped_column(default=Decimal("0"))
+
+
 class Coupon(Base):
     __tablename__ = "coupons"
 
@@ -219,12 +371,44 @@ class Coupon(Base):
     discount_percent: Mapped[int] = mapped_column(default=0)
     discount_amount: Mapped[Optional[Decimal]] = mapped_column()
     is_active: Mapped[bool] = mapped_column(default=True)
+    # Usage limits — None means unlimited / open-ended
+    max_redemptions: Mapped[Optional[int]] = mapped_column()
+    max_per_user: Mapped[Optional[int]] = mapped_column()
+    valid_from: Mapped[Optional[datetime]] = mapped_column()
+    valid_until: Mapped[Optional[datetime]] = mapped_column()
+    # Only counted for coupons with max_redemptions, see coupon_redemption.py
+    redemption_count: Mapped[int] = mapped_column(default=0, server_default="0")
     created_at: Mapped[datetime] = mapped_column(server_default=func.now())
     updated_at: Mapped[datetime] = mapped_column(
         server_default=func.now(), onupdate=func.now()
     )
 
 
+class CouponUsage(Base):
+    """Per-user redemption counter for coupons with max_per_user."""
+
+    __tablename__ = "coupon_usage"
+
+    coupon_id: Mapped[int] = mapped_column(
+        ForeignKey("coupons.id", ondelete="CASCADE"), primary_key=True
+    )
+    user_id: Mapped[int] = mapped_column(
+        ForeignKey("users.id", ondelete="CASCADE"), primary_key=True
+    )
+    redemptions: Mapped[int] = mapped_column(default=0)
+
+
+class SlotLoad(Base):
+    """Orders and items booked per scheduled slot, for kitchen capacity checks."""
+
+    __tablename__ = "slot_load"
+
+    scheduled_date: Mapped[date] = mapped_column(Date, primary_key=True)
+    scheduled_time: Mapped[str] = mapped_column(String(5), primary_key=True)
+    orders: Mapped[int] = mapped_column(default=0)
+    items: Mapped[int] = mapped_column(default=0)
+
+
 class EventBanner(Base):
     __tablename__ = "event_banners"
 
@@ -270,6 +454,10 @@ class RestaurantTable(Base):
 
 class Reservation(Base):
     __tablename__ = "reservations"
+    __table_args__ = (
+        Index("ix_reservations_date_status_table", "reservation_date", "status", "table_id"),
+        Index("ix_reservations_user_id_date", "user_id", "reservation_date"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     table_id: Mapped[int] = mapped_column(
@@ -295,6 +483,9 @@ class Reservation(Base):
 
 class Notification(Base):
     __tablename__ = "notifications"
+    __table_args__ = (
+        Index("ix_notifications_is_read_created_at", "is_read", "created_at"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     type: Mapped[str] = mapped_column(String(50))  # reservation
@@ -324,14 +515,14 @@ class OrderItem(Base):
 
     id: Mapped[int] = mapped_column(primary_key=True)
     order_id: Mapped[int] = mapped_column(
-        ForeignKey("orders.id", ondelete="CASCADE")
+        ForeignKey("orders.id", ondelete="CASCADE"), index=True
     )
     dish_id: Mapped[int] = mapped_column(ForeignKey("dishes.id"))
     dish_name: Mapped[str] = mapped_column(String(200))
     base_price: Mapped[Decimal] = mapped_column()
     quantity: Mapped[int] = mapped_column()
-    ingredients_snapshot: Mapped[Optional[str]] = mapped_column(Text)
-    extras_snapshot: Mapped[Optional[str]] = mapped_column(Text)
+    ingredients_snapshot: Mapped[Optional[dict | list]] = mapped_column(Snapshot)
+    extras_snapshot: Mapped[Optional[list]] = mapped_column(Snapshot)
     item_total: Mapped[Decimal] = mapped_column()
 
     order: Mapped["Order"] = relationship(back_populates="items")
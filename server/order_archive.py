@@ -0,0 +1,120 @@
+"""
+Hot/cold split of orders. Completed and cancelled orders older than
+ORDER_ARCHIVE_AFTER_DAYS move, with their items, to orders_archive and
+order_items_archive, keeping their ids. orders then holds little more than the
+live ones and their recent history, and stays in memory.
+
+The move runs in batches of ORDER_ARCHIVE_BATCH orders, one transaction each
+(copy, then delete), so it never holds many locks and can be stopped at any
+point. Orders locked by a concurrent status change are skipped until the next
+run. Schedule it nightly:
+
+    python order_archive.py [--days N] [--batch N]
+
+Archived orders can't change any more. Reads that cover history — an order by
+id, the admin order list, an order's items and the sales rollup backfill — look
+in both tables; the customer's active orders are only ever in orders.
+"""
+
+import argparse
+import asyncio
+import os
+from datetime import datetime, timedelta
+from typing import Callable
+
+from sqlalchemy import ColumnCollection, delete, insert, select, union_all
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import Order, OrderArchive, OrderItem, OrderItemArchive
+
+ARCHIVE_AFTER_DAYS = int(os.getenv("ORDER_ARCHIVE_AFTER_DAYS", "180"))
+ARCHIVE_BATCH = int(os.getenv("ORDER_ARCHIVE_BATCH", "500"))
+ARCHIVED_STATUSES = ("completed", "cancelled")
+
+
+def _columns(source, target) -> list:
+    # Matched by name, so the copy doesn't depend on column order
+    return [source.__table__.c[c.name] for c in target.__table__.c]
+
+
+async def archive_batch(db: AsyncSession, cutoff: datetime, batch: int = ARCHIVE_BATCH) -> int:
+    """Move up to *batch* finished orders placed before *cutoff*; returns how many."""
+    ids = (await db.execute(
+        select(Order.id)
+        .where(Order.status.in_(ARCHIVED_STATUSES), Order.created_at < cutoff)
+        .order_by(Order.id)
+        .limit(batch)
+        .with_for_update(skip_locked=True)
+    )).scalars().all()
+    if not ids:
+        return 0
+    await db.execute(
+        insert(OrderArchive).from_select(
+            [c.name for c in OrderArchive.__table__.c],
+            select(*_columns(Order, OrderArchive)).where(Order.id.in_(ids)),
+        )
+    )
+    await db.execute(
+        insert(OrderItemArchive).from_select(
+            [c.name for c in OrderItemArchive.__table__.c],
+            select(*_columns(OrderItem, OrderItemArchive)).where(OrderItem.order_id.in_(ids)),
+        )
+    )
+    await db.execute(delete(OrderItem).where(OrderItem.order_id.in_(ids)))
+    await db.execute(delete(Order).where(Order.id.in_(ids)))
+    return len(ids)
+
+
+async def archive(
+    session_factory, days: int = ARCHIVE_AFTER_DAYS, batch: int = ARCHIVE_BATCH,
+) -> int:
+    """Archive every finished order older than *days*, a batch per transaction."""
+    cutoff = datetime.now() - timedelta(days=days)
+    moved = 0
+    while True:
+        async with session_factory() as db:
+            n = await archive_batch(db, cutoff, batch)
+            await db.commit()
+        moved += n
+        if n < batch:
+            return moved
+
+
+def order_history(where: Callable[[ColumnCollection], list] = lambda c: [], limit: int | None = None):
+    """
+    orders and orders_archive as one selectable with the columns of orders,
+    both filtered by where(table.c). With *limit*, each table contributes only
+    its newest *limit* rows, so a page of the history is read from the
+    (created_at, id) index of both rather than from a merge of everything.
+    """
+    branches = []
+    for model in (Order, OrderArchive):
+        c = model.__table__.c
+        query = select(*_columns(model, Order)).where(*where(c))
+        if limit is not None:
+            query = query.order_by(c.created_at.desc(), c.id.desc()).limit(limit)
+        branches.append(select(query.subquery()))
+    return union_all(*branches).subquery("order_history")
+
+
+def order_item_history():
+    """order_items and order_items_archive as one selectable with the columns of order_items."""
+    return union_all(*(
+        select(*_columns(model, OrderItem)) for model in (OrderItem, OrderItemArchive)
+    )).subquery("order_item_history")
+
+
+async def _main(days: int, batch: int) -> None:
+    from database import async_session, engine
+
+    moved = await archive(async_session, days, batch)
+    await engine.dispose()
+    print(f"Archived {moved} orders")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move old finished orders to the archive tables.")
+    parser.add_argument("--days", type=int, default=ARCHIVE_AFTER_DAYS)
+    parser.add_argument("--batch", type=int, default=ARCHIVE_BATCH)
+    args = parser.parse_args()
+    asyncio.run(_main(args.days, args.batch))
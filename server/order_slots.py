@@ -0,0 +1,104 @@
+"""
+In-memory per-date, per-slot counts of scheduled orders for /api/order-slots.
+
+The checkout time picker asks for a date's slot counts every time it opens.
+Instead of a GROUP BY over orders per call, the counts are kept in memory.
+create_order bumps a slot after committing, and status changes into or out of
+"cancelled" (the admin panel, failed AutoPay payments) adjust it.
+
+Counts for today onwards are rebuilt from the database at startup. Any other
+date is read once on first request and maintained from then on. A read that
+raced with an order for the same date is served but not cached. Like the other
+in-process caches, each date is re-read after ORDER_SLOTS_TTL seconds
+(default 60) to pick up orders taken by other workers.
+"""
+
+import os
+import time
+from datetime import date
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import Order
+
+ORDER_SLOTS_TTL = float(os.getenv("ORDER_SLOTS_TTL", "60"))
+
+# date -> (loaded_at, {scheduled_time: count})
+_days: dict[date, tuple[float, dict[str, int]]] = {}
+# date -> number of adjustments so far; a load only caches dates it didn't race with
+_changes: dict[date, int] = {}
+
+
+def reset() -> None:
+    """Forget all cached counts (tests run each case on a fresh database)."""
+    _days.clear()
+    _changes.clear()
+
+
+def _adjust(day: date, slot: str, delta: int) -> None:
+    _changes[day] = _changes.get(day, 0) + 1
+    entry = _days.get(day)
+    if entry is None:
+        return  # not loaded — the first read counts it from the DB
+    counts = entry[1]
+    counts[slot] = counts.get(slot, 0) + delta
+    if counts[slot] <= 0:
+        del counts[slot]
+
+
+def order_placed(order: Order) -> None:
+    """Count a committed new order."""
+    if order.scheduled_date and order.scheduled_time and order.status != "cancelled":
+        _adjust(order.scheduled_date, order.scheduled_time, +1)
+
+
+def status_changed(order: Order, old_status: str) -> None:
+    """Mirror a committed status change — only (un)cancelling moves the count."""
+    if not order.scheduled_date or not order.scheduled_time:
+        return
+    was_counted = old_status != "cancelled"
+    is_counted = order.status != "cancelled"
+    if was_counted != is_counted:
+        _adjust(order.scheduled_date, order.scheduled_time, +1 if is_counted else -1)
+
+
+async def _count(db: AsyncSession, *where) -> dict[date, dict[str, int]]:
+    result = await db.execute(
+        select(Order.scheduled_date, Order.scheduled_time, func.count(Order.id))
+        .where(
+            *where,
+            Order.scheduled_time.isnot(None),
+            Order.status.notin_(["cancelled"]),
+        )
+        .group_by(Order.scheduled_date, Order.scheduled_time)
+    )
+    days: dict[date, dict[str, int]] = {}
+    for day, slot, count in result.all():
+        days.setdefault(day, {})[slot] = count
+    return days
+
+
+async def rebuild(db: AsyncSession, today: date | None = None) -> None:
+    """Load the counts for today onwards — called at startup."""
+    today = today or date.today()
+    changes = dict(_changes)
+    counted = await _count(db, Order.scheduled_date >= today)
+    now = time.monotonic()
+    for day in set(counted) | {d for d in _days if d >= today}:
+        if _changes.get(day, 0) == changes.get(day, 0):
+            _days[day] = (now, counted.get(day, {}))
+
+
+async def get_slots(db: AsyncSession, day: date) -> dict[str, int]:
+    """Scheduled (non-cancelled) orders per slot on *day*."""
+    entry = _days.get(day)
+    if entry is not None and time.monotonic() - entry[0] < ORDER_SLOTS_TTL:
+        return dict(entry[1])
+
+    changes = _changes.get(day, 0)
+    counts = (await _count(db, Order.scheduled_date == day)).get(day, {})
+    if _changes.get(day, 0) == changes:
+        _days[day] = (time.monotonic(), counts)
+        return dict(counts)
+    return counts
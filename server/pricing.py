@@ -0,0 +1,120 @@
+"""
+Server-side order pricing against the in-memory menu snapshot — shared by
+create_order and the read-only /api/cart/quote.
+
+menu_cache builds a DishPricing entry per active dish alongside the public
+menu, so pricing an order is a handful of dict lookups instead of reloading
+every referenced dish with its ingredients and extras.
+"""
+
+from dataclasses import dataclass
+from decimal import Decimal
+from typing import Mapping
+
+from fastapi import HTTPException
+
+from coupon_cache import CouponInfo
+from schemas import OrderItemCreate
+
+
+@dataclass(frozen=True)
+class DishPricing:
+    name: str
+    base_price: Decimal
+    # Only ingredients that cost extra when toggled on
+    ingredient_prices: Mapping[str, Decimal]
+    # Every ingredient of the dish -> whether it's on by default
+    ingredient_defaults: Mapping[str, bool]
+    extra_prices: Mapping[str, Decimal]
+
+
+@dataclass(frozen=True)
+class PricedLine:
+    dish_id: int
+    dish_name: str
+    base_price: Decimal
+    quantity: int
+    unit_price: Decimal
+    line_total: Decimal
+    # What the customer changed, as stored on the order item
+    ingredient_changes: dict | None = None
+    extras: list | None = None
+
+
+def price_items(
+    items: list[OrderItemCreate], pricing: Mapping[int, DishPricing],
+) -> tuple[list[PricedLine], Decimal]:
+    """Price each cart line; returns the lines and their sum."""
+    # Verify all dishes exist and are active
+    for item in items:
+        if item.dish_id not in pricing:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Danie o ID {item.dish_id} nie istnieje lub jest nieaktywne",
+            )
+
+    lines = []
+    items_total = Decimal("0")
+    for item in items:
+        dish = pricing[item.dish_id]
+        unit_price = dish.base_price
+        removed, added, extras = [], [], []
+
+        # Add price for included (toggled-on) ingredients that have additional_price
+        for ing_snap in item.ingredients:
+            surcharge = None
+            if ing_snap.included and ing_snap.price > 0:
+                surcharge = dish.ingredient_prices.get(ing_snap.name)
+                if surcharge:
+                    unit_price += surcharge
+            default = dish.ingredient_defaults.get(ing_snap.name)
+            if default is None or ing_snap.included == default:
+                continue
+            if ing_snap.included:
+                added.append({"name": ing_snap.name, **({"price": _amount(surcharge)} if surcharge else {})})
+            else:
+                removed.append(ing_snap.name)
+
+        # Add price for selected extras
+        for ext_snap in item.extras:
+            price = dish.extra_prices.get(ext_snap.name)
+            if price is not None:
+                unit_price += price
+                extras.append({"name": ext_snap.name, "price": _amount(price)})
+
+        line_total = unit_price * item.quantity
+        items_total += line_total
+        lines.append(PricedLine(
+            dish_id=item.dish_id,
+            dish_name=dish.name,
+            base_price=dish.base_price,
+            quantity=item.quantity,
+            unit_price=unit_price,
+            line_total=line_total,
+            ingredient_changes=_changes(removed, added),
+            extras=extras or None,
+        ))
+
+    return lines, items_total
+
+
+def _amount(value: Decimal) -> str:
+    return str(value.quantize(Decimal("0.01")))
+
+
+def _changes(removed: list[str], added: list[dict]) -> dict | None:
+    """Only what differs from the dish's defaults; None for the dish as it comes."""
+    changes = {}
+    if removed:
+        changes["removed"] = removed
+    if added:
+        changes["added"] = added
+    return changes or None
+
+
+def coupon_discount(coupon: CouponInfo | None, items_total: Decimal) -> Decimal:
+    if not coupon:
+        return Decimal("0")
+    if coupon.discount_type == "fixed" and coupon.discount_amount:
+        return min(coupon.discount_amount, items_total)
+    return (items_total * Decimal(str(coupon.discount_percent)) / Decimal("100")).quantize(Decimal("1"))
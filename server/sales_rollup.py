@@ -0,0 +1,266 @@
+"""
+Daily sales rollups: per day (daily_sales) and per day and dish
+(daily_dish_sales), so reports read a row per day instead of scanning orders
+and order_items.
+
+An order counts towards the day it was placed, by the database's clock — the
+one created_at comes from (business_day() and today()). It is added inside the
+transaction that creates it, right before the slot and coupon claims, which go
+last so their row locks are held for a single round trip. Cancelling takes it out again and un-cancelling puts it
+back; completing it moves the day's completed count. The rows are bumped with
+UPDATE ... SET x = x + n and created on first use, like slot_load.
+
+Orders from before the tables existed are not in them until a backfill:
+
+    python sales_rollup.py [--from YYYY-MM-DD] [--to YYYY-MM-DD]
+
+which recomputes the given days (all of them by default) from orders, archived
+ones included.
+"""
+
+import argparse
+import asyncio
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+
+from sqlalchemy import and_, case, delete, func, insert, inspect, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import DailyDishSales, DailySales, Order, OrderItem
+import order_archive
+
+
+def _as_date(value) -> date:
+    # date() gives a string on SQLite and a date on Postgres
+    return value if isinstance(value, date) else date.fromisoformat(value)
+
+
+def business_day(created_at: datetime) -> date:
+    """The rollup day of an order; func.date(Order.created_at) is the same in SQL."""
+    return created_at.date()
+
+
+async def today(db: AsyncSession) -> date:
+    """The current rollup day, from the clock created_at is taken from, not the app's."""
+    return _as_date((await db.execute(select(func.current_date()))).scalar_one())
+
+
+async def _bump(db: AsyncSession, model, key: dict, deltas: dict) -> None:
+    """Add *deltas* to the columns of *model*'s row at *key*, creating it if needed."""
+    bump = (
+        update(model)
+        .where(*(getattr(model, column) == value for column, value in key.items()))
+        .values({column: getattr(model, column) + n for column, n in deltas.items()})
+        .execution_options(synchronize_session=False)
+    )
+    if (await db.execute(bump)).rowcount:
+        return
+    try:
+        async with db.begin_nested():
+            await db.execute(insert(model).values(**key, **deltas))
+    except IntegrityError:
+        # A concurrent order created the row first
+        await db.execute(bump)
+
+
+def _order_deltas(order: Order, sign: int) -> dict:
+    mode = "delivery_orders" if order.delivery_mode == "delivery" else "pickup_orders"
+    return {
+        "orders": sign,
+        "revenue": sign * order.total,
+        "discount": sign * order.discount,
+        mode: sign,
+    }
+
+
+async def _dish_lines(db: AsyncSession, orders: list[Order]) -> dict[int, dict[int, tuple[int, Decimal]]]:
+    """order id -> dish_id -> (quantity, revenue) of the orders' items, in one query at most."""
+    lines: dict[int, dict[int, tuple[int, Decimal]]] = {}
+    unloaded = []
+    for order in orders:
+        if "items" in inspect(order).unloaded:
+            unloaded.append(order.id)
+            continue
+        dishes = lines.setdefault(order.id, {})
+        for item in order.items:
+            quantity, revenue = dishes.get(item.dish_id, (0, Decimal("0")))
+            dishes[item.dish_id] = (quantity + item.quantity, revenue + item.item_total)
+    if unloaded:
+        result = await db.execute(
+            select(
+                OrderItem.order_id, OrderItem.dish_id,
+                func.sum(OrderItem.quantity), func.sum(OrderItem.item_total),
+            )
+            .where(OrderItem.order_id.in_(unloaded))
+            .group_by(OrderItem.order_id, OrderItem.dish_id)
+        )
+        for order_id, dish_id, quantity, revenue in result.all():
+            lines.setdefault(order_id, {})[dish_id] = (quantity, revenue)
+    return lines
+
+
+class _Deltas:
+    """Changes summed per day and per day and dish, so each row is bumped once."""
+
+    def __init__(self):
+        self.days: dict[date, dict] = {}
+        self.dishes: dict[tuple[date, int], dict] = {}
+
+    @staticmethod
+    def _add(rows: dict, key, deltas: dict) -> None:
+        row = rows.setdefault(key, {})
+        for column, n in deltas.items():
+            row[column] = row.get(column, 0) + n
+
+    def day(self, order: Order, deltas: dict) -> None:
+        self._add(self.days, business_day(order.created_at), deltas)
+
+    def order(self, order: Order, sign: int, lines: dict[int, tuple[int, Decimal]]) -> None:
+        self.day(order, _order_deltas(order, sign))
+        for dish_id, (quantity, revenue) in lines.items():
+            self._add(
+                self.dishes, (business_day(order.created_at), dish_id),
+                {"quantity": sign * quantity, "revenue": sign * revenue},
+            )
+
+    async def apply(self, db: AsyncSession) -> None:
+        # Sorted, so concurrent transactions lock the rows in the same order
+        rows = [({"day": day}, DailySales, deltas) for day, deltas in sorted(self.days.items())]
+        rows += [
+            ({"day": day, "dish_id": dish_id}, DailyDishSales, deltas)
+            for (day, dish_id), deltas in sorted(self.dishes.items())
+        ]
+        for key, model, deltas in rows:
+            deltas = {column: n for column, n in deltas.items() if n}
+            if deltas:
+                await _bump(db, model, key, deltas)
+
+
+async def order_placed(db: AsyncSession, order: Order) -> None:
+    """Count the flushed *order* in its day's rollups (before committing)."""
+    deltas = _Deltas()
+    deltas.order(order, 1, (await _dish_lines(db, [order])).get(order.id, {}))
+    await deltas.apply(db)
+
+
+async def status_changed(db: AsyncSession, order: Order, old_status: str) -> None:
+    """Move the order between the day's counts on a status change, before committing."""
+    await statuses_changed(db, [(order, old_status)])
+
+
+async def statuses_changed(db: AsyncSession, changes: list[tuple[Order, str]]) -> None:
+    """status_changed() for (order, old status) pairs, bumping each day and dish row once."""
+    moved = [
+        (order, 1 if order.status != "cancelled" else -1)
+        for order, old_status in changes
+        if (old_status != "cancelled") != (order.status != "cancelled")
+    ]
+    lines = await _dish_lines(db, [order for order, _ in moved]) if moved else {}
+    deltas = _Deltas()
+    for order, sign in moved:
+        deltas.order(order, sign, lines.get(order.id, {}))
+        deltas.day(order, {"cancelled": -sign})
+    for order, old_status in changes:
+        completed = (order.status == "completed") - (old_status == "completed")
+        if completed:
+            deltas.day(order, {"completed": completed})
+    await deltas.apply(db)
+
+
+# --- Backfill ---
+
+
+def _day_range(column, date_from: date | None, date_to: date | None) -> list:
+    conditions = []
+    if date_from:
+        conditions.append(column >= date_from)
+    if date_to:
+        conditions.append(column <= date_to)
+    return conditions
+
+
+async def backfill(
+    db: AsyncSession, date_from: date | None = None, date_to: date | None = None,
+) -> int:
+    """Recompute the rollups of the given days from orders; returns the number of days."""
+    def placed(c) -> list:
+        conditions = []
+        if date_from:
+            conditions.append(c.created_at >= datetime.combine(date_from, time.min))
+        if date_to:
+            conditions.append(c.created_at < datetime.combine(date_to + timedelta(days=1), time.min))
+        return conditions
+
+    await db.execute(delete(DailySales).where(*_day_range(DailySales.day, date_from, date_to)))
+    await db.execute(
+        delete(DailyDishSales).where(*_day_range(DailyDishSales.day, date_from, date_to))
+    )
+
+    # Archived orders still count towards their days
+    history = order_archive.order_history(placed)
+    o = history.c
+    day = func.date(o.created_at)  # business_day()
+    counted = o.status != "cancelled"
+
+    def total(condition, value=1):
+        return func.coalesce(func.sum(case((condition, value), else_=0)), 0)
+
+    result = await db.execute(
+        select(
+            day,
+            total(counted),
+            total(o.status == "completed"),
+            total(o.status == "cancelled"),
+            total(counted, o.total),
+            total(counted, o.discount),
+            total(and_(counted, o.delivery_mode == "delivery")),
+            total(and_(counted, o.delivery_mode != "delivery")),
+        )
+        .group_by(day)
+    )
+    rows = [
+        {
+            "day": _as_date(d), "orders": orders, "completed": completed,
+            "cancelled": cancelled, "revenue": revenue, "discount": discount,
+            "delivery_orders": delivery, "pickup_orders": pickup,
+        }
+        for d, orders, completed, cancelled, revenue, discount, delivery, pickup in result.all()
+    ]
+    if rows:
+        await db.execute(insert(DailySales), rows)
+
+    items = order_archive.order_item_history()
+    i = items.c
+    result = await db.execute(
+        select(day, i.dish_id, func.sum(i.quantity), func.sum(i.item_total))
+        .select_from(items)
+        .join(history, i.order_id == o.id)
+        .where(counted)
+        .group_by(day, i.dish_id)
+    )
+    dishes = [
+        {"day": _as_date(d), "dish_id": dish_id, "quantity": quantity, "revenue": revenue}
+        for d, dish_id, quantity, revenue in result.all()
+    ]
+    if dishes:
+        await db.execute(insert(DailyDishSales), dishes)
+    return len(rows)
+
+
+async def _main(date_from: date | None, date_to: date | None) -> None:
+    from database import async_session, engine
+
+    async with async_session() as db:
+        days = await backfill(db, date_from, date_to)
+        await db.commit()
+    await engine.dispose()
+    print(f"Recomputed {days} days")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recompute the daily sales rollups from orders.")
+    parser.add_argument("--from", dest="date_from", type=date.fromisoformat)
+    parser.add_argument("--to", dest="date_to", type=date.fromisoformat)
+    args = parser.parse_args()
+    asyncio.run(_main(args.date_from, args.date_to))
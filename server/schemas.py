@@ -2,7 +2,7 @@ from datetime import datetime
 from decimal import Decimal
 from typing import Optional
 
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, field_validator
 
 
 # --- Auth ---
@@ -81,6 +81,31 @@ class ExtraSnapshot(BaseModel):
     price: Decimal
 
 
+class AddedIngredient(BaseModel):
+    name: str
+    price: Decimal = Decimal("0")
+
+
+class IngredientChanges(BaseModel):
+    """An order item's ingredients that differ from the dish's defaults."""
+
+    removed: list[str] = []
+    added: list[AddedIngredient] = []
+
+
+def ingredient_changes(value):
+    # Items from before only the changes were stored hold the dish's whole
+    # ingredient list; read those the way the CMS always showed them
+    if not isinstance(value, list):
+        return value
+    removed = [i["name"] for i in value if not i.get("included")]
+    added = [
+        {"name": i["name"], "price": i["price"]}
+        for i in value if i.get("included") and Decimal(str(i.get("price") or 0)) > 0
+    ]
+    return {"removed": removed, "added": added} if removed or added else None
+
+
 class OrderItemCreate(BaseModel):
     dish_id: int
     quantity: int
@@ -106,6 +131,32 @@ class OrderCreate(BaseModel):
     items: list[OrderItemCreate]
 
 
+# --- Cart quote ---
+
+
+class CartQuoteRequest(BaseModel):
+    items: list[OrderItemCreate]
+    coupon_code: Optional[str] = None
+
+
+class QuoteLineResponse(BaseModel):
+    dish_id: int
+    dish_name: str
+    quantity: int
+    unit_price: Decimal
+    line_total: Decimal
+
+
+class CartQuoteResponse(BaseModel):
+    lines: list[QuoteLineResponse]
+    items_total: Decimal
+    discount: Decimal
+    total: Decimal
+    min_order: Decimal
+    meets_minimum: bool
+    coupon_valid: Optional[bool] = None  # None when no code was sent
+
+
 # --- Order response ---
 
 
@@ -115,10 +166,12 @@ class OrderItemResponse(BaseModel):
     dish_name: str
     base_price: Decimal
     quantity: int
-    ingredients_snapshot: Optional[str] = None
-    extras_snapshot: Optional[str] = None
+    ingredients_snapshot: Optional[IngredientChanges] = None
+    extras_snapshot: Optional[list[ExtraSnapshot]] = None
     item_total: Decimal
 
+    _changes = field_validator("ingredients_snapshot", mode="before")(ingredient_changes)
+
 
 class OrderResponse(BaseModel):
     id: int
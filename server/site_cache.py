@@ -0,0 +1,46 @@
+"""
+Cached public payloads outside the menu: active event banners and the public
+site config. Admin banner and settings endpoints invalidate them on commit.
+"""
+
+import os
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from http_cache import PayloadCache
+from models import EventBanner, SiteSetting
+
+SITE_CACHE_TTL = float(os.getenv("SITE_CACHE_TTL", "60"))
+
+
+async def _load_banners(db: AsyncSession) -> list[dict]:
+    result = await db.execute(
+        select(EventBanner).where(EventBanner.is_active.is_(True))
+        .order_by(EventBanner.created_at.desc())
+    )
+    return [
+        {
+            "id": b.id,
+            "title": b.title,
+            "subtitle": b.subtitle,
+            "image_url": b.image_url,
+            "link_url": b.link_url,
+        }
+        for b in result.scalars().all()
+    ]
+
+
+async def _load_site_config(db: AsyncSession) -> dict:
+    result = await db.execute(select(SiteSetting))
+    settings = {s.key: s.value for s in result.scalars().all()}
+    return {"phone": settings.get("phone", "+48 123 456 789")}
+
+
+banners = PayloadCache(_load_banners, SITE_CACHE_TTL)
+site_config = PayloadCache(_load_site_config, SITE_CACHE_TTL)
+
+
+def reset() -> None:
+    banners.reset()
+    site_config.reset()
@@ -0,0 +1,224 @@
+"""
+Kitchen capacity per scheduled 30-minute slot.
+
+Admins set slot_max_orders and/or slot_max_items in the site settings (empty or
+0 means no limit). Every scheduled order books its slot in the slot_load table,
+inside the order's own transaction, with a conditional UPDATE ... RETURNING that
+only matches while the slot has room. The check and the booking are a single
+statement, so concurrent submits cannot overfill a slot.
+
+A slot's row is created on first use from the orders already in it (the new
+order included — it is flushed by then). That's why existing data needs no
+backfill and limits can be switched on at any time. Cancelling an order frees
+its place. Un-cancelling takes it again, ignoring the limits, since that is a
+staff decision.
+"""
+
+import time
+from dataclasses import dataclass
+
+from fastapi import HTTPException
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import Order, OrderItem, SiteSetting, SlotLoad
+from site_cache import SITE_CACHE_TTL
+
+# Setting key -> default; slot_max_orders matches what the checkout page has
+# always shown as "full"
+LIMIT_SETTINGS = {"slot_max_orders": "2", "slot_max_items": ""}
+LAST_SLOT = "22:00"
+MAX_SUGGESTIONS = 3
+
+
+@dataclass(frozen=True)
+class SlotLimits:
+    max_orders: int | None
+    max_items: int | None
+
+
+_limits: SlotLimits | None = None
+_loaded_at = 0.0
+
+
+def invalidate() -> None:
+    global _limits
+    _limits = None
+
+
+def _parse_limit(value: str | None) -> int | None:
+    try:
+        limit = int(value)
+    except (TypeError, ValueError):
+        return None
+    return limit if limit > 0 else None
+
+
+async def get_limits(db: AsyncSession) -> SlotLimits:
+    global _limits, _loaded_at
+    if _limits is None or time.monotonic() - _loaded_at >= SITE_CACHE_TTL:
+        result = await db.execute(
+            select(SiteSetting.key, SiteSetting.value)
+            .where(SiteSetting.key.in_(LIMIT_SETTINGS))
+        )
+        settings = {**LIMIT_SETTINGS, **dict(result.all())}
+        _limits = SlotLimits(
+            max_orders=_parse_limit(settings["slot_max_orders"]),
+            max_items=_parse_limit(settings["slot_max_items"]),
+        )
+        _loaded_at = time.monotonic()
+    return _limits
+
+
+def _order_items(order_id: int):
+    return (
+        select(func.coalesce(func.sum(OrderItem.quantity), 0))
+        .where(OrderItem.order_id == order_id)
+        .scalar_subquery()
+    )
+
+
+def _slot_of(order: Order) -> tuple:
+    return (
+        SlotLoad.scheduled_date == order.scheduled_date,
+        SlotLoad.scheduled_time == order.scheduled_time,
+    )
+
+
+async def book(db: AsyncSession, order: Order, limits: SlotLimits | None = None) -> None:
+    """
+    Book the flushed *order*'s slot in the current transaction. With *limits*,
+    raise 409 — naming the nearest free slots — if the slot is full.
+    """
+    items = _order_items(order.id)
+    where = list(_slot_of(order))
+    if limits and limits.max_orders:
+        where.append(SlotLoad.orders < limits.max_orders)
+    if limits and limits.max_items:
+        where.append(SlotLoad.items + items <= limits.max_items)
+    claim = (
+        update(SlotLoad)
+        .where(*where)
+        .values(orders=SlotLoad.orders + 1, items=SlotLoad.items + items)
+        .returning(SlotLoad.orders)
+        .execution_options(synchronize_session=False)
+    )
+    if (await db.execute(claim)).first() is not None:
+        return
+
+    # Either the slot is full or it has no row yet
+    try:
+        async with db.begin_nested():
+            orders, booked_items = (await db.execute(_init_row(order))).one()
+    except IntegrityError:
+        # A concurrent order created the row first
+        if (await db.execute(claim)).first() is not None:
+            return
+    else:
+        if not _over(limits, orders, booked_items):
+            return
+
+    raise HTTPException(status_code=409, detail=await _full_message(db, order, limits))
+
+
+def _init_row(order: Order):
+    in_slot = (
+        Order.scheduled_date == order.scheduled_date,
+        Order.scheduled_time == order.scheduled_time,
+        Order.status != "cancelled",
+    )
+    return (
+        insert(SlotLoad)
+        .values(
+            scheduled_date=order.scheduled_date,
+            scheduled_time=order.scheduled_time,
+            orders=select(func.count(Order.id)).where(*in_slot).scalar_subquery(),
+            items=(
+                select(func.coalesce(func.sum(OrderItem.quantity), 0))
+                .join(Order, OrderItem.order_id == Order.id)
+                .where(*in_slot)
+                .scalar_subquery()
+            ),
+        )
+        .returning(SlotLoad.orders, SlotLoad.items)
+    )
+
+
+def _over(limits: SlotLimits | None, orders: int, items: int) -> bool:
+    if not limits:
+        return False
+    return bool(
+        (limits.max_orders and orders > limits.max_orders)
+        or (limits.max_items and items > limits.max_items)
+    )
+
+
+
+async def status_changed(db: AsyncSession, order: Order, old_status: str) -> None:
+    """Book or free the slot when an order is (un)cancelled, before committing."""
+    await statuses_changed(db, [(order, old_status)])
+
+
+async def statuses_changed(db: AsyncSession, changes: list[tuple[Order, str]]) -> None:
+    """
+    status_changed() for (order, old status) pairs: one UPDATE per slot with
+    the net change. A slot without a row is left alone; the row counts the
+    orders already in the slot when it is created.
+    """
+    moved = [
+        (order, 1 if order.status != "cancelled" else -1)
+        for order, old_status in changes
+        if order.scheduled_date and order.scheduled_time
+        and (old_status != "cancelled") != (order.status != "cancelled")
+    ]
+    if not moved:
+        return
+    result = await db.execute(
+        select(OrderItem.order_id, func.sum(OrderItem.quantity))
+        .where(OrderItem.order_id.in_([order.id for order, _ in moved]))
+        .group_by(OrderItem.order_id)
+    )
+    items = dict(result.all())
+    slots: dict[tuple, tuple[int, int]] = {}
+    for order, sign in moved:
+        key = (order.scheduled_date, order.scheduled_time)
+        orders, booked = slots.get(key, (0, 0))
+        slots[key] = (orders + sign, booked + sign * items.get(order.id, 0))
+
+    # Sorted, so concurrent transactions lock the rows in the same order
+    for (day, slot), (orders, booked) in sorted(slots.items()):
+        if not orders and not booked:
+            continue
+        await db.execute(
+            update(SlotLoad)
+            .where(SlotLoad.scheduled_date == day, SlotLoad.scheduled_time == slot)
+            .values(orders=SlotLoad.orders + orders, items=SlotLoad.items + booked)
+            .execution_options(synchronize_session=False)
+        )
+
+
+def _later_slots(slot: str):
+    hours, minutes = map(int, slot.split(":"))
+    t = hours * 60 + minutes - minutes % 30 + 30
+    while f"{t // 60:02d}:{t % 60:02d}" <= LAST_SLOT:
+        yield f"{t // 60:02d}:{t % 60:02d}"
+        t += 30
+
+
+async def _full_message(db: AsyncSession, order: Order, limits: SlotLimits | None) -> str:
+    items = (await db.execute(select(_order_items(order.id)))).scalar_one()
+    result = await db.execute(
+        select(SlotLoad.scheduled_time, SlotLoad.orders, SlotLoad.items)
+        .where(SlotLoad.scheduled_date == order.scheduled_date)
+    )
+    load = {slot: (orders, booked) for slot, orders, booked in result.all()}
+    free = [
+        slot for slot in _later_slots(order.scheduled_time)
+        if not _over(limits, load.get(slot, (0, 0))[0] + 1, load.get(slot, (0, 0))[1] + items)
+    ][:MAX_SUGGESTIONS]
+
+    message = f"Termin {order.scheduled_time} jest już pełny."
+    if free:
+        return f"{message} Wolne terminy: {', '.join(free)}"
+    return f"{message} Wybierz inny dzień."
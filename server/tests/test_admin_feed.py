@@ -0,0 +1,138 @@
+import asyncio
+import json
+
+import pytest
+
+import admin_feed
+from conftest import auth_header
+from main import app
+from tests.test_orders import order_payload
+
+
+class Closed(Exception):
+    def __init__(self, code):
+        self.code = code
+
+
+class FeedSocket:
+    """Drives the ASGI app's WebSocket endpoint in the test's own event loop."""
+
+    def __init__(self, path="/api/admin/feed"):
+        self.path = path
+        self.to_app: asyncio.Queue = asyncio.Queue()
+        self.from_app: asyncio.Queue = asyncio.Queue()
+
+    async def __aenter__(self):
+        scope = {
+            "type": "websocket", "asgi": {"version": "3.0"}, "scheme": "ws",
+            "path": self.path, "raw_path": self.path.encode(), "root_path": "",
+            "query_string": b"", "headers": [], "subprotocols": [],
+            "server": ("test", 80), "client": ("test", 1234),
+        }
+        self.task = asyncio.create_task(app(scope, self.to_app.get, self.from_app.put))
+        await self.to_app.put({"type": "websocket.connect"})
+        assert (await self._next())["type"] == "websocket.accept"
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.to_app.put({"type": "websocket.disconnect", "code": 1000})
+        await asyncio.wait_for(self.task, 2)
+
+    async def _next(self):
+        return await asyncio.wait_for(self.from_app.get(), 2)
+
+    async def send_json(self, data):
+        await self.to_app.put({"type": "websocket.receive", "text": json.dumps(data)})
+
+    async def receive_json(self):
+        message = await self._next()
+        if message["type"] == "websocket.close":
+            raise Closed(message["code"])
+        return json.loads(message["text"])
+
+
+async def receive_until(ws, type):
+    while (event := await ws.receive_json())["type"] != type:
+        pass
+    return event
+
+
+async def test_feed_rejects_non_admins(client, registered_user):
+    _, token = registered_user
+    for hello, code in [
+        ({"token": "garbage"}, admin_feed.CLOSE_UNAUTHORIZED),
+        ({"token": token}, admin_feed.CLOSE_FORBIDDEN),
+    ]:
+        async with FeedSocket() as ws:
+            await ws.send_json(hello)
+            with pytest.raises(Closed) as closed:
+                await ws.receive_json()
+            assert closed.value.code == code
+
+
+async def test_new_order_and_status_change_pushed(client, seed_menu, admin_user):
+    _, admin_token = admin_user
+    async with FeedSocket() as ws:
+        await ws.send_json({"token": admin_token})
+        hello = await ws.receive_json()
+        assert hello["type"] == "hello" and hello["resumed"] is False
+
+        order = (await client.post("/api/orders", json=order_payload(seed_menu.id))).json()
+        created = await ws.receive_json()
+        assert created["type"] == "order.created"
+        assert created["seq"] == hello["seq"] + 1
+        assert created["data"]["order"]["id"] == order["id"]
+        assert created["data"]["order"]["items"][0]["dish_name"] == "Margherita"
+        notification = await ws.receive_json()
+        assert notification["type"] == "notification.created"
+        assert notification["data"]["unread"] == {"order": 1}
+
+        await client.patch(
+            f"/api/admin/orders/{order['id']}",
+            json={"status": "confirmed", "eta_minutes": 30},
+            headers=auth_header(admin_token),
+        )
+        assert (await ws.receive_json())["data"] == {
+            "id": order["id"], "status": "confirmed", "eta_minutes": 30,
+        }
+
+        await client.post("/api/admin/notifications/read-all", headers=auth_header(admin_token))
+        read = await ws.receive_json()
+        assert read["type"] == "notifications.read"
+        assert read["data"] == {"ids": [notification["data"]["notification"]["id"]], "unread": {"order": -1}}
+
+
+async def test_reconnect_resumes_from_seq(client, seed_menu, admin_user):
+    _, admin_token = admin_user
+    async with FeedSocket() as ws:
+        await ws.send_json({"token": admin_token})
+        hello = await ws.receive_json()
+
+    # Missed while disconnected
+    order = (await client.post("/api/orders", json=order_payload(seed_menu.id))).json()
+
+    async with FeedSocket() as ws:
+        await ws.send_json({"token": admin_token, "epoch": hello["epoch"], "seq": hello["seq"]})
+        resumed = await ws.receive_json()
+        assert resumed["resumed"] is True
+        replayed = await ws.receive_json()
+        assert replayed["seq"] == hello["seq"] + 1
+        assert replayed["data"]["order"]["id"] == order["id"]
+        assert (await ws.receive_json())["type"] == "notification.created"
+
+    # A restarted server (different epoch) can't resume — the client reloads
+    async with FeedSocket() as ws:
+        await ws.send_json({"token": admin_token, "epoch": "stale", "seq": hello["seq"]})
+        hello = await ws.receive_json()
+        assert hello["resumed"] is False
+
+
+async def test_backlog_gap_forces_reload():
+    feed = admin_feed.AdminFeed(backlog=2)
+    for n in range(4):
+        feed.publish("test", {"n": n})
+
+    assert [e["seq"] for e in feed.since(2)] == [3, 4]
+    assert feed.since(4) == []
+    assert feed.since(1) is None  # event 2 is gone
+    assert feed.since(9) is None
@@ -0,0 +1,181 @@
+from datetime import date, datetime
+
+from sqlalchemy import event, select, update
+
+import admin_feed
+import admin_stats
+from conftest import auth_header
+from models import DailySales, Order
+from tests.test_orders import order_payload
+
+
+async def place_orders(client, dish_id, n, **overrides):
+    return [
+        (await client.post("/api/orders", json=order_payload(dish_id, **overrides))).json()["id"]
+        for _ in range(n)
+    ]
+
+
+async def test_list_orders_pages_by_cursor(client, seed_menu, admin_user):
+    _, token = admin_user
+    ids = await place_orders(client, seed_menu.id, 5)
+
+    seen, after = [], None
+    while True:
+        params = {"limit": 2} | ({"after": after} if after else {})
+        page = (await client.get("/api/admin/orders", params=params, headers=auth_header(token))).json()
+        seen += [o["id"] for o in page["orders"]]
+        assert "items" not in page["orders"][0]
+        after = page["next_cursor"]
+        if after is None:
+            break
+    # Same created_at second for all of them: the id breaks the tie
+    assert seen == sorted(ids, reverse=True)
+
+
+async def test_list_orders_page_stable_under_new_orders(client, seed_menu, admin_user):
+    _, token = admin_user
+    ids = await place_orders(client, seed_menu.id, 4)
+    first = (await client.get("/api/admin/orders?limit=2", headers=auth_header(token))).json()
+    await place_orders(client, seed_menu.id, 3)
+    second = (await client.get(
+        f"/api/admin/orders?limit=2&after={first['next_cursor']}", headers=auth_header(token),
+    )).json()
+    assert [o["id"] for o in second["orders"]] == [ids[1], ids[0]]
+    assert second["next_cursor"] is None
+
+
+async def test_list_orders_filters(client, seed_menu, admin_user, db_session):
+    _, token = admin_user
+    [pickup] = await place_orders(
+        client, seed_menu.id, 1, delivery_mode="pickup", city=None, street=None, house_number=None,
+    )
+    [card] = await place_orders(client, seed_menu.id, 1, payment_method="card")
+    [old] = await place_orders(client, seed_menu.id, 1)
+    await db_session.execute(
+        update(Order).where(Order.id == old).values(created_at=datetime(2025, 1, 15, 12))
+    )
+    await db_session.commit()
+
+    async def ids(**params):
+        res = await client.get("/api/admin/orders", params=params, headers=auth_header(token))
+        return [o["id"] for o in res.json()["orders"]]
+
+    assert await ids(delivery_mode="pickup") == [pickup]
+    assert await ids(payment_method="card") == [card]
+    assert await ids(date_from="2025-01-15", date_to="2025-01-15") == [old]
+    assert old not in await ids(date_from=date.today().isoformat())
+    assert await ids(status="cancelled") == []
+
+
+async def test_list_orders_rejects_oversized_page(client, admin_user):
+    _, token = admin_user
+    res = await client.get("/api/admin/orders?limit=10000", headers=auth_header(token))
+    assert res.status_code == 422
+
+
+async def test_order_items_loaded_on_expand(client, seed_menu, admin_user, db_engine):
+    _, token = admin_user
+    [order_id] = await place_orders(client, seed_menu.id, 1)
+
+    statements = []
+    event.listen(
+        db_engine.sync_engine, "before_cursor_execute",
+        lambda conn, cursor, statement, *args: statements.append(statement),
+    )
+    await client.get("/api/admin/orders", headers=auth_header(token))
+    assert not any("order_items" in s for s in statements)
+
+    res = await client.get(f"/api/admin/orders/{order_id}/items", headers=auth_header(token))
+    assert [item["dish_name"] for item in res.json()] == ["Margherita"]
+
+    res = await client.get("/api/admin/orders/999/items", headers=auth_header(token))
+    assert res.status_code == 404
+
+
+async def test_bulk_status_update(client, seed_menu, admin_user, db_engine, db_session):
+    _, token = admin_user
+    ids = await place_orders(client, seed_menu.id, 3)
+    seq = admin_feed.feed.seq
+
+    statements = []
+    event.listen(
+        db_engine.sync_engine, "before_cursor_execute",
+        lambda conn, cursor, statement, *args: statements.append(statement),
+    )
+    res = await client.patch(
+        "/api/admin/orders/bulk",
+        json={"ids": ids[::-1], "status": "cancelled", "eta_minutes": 20},
+        headers=auth_header(token),
+    )
+    assert res.status_code == 200
+    assert [(o["id"], o["status"], o["eta_minutes"]) for o in res.json()] == [
+        (order_id, "cancelled", 20) for order_id in ids
+    ]
+    [bump] = [s for s in statements if s.startswith("UPDATE orders")]
+    assert "RETURNING" in bump and "updated_at" in bump
+    # Same day and dish for all three: one bump of each rollup row
+    assert [s.split()[1] for s in statements if s.startswith("UPDATE")] == [
+        "orders", "daily_sales", "daily_dish_sales",
+    ]
+
+    # The hooks ran for every order, and the panel got a single event
+    day = (await db_session.execute(select(DailySales))).scalar_one()
+    assert (day.orders, day.cancelled) == (0, 3)
+    assert admin_feed.feed.since(seq) == [{
+        "seq": seq + 1, "type": "orders.status",
+        "data": {"orders": [{"id": i, "status": "cancelled", "eta_minutes": 20} for i in ids]},
+    }]
+
+
+async def test_bulk_status_update_all_or_nothing(client, seed_menu, admin_user):
+    _, token = admin_user
+    [order_id] = await place_orders(client, seed_menu.id, 1)
+    res = await client.patch(
+        "/api/admin/orders/bulk",
+        json={"ids": [order_id, 999], "status": "preparing"},
+        headers=auth_header(token),
+    )
+    assert res.status_code == 404
+    res = await client.get(f"/api/orders/{order_id}")
+    assert res.json()["status"] == "pending"
+
+    res = await client.patch(
+        "/api/admin/orders/bulk", json={"ids": [], "status": "preparing"}, headers=auth_header(token),
+    )
+    assert res.status_code == 422
+
+
+# --- Dashboard stats ---
+
+
+async def test_stats_aggregates(client, seed_menu, admin_user):
+    _, token = admin_user
+    *_, cancelled = await place_orders(client, seed_menu.id, 3)
+    await client.patch(
+        f"/api/admin/orders/{cancelled}", json={"status": "cancelled"}, headers=auth_header(token),
+    )
+
+    res = await client.get("/api/admin/stats", headers=auth_header(token))
+    assert res.json() == {
+        "orders_by_status": {"pending": 2, "cancelled": 1},
+        # Two live orders of 2 × 30 zł
+        "today": {"orders": 2, "revenue": "120.00", "average_basket": "60.00"},
+        "active_dishes": 1,
+        "categories": 1,
+        "active_coupons": 1,
+    }
+
+    # Cached: a new order shows up once the TTL runs out
+    await place_orders(client, seed_menu.id, 1)
+    res = await client.get("/api/admin/stats", headers=auth_header(token))
+    assert res.json()["today"]["orders"] == 2
+    admin_stats.stats.invalidate()
+    res = await client.get("/api/admin/stats", headers=auth_header(token))
+    assert res.json()["today"]["orders"] == 3
+
+
+async def test_stats_admin_only(client, registered_user):
+    _, token = registered_user
+    res = await client.get("/api/admin/stats", headers=auth_header(token))
+    assert res.status_code == 403
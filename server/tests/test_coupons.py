@@ -0,0 +1,278 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event, select, update
+
+from conftest import auth_header
+from models import Coupon, CouponUsage, Order
+from tests.test_orders import order_payload
+
+
+@pytest.fixture
+def db_engine(file_db_engine):
+    return file_db_engine
+
+
+async def set_limits(db_session, **limits):
+    await db_session.execute(update(Coupon).where(Coupon.code == "SZAMMA10").values(**limits))
+    await db_session.commit()
+
+
+async def redemption_count(db_session):
+    return (await db_session.execute(
+        select(Coupon.redemption_count).where(Coupon.code == "SZAMMA10")
+    )).scalar_one()
+
+
+# --- Global cap ---
+
+
+async def test_coupon_cap_holds_under_concurrent_checkouts(client, seed_menu, db_session):
+    await set_limits(db_session, max_redemptions=25)
+    await client.get("/api/menu")  # warm the caches so requests go straight to the write
+
+    results = await asyncio.gather(*[
+        client.post("/api/orders", json=order_payload(seed_menu.id, coupon_code="SZAMMA10"))
+        for _ in range(200)
+    ])
+
+    codes = [r.status_code for r in results]
+    assert codes.count(201) == 25
+    assert codes.count(409) == 175
+    assert await redemption_count(db_session) == 25
+    orders = (await db_session.execute(select(Order))).scalars().all()
+    assert len(orders) == 25
+    assert all(o.discount == 6 for o in orders)
+
+
+async def test_exhausted_coupon_rejected(client, seed_menu, db_session):
+    await set_limits(db_session, max_redemptions=1)
+    payload = order_payload(seed_menu.id, coupon_code="SZAMMA10")
+
+    assert (await client.post("/api/orders", json=payload)).status_code == 201
+    res = await client.post("/api/orders", json=payload)
+    assert res.status_code == 409
+    assert "wyczerpany" in res.json()["detail"]
+    # Without the code the same order goes through
+    assert (await client.post("/api/orders", json=order_payload(seed_menu.id))).status_code == 201
+
+
+async def test_coupon_claim_is_last_before_commit(client, seed_menu, db_session, db_engine):
+    await set_limits(db_session, max_redemptions=5)
+    await client.get("/api/menu")
+    statements = []
+    event.listen(
+        db_engine.sync_engine, "before_cursor_execute",
+        lambda conn, cursor, statement, *args: statements.append(statement),
+    )
+
+    res = await client.post("/api/orders", json=order_payload(seed_menu.id, coupon_code="SZAMMA10"))
+
+    assert res.status_code == 201
+    # The daily rollups are bumped first, so the coupon row is locked for one round trip
+    assert statements[-1].startswith("UPDATE coupons")
+
+
+async def test_unlimited_coupon_takes_no_row_lock(client, seed_menu, db_session, db_engine):
+    await client.get("/api/menu")
+    await client.post("/api/coupons/validate", json={"code": "SZAMMA10"})
+    statements = []
+    event.listen(
+        db_engine.sync_engine, "before_cursor_execute",
+        lambda conn, cursor, statement, *args: statements.append(statement),
+    )
+
+    res = await client.post("/api/orders", json=order_payload(seed_menu.id, coupon_code="SZAMMA10"))
+
+    assert res.status_code == 201
+    assert not [s for s in statements if s.startswith(("UPDATE coupon", "INSERT INTO coupon"))]
+    assert await redemption_count(db_session) == 0
+
+
+# --- Per-user cap ---
+
+
+async def test_per_user_limit(client, seed_menu, registered_user, db_session):
+    user, token = registered_user
+    await set_limits(db_session, max_per_user=2)
+    payload = order_payload(seed_menu.id, coupon_code="SZAMMA10")
+
+    for _ in range(2):
+        res = await client.post("/api/orders", json=payload, headers=auth_header(token))
+        assert res.status_code == 201
+    res = await client.post("/api/orders", json=payload, headers=auth_header(token))
+    assert res.status_code == 409
+
+    usage = (await db_session.execute(select(CouponUsage))).scalar_one()
+    assert (usage.user_id, usage.redemptions) == (user.id, 2)
+
+
+async def test_per_user_coupon_requires_login(client, seed_menu, db_session):
+    await set_limits(db_session, max_per_user=1)
+
+    res = await client.post("/api/coupons/validate", json={"code": "SZAMMA10"})
+    assert res.json()["valid"] is False
+    assert "Zaloguj" in res.json()["message"]
+
+    res = await client.post("/api/orders", json=order_payload(seed_menu.id, coupon_code="SZAMMA10"))
+    assert res.status_code == 400
+
+
+async def test_validate_needs_no_user_lookup(client, seed_menu, registered_user, db_session, db_engine):
+    _, token = registered_user
+    await set_limits(db_session, max_per_user=1)
+    await client.post("/api/coupons/validate", json={"code": "SZAMMA10"})
+    statements = []
+    event.listen(
+        db_engine.sync_engine, "before_cursor_execute",
+        lambda conn, cursor, statement, *args: statements.append(statement),
+    )
+
+    res = await client.post(
+        "/api/coupons/validate", json={"code": "SZAMMA10"}, headers=auth_header(token),
+    )
+
+    assert res.json()["valid"] is True
+    assert statements == []
+
+
+# --- Cancellation ---
+
+
+async def test_cancelling_gives_the_use_back(client, seed_menu, registered_user, admin_user, db_session):
+    user, token = registered_user
+    _, admin_token = admin_user
+    await set_limits(db_session, max_redemptions=1, max_per_user=1)
+    payload = order_payload(seed_menu.id, coupon_code="SZAMMA10")
+    order = (await client.post("/api/orders", json=payload, headers=auth_header(token))).json()
+    assert await redemption_count(db_session) == 1
+
+    async def set_status(status):
+        res = await client.patch(
+            f"/api/admin/orders/{order['id']}", json={"status": status},
+            headers=auth_header(admin_token),
+        )
+        assert res.status_code == 200
+
+    async def usage():
+        db_session.expire_all()
+        return (await db_session.execute(select(CouponUsage.redemptions))).scalar_one()
+
+    await set_status("cancelled")
+    assert (await redemption_count(db_session), await usage()) == (0, 0)
+
+    # Staff can bring the order back even if the code was used up meanwhile
+    assert (await client.post("/api/orders", json=payload, headers=auth_header(token))).status_code == 201
+    await set_status("pending")
+    assert (await redemption_count(db_session), await usage()) == (2, 2)
+
+    # Other status changes leave the counts alone
+    await set_status("confirmed")
+    assert await redemption_count(db_session) == 2
+
+
+async def test_bulk_cancel_gives_uses_back_once_per_row(client, seed_menu, registered_user, admin_user, db_session, db_engine):
+    user, token = registered_user
+    _, admin_token = admin_user
+    await set_limits(db_session, max_redemptions=5, max_per_user=3)
+    payload = order_payload(seed_menu.id, coupon_code="SZAMMA10")
+    ids = [
+        (await client.post("/api/orders", json=payload, headers=auth_header(token))).json()["id"]
+        for _ in range(3)
+    ]
+    statements = []
+    event.listen(
+        db_engine.sync_engine, "before_cursor_execute",
+        lambda conn, cursor, statement, *args: statements.append(statement),
+    )
+
+    res = await client.patch(
+        "/api/admin/orders/bulk", json={"ids": ids, "status": "cancelled"},
+        headers=auth_header(admin_token),
+    )
+
+    assert res.status_code == 200
+    assert len([s for s in statements if s.startswith("UPDATE coupons")]) == 1
+    assert len([s for s in statements if s.startswith("UPDATE coupon_usage")]) == 1
+    assert await redemption_count(db_session) == 0
+    usage = (await db_session.execute(select(CouponUsage))).scalar_one()
+    await db_session.refresh(usage)
+    assert usage.redemptions == 0
+
+
+async def test_order_without_discount_releases_nothing(client, seed_menu, admin_user, db_session):
+    _, admin_token = admin_user
+    await set_limits(db_session, max_redemptions=5, redemption_count=3)
+    order = (await client.post(
+        "/api/orders", json=order_payload(seed_menu.id, coupon_code="NIEMA"),
+    )).json()
+
+    await client.patch(
+        f"/api/admin/orders/{order['id']}", json={"status": "cancelled"},
+        headers=auth_header(admin_token),
+    )
+    assert await redemption_count(db_session) == 3
+
+
+# --- Validity window ---
+
+
+async def test_expired_coupon(client, seed_menu, db_session):
+    await set_limits(db_session, valid_until=datetime.now() - timedelta(days=1))
+
+    res = await client.post("/api/coupons/validate", json={"code": "SZAMMA10"})
+    assert res.json()["valid"] is False
+    assert res.json()["message"] == "Kod rabatowy wygasł"
+
+    res = await client.post("/api/orders", json=order_payload(seed_menu.id, coupon_code="SZAMMA10"))
+    assert res.status_code == 400
+
+
+async def test_coupon_not_yet_valid(client, seed_menu, db_session):
+    await set_limits(db_session, valid_from=datetime.now() + timedelta(days=1))
+
+    res = await client.post(
+        "/api/cart/quote",
+        json={"items": [{"dish_id": seed_menu.id, "quantity": 2}], "coupon_code": "SZAMMA10"},
+    )
+    assert res.json()["coupon_valid"] is False
+    assert float(res.json()["discount"]) == 0
+
+
+async def test_admin_sets_limits(client, seed_menu, admin_user, db_session):
+    _, token = admin_user
+    res = await client.post(
+        "/api/admin/coupons",
+        json={
+            "code": "pierwsze500", "discount_percent": 20, "max_redemptions": 500,
+            "valid_until": (datetime.now() + timedelta(days=7)).isoformat(),
+        },
+        headers=auth_header(token),
+    )
+    assert res.status_code == 201
+    assert res.json()["max_redemptions"] == 500
+    assert res.json()["redemption_count"] == 0
+
+    res = await client.post(
+        "/api/orders", json=order_payload(seed_menu.id, coupon_code="PIERWSZE500"),
+    )
+    assert float(res.json()["discount"]) == 12
+
+    coupons = (await client.get("/api/admin/coupons", headers=auth_header(token))).json()
+    assert {c["code"]: c["redemption_count"] for c in coupons}["PIERWSZE500"] == 1
+
+
+async def test_admin_window_with_timezone_is_stored_naive(client, seed_menu, admin_user, db_session):
+    _, token = admin_user
+    res = await client.post(
+        "/api/admin/coupons",
+        json={"code": "STREFA", "discount_percent": 5, "valid_until": "2099-01-01T12:00:00+02:00"},
+        headers=auth_header(token),
+    )
+    assert res.status_code == 201
+    valid_until = datetime.fromisoformat(res.json()["valid_until"])
+    assert valid_until.tzinfo is None
+
+    res = await client.post("/api/coupons/validate", json={"code": "STREFA"})
+    assert res.json()["valid"] is True
@@ -0,0 +1,174 @@
+from sqlalchemy import select
+
+import menu_cache
+from conftest import auth_header
+from models import Dish, MenuChange, MenuVersion
+
+
+# --- Snapshot cache ---
+
+
+async def test_menu_served_from_snapshot(client, seed_menu, db_session):
+    first = await client.get("/api/menu")
+    assert first.json()[0]["name"] == "Margherita"
+
+    # A write that bypasses the admin API is not seen until the snapshot is rebuilt
+    dish = await db_session.get(Dish, seed_menu.id)
+    dish.name = "Capricciosa"
+    await db_session.commit()
+
+    second = await client.get("/api/menu")
+    assert second.json()[0]["name"] == "Margherita"
+
+
+async def test_admin_dish_update_invalidates_menu(client, seed_menu, admin_user):
+    _, token = admin_user
+    await client.get("/api/menu")
+
+    res = await client.patch(
+        f"/api/admin/dishes/{seed_menu.id}",
+        json={"name": "Capricciosa", "base_price": "32"},
+        headers=auth_header(token),
+    )
+    assert res.status_code == 200
+
+    data = (await client.get("/api/menu")).json()
+    assert data[0]["name"] == "Capricciosa"
+    assert data[0]["price"] == 32
+
+
+async def test_admin_dish_deactivate_removes_from_menu(client, seed_menu, admin_user):
+    _, token = admin_user
+    assert len((await client.get("/api/menu")).json()) == 1
+
+    await client.patch(
+        f"/api/admin/dishes/{seed_menu.id}",
+        json={"is_active": False},
+        headers=auth_header(token),
+    )
+    assert (await client.get("/api/menu")).json() == []
+
+
+async def test_admin_extra_link_invalidates_menu(client, seed_menu, admin_user):
+    _, token = admin_user
+    before = (await client.get("/api/menu")).json()
+    dish = (await client.get("/api/admin/dishes", headers=auth_header(token))).json()[0]
+    de_id = dish["extras"][0]["id"]
+
+    await client.patch(
+        f"/api/admin/dishes/{seed_menu.id}/extras/{de_id}",
+        json={"price": "7"},
+        headers=auth_header(token),
+    )
+    after = (await client.get("/api/menu")).json()
+    assert before[0]["extras"][0]["price"] == 5
+    assert after[0]["extras"][0]["price"] == 7
+
+
+# --- ETag / If-None-Match ---
+
+
+async def test_menu_etag_not_modified(client, seed_menu):
+    first = await client.get("/api/menu")
+    etag = first.headers["etag"]
+    assert first.headers["cache-control"] == "no-cache"
+
+    res = await client.get("/api/menu", headers={"If-None-Match": etag})
+    assert res.status_code == 304
+    assert res.content == b""
+    assert res.headers["etag"] == etag
+
+
+async def test_menu_etag_accepts_weak_and_lists(client, seed_menu):
+    etag = (await client.get("/api/menu")).headers["etag"]
+    res = await client.get("/api/menu", headers={"If-None-Match": f'"stale", W/{etag}'})
+    assert res.status_code == 304
+
+
+async def test_menu_etag_changes_after_admin_edit(client, seed_menu, admin_user):
+    _, token = admin_user
+    etag = (await client.get("/api/menu")).headers["etag"]
+
+    await client.patch(
+        f"/api/admin/dishes/{seed_menu.id}",
+        json={"name": "Capricciosa"},
+        headers=auth_header(token),
+    )
+    res = await client.get("/api/menu", headers={"If-None-Match": etag})
+    assert res.status_code == 200
+    assert res.headers["etag"] != etag
+    assert res.json()[0]["name"] == "Capricciosa"
+
+
+async def test_categories_etag_not_modified(client, seed_menu):
+    first = await client.get("/api/categories")
+    res = await client.get("/api/categories", headers={"If-None-Match": first.headers["etag"]})
+    assert res.status_code == 304
+
+
+# --- Delta sync ---
+
+
+async def test_menu_changes_since_version(client, seed_menu, admin_user):
+    _, token = admin_user
+    res = await client.get("/api/menu")
+    version = int(res.headers["x-menu-version"])
+
+    res = await client.get("/api/menu/changes", params={"since": version})
+    assert res.json() == {"version": version, "reset": False, "changed": [], "removed": []}
+
+    await client.patch(
+        f"/api/admin/dishes/{seed_menu.id}",
+        json={"name": "Capricciosa"},
+        headers=auth_header(token),
+    )
+    data = (await client.get("/api/menu/changes", params={"since": version})).json()
+    assert data["version"] > version
+    assert [d["name"] for d in data["changed"]] == ["Capricciosa"]
+    assert data["removed"] == []
+
+
+async def test_menu_changes_reports_removed_dishes(client, seed_menu, admin_user):
+    _, token = admin_user
+    version = int((await client.get("/api/menu")).headers["x-menu-version"])
+
+    created = await client.post(
+        "/api/admin/dishes",
+        json={"name": "Diavola", "category_id": 1, "base_price": "34"},
+        headers=auth_header(token),
+    )
+    await client.delete(f"/api/admin/dishes/{seed_menu.id}", headers=auth_header(token))
+
+    data = (await client.get("/api/menu/changes", params={"since": version})).json()
+    assert [d["id"] for d in data["changed"]] == [created.json()["id"]]
+    assert data["removed"] == [seed_menu.id]
+
+
+async def test_menu_version_comes_from_the_counter_not_ids(client, seed_menu, db_session):
+    # Say menu_changes ids ran ahead (a sequence jump or an aborted transaction)
+    db_session.add(MenuChange(id=900, dish_id=seed_menu.id, version=0))
+    await db_session.commit()
+
+    await menu_cache.record_change(db_session, seed_menu.id)
+    await db_session.commit()
+    await menu_cache.record_change(db_session, seed_menu.id)
+    await db_session.commit()
+    menu_cache.invalidate()
+
+    data = (await client.get("/api/menu/changes", params={"since": 1})).json()
+    assert data["version"] == 2
+    assert [d["id"] for d in data["changed"]] == [seed_menu.id]
+    assert (await db_session.execute(select(MenuVersion.version))).scalar_one() == 2
+
+
+async def test_menu_changes_future_version_requests_reset(client, seed_menu):
+    data = (await client.get("/api/menu/changes", params={"since": 1000})).json()
+    assert data["reset"] is True
+
+
+# --- Flattened loader ---
+
+
+async def test_flat_loader_matches_orm_loader(seed_menu, db_session):
+    menu, _ = await menu_cache.load_menu(db_session)
+    assert menu == await menu_cache.load_menu_orm(db_session)
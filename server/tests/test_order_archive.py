@@ -0,0 +1,74 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+import order_archive
+from conftest import auth_header
+from models import Order, OrderArchive, OrderItem, OrderItemArchive
+from tests.test_admin_orders import place_orders
+
+
+async def age(db_session, order_id, days):
+    await db_session.execute(
+        update(Order).where(Order.id == order_id)
+        .values(created_at=datetime.now() - timedelta(days=days))
+    )
+    await db_session.commit()
+
+
+async def count(db_session, model):
+    return (await db_session.execute(select(func.count()).select_from(model))).scalar_one()
+
+
+async def test_archive_moves_only_old_finished_orders(client, seed_menu, admin_user, db_session, db_engine):
+    _, token = admin_user
+    old_done, old_cancelled, old_pending, recent_done = await place_orders(client, seed_menu.id, 4)
+    for order_id, status in [(old_done, "completed"), (old_cancelled, "cancelled"), (recent_done, "completed")]:
+        await client.patch(
+            f"/api/admin/orders/{order_id}", json={"status": status}, headers=auth_header(token),
+        )
+    for order_id in (old_done, old_cancelled, old_pending):
+        await age(db_session, order_id, 200)
+
+    sessions = async_sessionmaker(db_engine, class_=AsyncSession, expire_on_commit=False)
+    assert await order_archive.archive(sessions, days=180, batch=1) == 2
+
+    hot = (await db_session.execute(select(Order.id).order_by(Order.id))).scalars().all()
+    assert hot == [old_pending, recent_done]
+    archived = (await db_session.execute(select(OrderArchive.id).order_by(OrderArchive.id))).scalars().all()
+    assert archived == [old_done, old_cancelled]
+    assert await count(db_session, OrderItem) == 2
+    assert await count(db_session, OrderItemArchive) == 2
+
+
+async def test_archived_orders_still_readable(client, seed_menu, admin_user, db_session, db_engine):
+    _, token = admin_user
+    old, recent = await place_orders(client, seed_menu.id, 2)
+    await client.patch(f"/api/admin/orders/{old}", json={"status": "completed"}, headers=auth_header(token))
+    await age(db_session, old, 400)
+    before = (await client.get(f"/api/orders/{old}")).json()
+    sessions = async_sessionmaker(db_engine, class_=AsyncSession, expire_on_commit=False)
+    assert await order_archive.archive(sessions) == 1
+
+    # By id, unchanged
+    res = await client.get(f"/api/orders/{old}")
+    assert res.json() == before
+    res = await client.get(f"/api/orders/{old}", headers={"If-None-Match": res.headers["etag"]})
+    assert res.status_code == 304
+
+    # In the admin list, in order and across pages
+    first = (await client.get("/api/admin/orders?limit=1", headers=auth_header(token))).json()
+    assert [o["id"] for o in first["orders"]] == [recent]
+    second = (await client.get(
+        f"/api/admin/orders?limit=1&after={first['next_cursor']}", headers=auth_header(token),
+    )).json()
+    assert [o["id"] for o in second["orders"]] == [old]
+    assert second["orders"][0]["status"] == "completed"
+    assert second["next_cursor"] is None
+
+    res = await client.get(f"/api/admin/orders/{old}/items", headers=auth_header(token))
+    assert [item["dish_name"] for item in res.json()] == ["Margherita"]
+
+    stats = (await client.get("/api/admin/stats", headers=auth_header(token))).json()
+    assert stats["orders_by_status"] == {"pending": 1, "completed": 1}
@@ -0,0 +1,203 @@
+import asyncio
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+import events
+from auth import create_access_token
+from conftest import auth_header
+from database import get_db
+from main import app
+from models import Order, User
+from tests.test_orders import order_payload
+
+
+class FakeRequest:
+    def __init__(self):
+        self.disconnected = False
+
+    async def is_disconnected(self):
+        return self.disconnected
+
+
+async def test_admin_status_change_published(client, seed_menu, registered_user, admin_user):
+    user, token = registered_user
+    _, admin_token = admin_user
+    order = (await client.post(
+        "/api/orders", json=order_payload(seed_menu.id), headers=auth_header(token),
+    )).json()
+
+    with events.bus.subscribe(events.order_topic(order["id"])) as by_order, \
+            events.bus.subscribe(events.user_topic(user.id)) as by_user:
+        await client.patch(
+            f"/api/admin/orders/{order['id']}",
+            json={"status": "confirmed", "eta_minutes": 35},
+            headers=auth_header(admin_token),
+        )
+        expected = {"type": "order", "id": order["id"], "status": "confirmed", "eta_minutes": 35}
+        assert by_order.get_nowait() == expected
+        assert by_user.get_nowait() == expected
+
+    assert events.bus.subscriber_count(events.order_topic(order["id"])) == 0
+
+
+async def test_stream_sends_ready_events_and_heartbeats(monkeypatch):
+    monkeypatch.setattr(events, "SSE_HEARTBEAT", 0.01)
+    request = FakeRequest()
+    stream = events.stream(request, "order:1")
+
+    assert await anext(stream) == 'event: ready\ndata: {"type": "ready"}\n\n'
+    events.bus.publish("order:1", {"type": "order", "id": 1, "status": "preparing", "eta_minutes": None})
+    assert (await anext(stream)).startswith('event: order\ndata: {"type": "order", "id": 1')
+    assert await anext(stream) == ": ping\n\n"
+
+    request.disconnected = True
+    assert [chunk async for chunk in stream] == []
+    assert events.bus.subscriber_count("order:1") == 0
+
+
+async def test_slow_subscriber_drops_oldest_events():
+    bus = events.EventBus(queue_size=2)
+    with bus.subscribe("t") as queue:
+        for n in range(3):
+            bus.publish("t", {"n": n})
+        assert [queue.get_nowait(), queue.get_nowait()] == [{"n": 1}, {"n": 2}]
+        assert queue.empty()
+
+
+async def test_event_streams_check_access(client):
+    assert (await client.get("/api/orders/999/events")).status_code == 404
+    assert (await client.get("/api/my-orders/events")).status_code == 401
+
+
+async def test_stream_endpoint_is_event_stream(client, seed_menu, monkeypatch):
+    order = (await client.post("/api/orders", json=order_payload(seed_menu.id))).json()
+
+    # Stand-in for a client that reads the first event and hangs up
+    stream = events.stream
+
+    async def first_event_only(request, *topics):
+        async for chunk in stream(request, *topics):
+            yield chunk
+            return
+
+    monkeypatch.setattr(events, "stream", first_event_only)
+    res = await asyncio.wait_for(client.get(f"/api/orders/{order['id']}/events"), 5)
+    assert res.headers["content-type"].startswith("text/event-stream")
+    assert res.text.startswith("event: ready")
+
+
+class RawStream:
+    """A streaming GET over raw ASGI that stays open until close()."""
+
+    def __init__(self, path, headers):
+        self.path = path
+        self.headers = headers
+        self.to_app: asyncio.Queue = asyncio.Queue()
+        self.from_app: asyncio.Queue = asyncio.Queue()
+
+    async def start(self):
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+            "method": "GET", "scheme": "http", "path": self.path,
+            "raw_path": self.path.encode(), "root_path": "", "query_string": b"",
+            "headers": [(b"host", b"test"), *self.headers],
+            "server": ("test", 80), "client": ("test", 1234),
+        }
+        await self.to_app.put({"type": "http.request", "body": b"", "more_body": False})
+        self.task = asyncio.create_task(app(scope, self.to_app.get, self.from_app.put))
+        start = await asyncio.wait_for(self.from_app.get(), 5)
+        assert start["type"] == "http.response.start" and start["status"] == 200
+
+    async def next_body(self):
+        return (await asyncio.wait_for(self.from_app.get(), 5))["body"]
+
+    async def close(self):
+        await self.to_app.put({"type": "http.disconnect"})
+        await asyncio.wait_for(self.task, 5)
+
+
+async def test_open_streams_hold_no_db_connection(
+    client, file_db_engine, monkeypatch,
+):
+    # Point the app at a pooled file database, where checkouts can be counted
+    session_factory = async_sessionmaker(file_db_engine, class_=AsyncSession, expire_on_commit=False)
+
+    async def file_db():
+        async with session_factory() as session:
+            yield session
+
+    monkeypatch.setitem(app.dependency_overrides, get_db, file_db)
+    async with session_factory() as db:
+        order = Order(
+            delivery_mode="pickup", first_name="Jan", phone="123456789",
+            payment_method="cash", items_total=60, total=60,
+        )
+        db.add(order)
+        await db.commit()
+    async with session_factory() as db:
+        db.add(User(email="sse@test.pl", first_name="Ola", password_hash="x", role="user"))
+        await db.commit()
+        user_id = (await db.execute(select(User.id).where(User.email == "sse@test.pl"))).scalar_one()
+
+    streams = []
+    for path, headers in [
+        (f"/api/orders/{order.id}/events", []),
+        ("/api/my-orders/events", [(b"authorization", f"Bearer {create_access_token(user_id)}".encode())]),
+    ]:
+        stream = RawStream(path, headers)
+        await stream.start()
+        assert (await stream.next_body()).startswith(b"event: ready")
+        streams.append(stream)
+
+    assert file_db_engine.pool.checkedout() == 0
+    for stream in streams:
+        await stream.close()
+
+
+
+# --- Long-poll fallback ---
+
+
+async def test_wait_returns_on_status_change(client, seed_menu, admin_user):
+    _, admin_token = admin_user
+    order = (await client.post("/api/orders", json=order_payload(seed_menu.id))).json()
+
+    waiting = asyncio.create_task(client.get(
+        f"/api/orders/{order['id']}/wait", params={"known_status": "pending", "timeout": 5},
+    ))
+    while not events.bus.subscriber_count(events.order_topic(order["id"])):
+        await asyncio.sleep(0.01)
+    await client.patch(
+        f"/api/admin/orders/{order['id']}",
+        json={"status": "confirmed", "eta_minutes": 25},
+        headers=auth_header(admin_token),
+    )
+
+    res = await asyncio.wait_for(waiting, 2)
+    assert res.json() == {"type": "order", "id": order["id"], "status": "confirmed", "eta_minutes": 25}
+
+
+async def test_wait_answers_at_once_when_status_already_differs(client, seed_menu):
+    order = (await client.post("/api/orders", json=order_payload(seed_menu.id))).json()
+    res = await asyncio.wait_for(client.get(
+        f"/api/orders/{order['id']}/wait", params={"known_status": "confirmed", "timeout": 30},
+    ), 2)
+    assert res.json()["status"] == "pending"
+
+
+async def test_wait_times_out_with_current_status(client, seed_menu):
+    order = (await client.post("/api/orders", json=order_payload(seed_menu.id))).json()
+    res = await client.get(
+        f"/api/orders/{order['id']}/wait", params={"known_status": "pending", "timeout": 0.05},
+    )
+    assert res.json()["status"] == "pending"
+    assert events.bus.subscriber_count(events.order_topic(order["id"])) == 0
+    assert (await client.get("/api/orders/999/wait")).status_code == 404
+
+
+async def test_wait_rejects_bad_timeout(client, seed_menu):
+    order = (await client.post("/api/orders", json=order_payload(seed_menu.id))).json()
+    for timeout in ["nan", "-1", "61"]:
+        res = await client.get(f"/api/orders/{order['id']}/wait", params={"timeout": timeout})
+        assert res.status_code == 422
@@ -0,0 +1,102 @@
+import asyncio
+
+import pytest
+from sqlalchemy import event, select, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+import order_intake
+from models import Coupon, Notification, Order
+from tests.test_orders import order_payload
+
+
+@pytest.fixture
+async def batched_intake(db_engine):
+    session_factory = async_sessionmaker(
+        db_engine, class_=AsyncSession, expire_on_commit=False,
+    )
+    order_intake.start(session_factory, window=0.02)
+    yield
+    await order_intake.stop()
+
+
+@pytest.fixture
+def commit_counter(db_engine):
+    commits = []
+    event.listen(db_engine.sync_engine, "commit", lambda conn: commits.append(conn))
+    return commits
+
+
+async def test_batched_orders_share_one_commit(client, seed_menu, batched_intake, commit_counter, db_session):
+    results = await asyncio.gather(*[
+        client.post("/api/orders", json=order_payload(seed_menu.id)) for _ in range(10)
+    ])
+    assert [r.status_code for r in results] == [201] * 10
+    assert len({r.json()["id"] for r in results}) == 10
+    assert all(r.json()["items"][0]["id"] for r in results)
+
+    assert len((await db_session.execute(select(Order))).scalars().all()) == 10
+    titles = (await db_session.execute(select(Notification.title))).scalars().all()
+    assert sorted(titles) == sorted(f"Nowe zamówienie #{r.json()['id']}" for r in results)
+    # Versus two commits per order in direct mode
+    assert len(commit_counter) < 10
+
+
+async def test_batch_failure_only_fails_offending_order(batched_intake):
+    # first_name is NOT NULL, so the second order breaks the batch
+    def build(first_name):
+        return lambda: Order(
+            delivery_mode="pickup", first_name=first_name, phone="123456789",
+            payment_method="cash", items_total=60, total=60,
+        )
+
+    good, bad = await asyncio.gather(
+        order_intake.writer.submit(build("Jan")),
+        order_intake.writer.submit(build(None)),
+        return_exceptions=True,
+    )
+    assert isinstance(good, Order) and good.id
+    assert isinstance(bad, Exception)
+
+
+async def test_batched_orders_respect_coupon_cap(client, seed_menu, batched_intake, db_session):
+    await db_session.execute(
+        update(Coupon).where(Coupon.code == "SZAMMA10").values(max_redemptions=3)
+    )
+    await db_session.commit()
+
+    results = await asyncio.gather(*[
+        client.post("/api/orders", json=order_payload(seed_menu.id, coupon_code="SZAMMA10"))
+        for _ in range(8)
+    ])
+
+    codes = [r.status_code for r in results]
+    assert (codes.count(201), codes.count(409)) == (3, 5)
+    assert len((await db_session.execute(select(Order))).scalars().all()) == 3
+
+
+async def test_writer_survives_a_failed_batch(db_engine):
+    session_factory = async_sessionmaker(
+        db_engine, class_=AsyncSession, expire_on_commit=False,
+    )
+    calls = []
+
+    def flaky_factory():
+        calls.append(None)
+        if len(calls) == 1:
+            raise ConnectionError("database went away")
+        return session_factory()
+
+    order_intake.start(flaky_factory, window=0.01)
+    try:
+        def build():
+            return Order(
+                delivery_mode="pickup", first_name="Jan", phone="123456789",
+                payment_method="cash", items_total=60, total=60,
+            )
+
+        with pytest.raises(ConnectionError):
+            await asyncio.wait_for(order_intake.writer.submit(build), 2)
+        order = await asyncio.wait_for(order_intake.writer.submit(build), 2)
+        assert order.id
+    finally:
+        await order_intake.stop()
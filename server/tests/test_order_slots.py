@@ -0,0 +1,205 @@
+import asyncio
+from datetime import date
+
+import pytest
+from sqlalchemy import event, select
+
+import order_slots
+from conftest import auth_header
+from models import Order, SlotLoad
+from tests.test_orders import order_payload
+
+DAY = "2030-01-15"
+
+
+@pytest.fixture
+def db_engine(file_db_engine):
+    # Concurrent submits need their own connections and transactions
+    return file_db_engine
+
+
+def scheduled(dish_id, slot, day=DAY):
+    return order_payload(dish_id, scheduled_date=day, scheduled_time=slot)
+
+
+async def get_slots(client, day=DAY):
+    res = await client.get("/api/order-slots", params={"date_str": day})
+    assert res.status_code == 200
+    return res.json()["slots"]
+
+
+async def test_slots_count_scheduled_orders(client, seed_menu):
+    for slot in ("19:00", "19:00", "19:30"):
+        await client.post("/api/orders", json=scheduled(seed_menu.id, slot))
+    await client.post("/api/orders", json=order_payload(seed_menu.id))  # ASAP order
+
+    assert await get_slots(client) == {"19:00": 2, "19:30": 1}
+    assert await get_slots(client, "2030-01-16") == {}
+
+
+async def test_slots_served_from_memory(client, seed_menu, db_engine):
+    await client.post("/api/orders", json=scheduled(seed_menu.id, "19:00"))
+    await get_slots(client)
+    statements = []
+    event.listen(
+        db_engine.sync_engine, "before_cursor_execute",
+        lambda conn, cursor, statement, *args: statements.append(statement.split()[0]),
+    )
+
+    await client.post("/api/orders", json=scheduled(seed_menu.id, "19:00"))
+    assert await get_slots(client) == {"19:00": 2}
+    assert "SELECT" not in statements
+
+
+async def test_cancellation_frees_slot(client, seed_menu, admin_user):
+    _, token = admin_user
+    first = (await client.post("/api/orders", json=scheduled(seed_menu.id, "19:00"))).json()
+    await client.post("/api/orders", json=scheduled(seed_menu.id, "19:00"))
+    assert await get_slots(client) == {"19:00": 2}
+
+    await client.patch(
+        f"/api/admin/orders/{first['id']}", json={"status": "cancelled"}, headers=auth_header(token),
+    )
+    assert await get_slots(client) == {"19:00": 1}
+
+    # Moving between other statuses doesn't touch the count
+    await client.patch(
+        f"/api/admin/orders/{first['id']}", json={"status": "confirmed"}, headers=auth_header(token),
+    )
+    await client.patch(
+        f"/api/admin/orders/{first['id']}", json={"status": "preparing"}, headers=auth_header(token),
+    )
+    assert await get_slots(client) == {"19:00": 2}
+
+
+async def test_rebuild_loads_upcoming_dates(seed_menu, db_session):
+    def order(slot, status="pending"):
+        return Order(
+            delivery_mode="pickup", first_name="Jan", phone="123456789", payment_method="cash",
+            items_total=60, total=60, scheduled_date=date(2030, 1, 15), scheduled_time=slot,
+            status=status,
+        )
+
+    db_session.add_all([order("12:00"), order("12:00", "confirmed"), order("12:30", "cancelled")])
+    await db_session.commit()
+
+    order_slots.reset()
+    try:
+        await order_slots.rebuild(db_session, today=date(2030, 1, 1))
+        # Written behind the counters' back, so only visible if the date was not preloaded
+        db_session.add(order("13:00"))
+        await db_session.commit()
+        assert await order_slots.get_slots(db_session, date(2030, 1, 15)) == {"12:00": 2}
+    finally:
+        order_slots.reset()
+
+
+# --- Kitchen capacity ---
+
+
+async def set_capacity(client, admin_user, **settings):
+    _, token = admin_user
+    res = await client.patch("/api/admin/settings", json=settings, headers=auth_header(token))
+    assert res.status_code == 200
+
+
+async def test_full_slot_rejected_with_suggestions(client, seed_menu):
+    for _ in range(2):  # default capacity: 2 orders per slot
+        assert (await client.post("/api/orders", json=scheduled(seed_menu.id, "19:00"))).status_code == 201
+
+    res = await client.post("/api/orders", json=scheduled(seed_menu.id, "19:00"))
+    assert res.status_code == 409
+    assert res.json()["detail"] == "Termin 19:00 jest już pełny. Wolne terminy: 19:30, 20:00, 20:30"
+
+    assert (await client.post("/api/orders", json=scheduled(seed_menu.id, "19:30"))).status_code == 201
+    slots = await client.get("/api/order-slots", params={"date_str": DAY})
+    assert slots.json() == {"date": DAY, "slots": {"19:00": 2, "19:30": 1}, "max_orders": 2}
+
+
+async def test_item_capacity(client, seed_menu, admin_user):
+    await set_capacity(client, admin_user, slot_max_orders="", slot_max_items="5")
+
+    def items(quantity):
+        return scheduled(seed_menu.id, "21:30") | {"items": [{"dish_id": seed_menu.id, "quantity": quantity}]}
+
+    assert (await client.post("/api/orders", json=items(3))).status_code == 201
+    res = await client.post("/api/orders", json=items(3))
+    assert res.status_code == 409
+    assert res.json()["detail"].endswith("Wolne terminy: 22:00")
+    # No order-count limit now, so a smaller order still fits
+    assert (await client.post("/api/orders", json=items(2))).status_code == 201
+
+
+async def test_cancellation_frees_capacity(client, seed_menu, admin_user):
+    _, token = admin_user
+    first = (await client.post("/api/orders", json=scheduled(seed_menu.id, "19:00"))).json()
+    await client.post("/api/orders", json=scheduled(seed_menu.id, "19:00"))
+    assert (await client.post("/api/orders", json=scheduled(seed_menu.id, "19:00"))).status_code == 409
+
+    await client.patch(
+        f"/api/admin/orders/{first['id']}", json={"status": "cancelled"}, headers=auth_header(token),
+    )
+    assert (await client.post("/api/orders", json=scheduled(seed_menu.id, "19:00"))).status_code == 201
+
+
+async def test_capacity_counts_orders_placed_before_the_limit(client, seed_menu, db_session):
+    # Orders without a slot_load row, e.g. from before the migration
+    db_session.add_all([
+        Order(
+            delivery_mode="pickup", first_name="Jan", phone="123456789", payment_method="cash",
+            items_total=60, total=60, scheduled_date=date(2030, 1, 15), scheduled_time="19:00",
+        )
+        for _ in range(2)
+    ])
+    await db_session.commit()
+
+    res = await client.post("/api/orders", json=scheduled(seed_menu.id, "19:00"))
+    assert res.status_code == 409
+
+
+async def test_capacity_holds_under_concurrent_submits(client, seed_menu, admin_user, db_session):
+    await set_capacity(client, admin_user, slot_max_orders="5")
+    await client.get("/api/menu")
+
+    results = await asyncio.gather(*[
+        client.post("/api/orders", json=scheduled(seed_menu.id, "19:00")) for _ in range(60)
+    ])
+
+    codes = [r.status_code for r in results]
+    assert (codes.count(201), codes.count(409)) == (5, 55)
+    load = (await db_session.execute(select(SlotLoad))).scalar_one()
+    assert (load.orders, load.items) == (5, 10)
+    assert await get_slots(client) == {"19:00": 5}
+
+
+async def test_bulk_status_change_updates_each_slot_once(client, seed_menu, admin_user, db_session, db_engine):
+    _, token = admin_user
+    await set_capacity(client, admin_user, slot_max_orders="5")
+    ids = [
+        (await client.post("/api/orders", json=scheduled(seed_menu.id, slot))).json()["id"]
+        for slot in ["19:00", "19:00", "19:00", "19:30", "19:30"]
+    ]
+
+    async def bulk(ids, status):
+        statements = []
+        listener = lambda conn, cursor, statement, *args: statements.append(statement)
+        event.listen(db_engine.sync_engine, "before_cursor_execute", listener)
+        res = await client.patch(
+            "/api/admin/orders/bulk", json={"ids": ids, "status": status}, headers=auth_header(token),
+        )
+        event.remove(db_engine.sync_engine, "before_cursor_execute", listener)
+        assert res.status_code == 200
+        return [s for s in statements if s.startswith("UPDATE slot_load")]
+
+    async def loads():
+        db_session.expire_all()
+        rows = (await db_session.execute(select(SlotLoad).order_by(SlotLoad.scheduled_time))).scalars()
+        return [(row.scheduled_time, row.orders, row.items) for row in rows]
+
+    assert len(await bulk(ids, "cancelled")) == 2
+    assert await loads() == [("19:00", 0, 0), ("19:30", 0, 0)]
+    # Already cancelled: nothing to move
+    assert await bulk(ids[:2], "cancelled") == []
+    assert len(await bulk(ids[:2] + ids[3:4], "pending")) == 2
+    assert await loads() == [("19:00", 2, 4), ("19:30", 1, 2)]
+    assert await get_slots(client) == {"19:00": 2, "19:30": 1}
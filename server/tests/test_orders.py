@@ -1,5 +1,12 @@
+import asyncio
+from decimal import Decimal
+
 import pytest
+from sqlalchemy import event, select, update
+
 from conftest import auth_header
+from idempotency import IdempotencyStore
+from models import DishIngredient, Notification, Order, OrderItem
 
 
 def order_payload(dish_id, **overrides):
@@ -135,6 +142,52 @@ async def test_validate_coupon_invalid(client):
     assert res.json()["valid"] is False
 
 
+async def test_validate_coupon_served_from_registry(client, seed_coupon, db_engine):
+    await client.post("/api/coupons/validate", json={"code": "szamma10"})
+    statements = []
+    event.listen(
+        db_engine.sync_engine, "before_cursor_execute",
+        lambda conn, cursor, statement, *args: statements.append(statement),
+    )
+
+    for code in ("SZAMMA10", "szamma10", "FAKE"):
+        await client.post("/api/coupons/validate", json={"code": code})
+
+    assert statements == []
+
+
+async def test_admin_coupon_changes_reach_registry(client, seed_coupon, admin_user):
+    _, token = admin_user
+    headers = auth_header(token)
+
+    async def valid(code):
+        res = await client.post("/api/coupons/validate", json={"code": code})
+        return res.json()["valid"]
+
+    assert await valid("SZAMMA10")
+
+    res = await client.post(
+        "/api/admin/coupons",
+        json={"code": "lato", "discount_type": "fixed", "discount_amount": "15"},
+        headers=headers,
+    )
+    assert await valid("LATO")
+
+    await client.patch(
+        f"/api/admin/coupons/{seed_coupon.id}", json={"code": "jesien"}, headers=headers,
+    )
+    assert not await valid("SZAMMA10")
+    assert await valid("jesien")
+
+    await client.patch(
+        f"/api/admin/coupons/{seed_coupon.id}", json={"is_active": False}, headers=headers,
+    )
+    assert not await valid("JESIEN")
+
+    await client.delete(f"/api/admin/coupons/{res.json()['id']}", headers=headers)
+    assert not await valid("LATO")
+
+
 # --- Menu & Categories ---
 
 
@@ -161,3 +214,211 @@ async def test_get_menu_empty(client):
     res = await client.get("/api/menu")
     assert res.status_code == 200
     assert res.json() == []
+
+
+# --- Pricing ---
+
+
+async def test_create_order_prices_extras_and_surcharges(client, seed_menu, db_session):
+    di = (await db_session.execute(select(DishIngredient))).scalar_one()
+    di.additional_price = Decimal("4")
+    await db_session.commit()
+
+    item = {
+        "dish_id": seed_menu.id,
+        "quantity": 2,
+        "ingredients": [{"name": "Ser", "included": True, "price": "4"}],
+        "extras": [{"name": "Jalapeño", "price": "5"}, {"name": "Nieznany", "price": "1"}],
+    }
+    res = await client.post("/api/orders", json=order_payload(seed_menu.id, items=[item]))
+    assert res.status_code == 201
+    data = res.json()
+    assert float(data["items"][0]["item_total"]) == 78  # (30 + 4 + 5) * 2
+    assert float(data["total"]) == 78
+
+
+async def test_order_items_store_only_changes(client, seed_menu, db_session):
+    as_served = {"dish_id": seed_menu.id, "quantity": 1, "ingredients": [{"name": "Ser", "included": True}]}
+    changed = {
+        "dish_id": seed_menu.id,
+        "quantity": 1,
+        "ingredients": [{"name": "Ser", "included": False}, {"name": "Nieznany", "included": True}],
+        "extras": [{"name": "Jalapeño", "price": "5"}, {"name": "Nieznany", "price": "1"}],
+    }
+    res = await client.post("/api/orders", json=order_payload(seed_menu.id, items=[as_served, changed]))
+    plain, custom = res.json()["items"]
+
+    assert plain["ingredients_snapshot"] is None and plain["extras_snapshot"] is None
+    # Objects, not JSON strings; unknown names aren't kept
+    assert custom["ingredients_snapshot"] == {"removed": ["Ser"], "added": []}
+    assert custom["extras_snapshot"] == [{"name": "Jalapeño", "price": "5.00"}]
+
+    item = await db_session.get(OrderItem, custom["id"])
+    assert item.ingredients_snapshot == {"removed": ["Ser"]}
+    # SQL NULL, not a JSON null
+    unchanged = await db_session.execute(
+        select(OrderItem.id)
+        .where(OrderItem.ingredients_snapshot.is_(None), OrderItem.extras_snapshot.is_(None))
+    )
+    assert unchanged.scalars().all() == [plain["id"]]
+
+
+async def test_order_items_stored_as_full_list_still_read(client, seed_menu, db_session):
+    res = await client.post("/api/orders", json=order_payload(seed_menu.id))
+    order = res.json()
+    # The shape items had before only the changes were stored
+    await db_session.execute(
+        update(OrderItem).where(OrderItem.order_id == order["id"]).values(ingredients_snapshot=[
+            {"name": "Ser", "included": False, "price": 0},
+            {"name": "Bekon", "included": True, "price": 4},
+            {"name": "Sos", "included": True, "price": 0},
+        ])
+    )
+    await db_session.commit()
+
+    res = await client.get(f"/api/orders/{order['id']}")
+    assert res.json()["items"][0]["ingredients_snapshot"] == {
+        "removed": ["Ser"], "added": [{"name": "Bekon", "price": "4"}],
+    }
+
+
+async def test_create_order_rejects_dish_deactivated_by_admin(client, seed_menu, admin_user):
+    _, token = admin_user
+    await client.get("/api/menu")  # warm the snapshot
+    await client.patch(
+        f"/api/admin/dishes/{seed_menu.id}",
+        json={"is_active": False},
+        headers=auth_header(token),
+    )
+    res = await client.post("/api/orders", json=order_payload(seed_menu.id))
+    assert res.status_code == 400
+
+
+# --- Cart quote ---
+
+
+async def test_quote_cart_matches_order_pricing(client, seed_menu):
+    item = {"dish_id": seed_menu.id, "quantity": 2, "extras": [{"name": "Jalapeño", "price": "5"}]}
+    res = await client.post(
+        "/api/cart/quote", json={"items": [item], "coupon_code": "szamma10"},
+    )
+    assert res.status_code == 200
+    quote = res.json()
+    assert float(quote["lines"][0]["unit_price"]) == 35
+    assert float(quote["items_total"]) == 70
+    assert float(quote["discount"]) == 7
+    assert float(quote["total"]) == 63
+    assert quote["meets_minimum"] is True
+    assert quote["coupon_valid"] is True
+
+    order = await client.post(
+        "/api/orders", json=order_payload(seed_menu.id, items=[item], coupon_code="SZAMMA10"),
+    )
+    assert float(order.json()["total"]) == float(quote["total"])
+
+
+async def test_quote_cart_writes_nothing(client, seed_menu, db_session):
+    res = await client.post("/api/cart/quote", json={"items": [{"dish_id": seed_menu.id, "quantity": 1}]})
+    assert res.json()["meets_minimum"] is False
+    assert res.json()["coupon_valid"] is None
+    assert (await db_session.execute(select(Order))).scalars().all() == []
+
+
+async def test_quote_cart_invalid_coupon_and_unknown_dish(client, seed_menu):
+    res = await client.post(
+        "/api/cart/quote",
+        json={"items": [{"dish_id": seed_menu.id, "quantity": 2}], "coupon_code": "FAKE"},
+    )
+    assert res.json()["coupon_valid"] is False
+    assert float(res.json()["discount"]) == 0
+
+    res = await client.post("/api/cart/quote", json={"items": [{"dish_id": 99999, "quantity": 1}]})
+    assert res.status_code == 400
+
+
+# --- Idempotency-Key ---
+
+
+async def test_create_order_idempotent_retry(client, seed_menu, db_session):
+    headers = {"Idempotency-Key": "3b6f0c1e-retry"}
+    first = await client.post("/api/orders", json=order_payload(seed_menu.id), headers=headers)
+    retry = await client.post("/api/orders", json=order_payload(seed_menu.id), headers=headers)
+
+    assert first.status_code == retry.status_code == 201
+    assert retry.json() == first.json()
+    assert retry.headers["idempotent-replayed"] == "true"
+    assert len((await db_session.execute(select(Order))).scalars().all()) == 1
+
+
+async def test_create_order_concurrent_duplicates_insert_once(client, seed_menu, db_session):
+    headers = {"Idempotency-Key": "3b6f0c1e-concurrent"}
+    results = await asyncio.gather(*[
+        client.post("/api/orders", json=order_payload(seed_menu.id), headers=headers)
+        for _ in range(5)
+    ])
+    assert {r.json()["id"] for r in results} == {results[0].json()["id"]}
+    assert len((await db_session.execute(select(Order))).scalars().all()) == 1
+
+
+async def test_create_order_idempotency_key_reused_for_other_payload(client, seed_menu):
+    headers = {"Idempotency-Key": "3b6f0c1e-mismatch"}
+    await client.post("/api/orders", json=order_payload(seed_menu.id), headers=headers)
+    res = await client.post(
+        "/api/orders", json=order_payload(seed_menu.id, notes="bez cebuli"), headers=headers,
+    )
+    assert res.status_code == 422
+
+
+async def test_create_order_failed_attempt_not_stored(client, seed_menu):
+    headers = {"Idempotency-Key": "3b6f0c1e-failed"}
+    bad = order_payload(seed_menu.id, items=[{"dish_id": seed_menu.id, "quantity": 1}])
+    assert (await client.post("/api/orders", json=bad, headers=headers)).status_code == 400
+    assert (await client.post("/api/orders", json=bad, headers=headers)).status_code == 400
+
+
+async def test_create_order_without_key_not_deduplicated(client, seed_menu):
+    first = await client.post("/api/orders", json=order_payload(seed_menu.id))
+    second = await client.post("/api/orders", json=order_payload(seed_menu.id))
+    assert first.json()["id"] != second.json()["id"]
+
+
+async def test_idempotency_store_bounded():
+    store = IdempotencyStore(ttl=60, max_keys=2)
+
+    async def make(value):
+        return value
+
+    for key in ("a", "b", "c"):
+        await store.run(key, "fp", lambda key=key: make(key))
+    # "a" was evicted, so it runs again instead of replaying
+    assert await store.run("a", "fp", lambda: make("a2")) == ("a2", False)
+    assert await store.run("c", "fp", lambda: make("c2")) == ("c", True)
+
+
+# --- Write path ---
+
+
+async def test_create_order_single_transaction(client, seed_menu, db_engine, db_session):
+    await client.get("/api/menu")  # warm the snapshot so only the write is counted
+    statements, commits = [], []
+    event.listen(
+        db_engine.sync_engine, "before_cursor_execute",
+        lambda conn, cursor, statement, *args: statements.append(statement.split()[0]),
+    )
+    event.listen(db_engine.sync_engine, "commit", commits.append)
+
+    res = await client.post("/api/orders", json=order_payload(seed_menu.id))
+
+    assert res.status_code == 201
+    assert res.json()["items"][0]["id"]
+    # Order, item and notification inserts, then the day's sales rollups
+    # (created on first use); no refresh SELECTs; one commit
+    assert statements == [
+        "INSERT", "INSERT", "INSERT",
+        "UPDATE", "SAVEPOINT", "INSERT", "RELEASE",
+        "UPDATE", "SAVEPOINT", "INSERT", "RELEASE",
+    ]
+    assert len(commits) == 1
+
+    notification = (await db_session.execute(select(Notification))).scalar_one()
+    assert notification.title == f"Nowe zamówienie #{res.json()['id']}"
@@ -0,0 +1,176 @@
+import gzip
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+
+import pytest
+from sqlalchemy import event
+
+from conftest import auth_header
+from models import EventBanner
+from tests.test_orders import order_payload
+
+
+@pytest.fixture
+async def seed_banner(db_session):
+    banner = EventBanner(
+        title="Walentynki", subtitle="Kolacja dla dwojga",
+        image_url="https://example.com/valentines.jpg", is_active=True,
+    )
+    db_session.add(banner)
+    await db_session.commit()
+    return banner
+
+
+# --- Precompressed variants ---
+
+
+async def test_menu_served_gzip_when_accepted(client, seed_menu):
+    res = await client.get("/api/menu", headers={"Accept-Encoding": "gzip"})
+    assert res.status_code == 200
+    assert res.headers["content-encoding"] == "gzip"
+    assert "accept-encoding" in res.headers["vary"].lower()
+    assert res.json()[0]["name"] == "Margherita"  # httpx decodes transparently
+
+
+async def test_menu_identity_when_gzip_refused(client, seed_menu):
+    res = await client.get("/api/menu", headers={"Accept-Encoding": "gzip;q=0, identity"})
+    assert "content-encoding" not in res.headers
+    assert res.json()[0]["name"] == "Margherita"
+
+
+async def test_encoded_variants_share_validator(client, seed_menu):
+    plain = await client.get("/api/menu", headers={"Accept-Encoding": "identity"})
+    gz = await client.get("/api/menu", headers={"Accept-Encoding": "gzip"})
+    assert plain.headers["etag"] != gz.headers["etag"]
+
+    res = await client.get(
+        "/api/menu",
+        headers={"Accept-Encoding": "identity", "If-None-Match": gz.headers["etag"]},
+    )
+    assert res.status_code == 304
+
+
+async def test_brotli_preferred_when_installed(client, seed_menu):
+    pytest.importorskip("brotli")
+    res = await client.get("/api/menu", headers={"Accept-Encoding": "gzip, br"})
+    assert res.headers["content-encoding"] == "br"
+
+
+def test_gzip_variant_is_stored_once():
+    from http_cache import CachedPayload
+
+    payload = CachedPayload.from_obj([{"name": "Margherita", "image": "x" * 500}])
+    assert gzip.decompress(payload.gzip) == payload.body
+    assert payload.variant("gzip") is payload.gzip
+
+
+# --- Event banners & site config ---
+
+
+async def test_event_banners_cached_until_admin_change(client, seed_banner, admin_user):
+    _, token = admin_user
+    first = await client.get("/api/event-banners")
+    assert [b["title"] for b in first.json()] == ["Walentynki"]
+
+    res = await client.get("/api/event-banners", headers={"If-None-Match": first.headers["etag"]})
+    assert res.status_code == 304
+
+    await client.patch(
+        f"/api/admin/event-banners/{seed_banner.id}",
+        json={"is_active": False},
+        headers=auth_header(token),
+    )
+    res = await client.get("/api/event-banners", headers={"If-None-Match": first.headers["etag"]})
+    assert res.status_code == 200
+    assert res.json() == []
+
+
+async def test_site_config_refreshed_after_settings_update(client, admin_user):
+    _, token = admin_user
+    assert (await client.get("/api/site-config")).json() == {"phone": "+48 123 456 789"}
+
+    await client.patch(
+        "/api/admin/settings",
+        json={"phone": "+48 500 600 700"},
+        headers=auth_header(token),
+    )
+    assert (await client.get("/api/site-config")).json() == {"phone": "+48 500 600 700"}
+
+
+# --- Order reads revalidated from updated_at ---
+
+
+async def test_order_not_modified_until_status_changes(client, seed_menu, admin_user, db_engine):
+    _, token = admin_user
+    order = (await client.post("/api/orders", json=order_payload(seed_menu.id))).json()
+    first = await client.get(f"/api/orders/{order['id']}")
+    etag = first.headers["etag"]
+    assert etag.startswith('W/"') and "last-modified" in first.headers
+
+    statements = []
+    event.listen(
+        db_engine.sync_engine, "before_cursor_execute",
+        lambda conn, cursor, statement, *args: statements.append(statement),
+    )
+    res = await client.get(f"/api/orders/{order['id']}", headers={"If-None-Match": etag})
+    assert res.status_code == 304
+    assert res.headers["etag"] == etag
+    # Only the count/max query; neither the order nor its items are loaded
+    assert len(statements) == 1 and "max(" in statements[0]
+    assert "order_items" not in statements[0]
+
+    await client.patch(
+        f"/api/admin/orders/{order['id']}", json={"status": "confirmed"},
+        headers=auth_header(token),
+    )
+    res = await client.get(f"/api/orders/{order['id']}", headers={"If-None-Match": etag})
+    assert res.status_code == 200
+    assert res.json()["status"] == "confirmed"
+
+
+async def test_order_lists_not_modified(client, seed_menu, admin_user, registered_user):
+    _, admin_token = admin_user
+    _, user_token = registered_user
+    for path, token in [("/api/admin/orders", admin_token), ("/api/my-orders", user_token)]:
+        first = await client.get(path, headers=auth_header(token))
+        res = await client.get(
+            path, headers={**auth_header(token), "If-None-Match": first.headers["etag"]},
+        )
+        assert res.status_code == 304, path
+
+        # A new order joins both lists
+        await client.post(
+            "/api/orders", json=order_payload(seed_menu.id), headers=auth_header(user_token),
+        )
+        res = await client.get(
+            path, headers={**auth_header(token), "If-None-Match": first.headers["etag"]},
+        )
+        assert res.status_code == 200, path
+        assert res.headers["etag"] != first.headers["etag"]
+
+
+async def test_order_lists_scoped(client, seed_menu, admin_user):
+    _, token = admin_user
+    all_orders = await client.get("/api/admin/orders", headers=auth_header(token))
+    cancelled = await client.get("/api/admin/orders?status=cancelled", headers=auth_header(token))
+    # Both empty, but a 304 for one must not be reused for the other
+    assert all_orders.headers["etag"] != cancelled.headers["etag"]
+
+
+async def test_order_if_modified_since(client, seed_menu):
+    order = (await client.post("/api/orders", json=order_payload(seed_menu.id))).json()
+    first = await client.get(f"/api/orders/{order['id']}")
+    since = first.headers["last-modified"]
+    # The database's naive timestamps are UTC
+    assert abs(parsedate_to_datetime(since) - datetime.now(timezone.utc)) < timedelta(minutes=1)
+    # The client echoes what it was sent
+    res = await client.get(f"/api/orders/{order['id']}", headers={"If-Modified-Since": since})
+    assert res.status_code == 304
+    earlier = format_datetime(parsedate_to_datetime(since) - timedelta(seconds=1), usegmt=True)
+    res = await client.get(f"/api/orders/{order['id']}", headers={"If-Modified-Since": earlier})
+    assert res.status_code == 200
+    res = await client.get(
+        f"/api/orders/{order['id']}",
+        headers={"If-Modified-Since": "Fri, 01 Jan 2100 00:00:00 GMT"},
+    )
+    assert res.status_code == 304
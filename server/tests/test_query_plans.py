@@ -0,0 +1,131 @@
+"""
+Query plan regression tests. A large dataset is seeded, the read endpoints
+are called, and every SELECT they run is EXPLAINed with its own parameters:
+none may read a whole big table. A full scan of an index (ORDER BY ... LIMIT
+walks one) is fine.
+"""
+
+import re
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import event, insert, text
+
+from conftest import auth_header
+from models import Notification, Order, OrderItem, Reservation, RestaurantTable, User
+
+ORDERS = 6000
+STATUSES = ["pending", "confirmed", "preparing", "delivering", "completed", "cancelled"]
+BIG_TABLES = {"orders", "order_items", "reservations", "notifications", "orders_archive"}
+
+# SQLite: "SCAN orders" reads the table; "SCAN orders USING INDEX ..." walks an index
+SQLITE_TABLE_SCAN = re.compile(r"\bSCAN (\w+)(?: AS \w+)?$")
+POSTGRES_TABLE_SCAN = re.compile(r"Seq Scan on (\w+)")
+
+
+@pytest.fixture
+async def big_dataset(db_session, seed_menu, registered_user, admin_user):
+    user, _ = registered_user
+    today = date.today()
+    start = datetime.now() - timedelta(days=365)
+    table = RestaurantTable(label="T1", seats=4, zone="indoor")
+    db_session.add(table)
+    await db_session.flush()
+
+    orders = [
+        {
+            "id": n + 1, "user_id": user.id if n % 50 == 0 else None,
+            "status": STATUSES[n % len(STATUSES)],
+            "delivery_mode": "delivery" if n % 3 else "pickup",
+            "first_name": "Jan", "phone": "123456789", "payment_method": "cash",
+            "scheduled_date": today + timedelta(days=n % 400 - 200) if n % 4 == 0 else None,
+            "scheduled_time": "18:00" if n % 4 == 0 else None,
+            "items_total": Decimal("60"), "delivery_fee": Decimal("0"),
+            "discount": Decimal("0"), "total": Decimal("60"),
+            "created_at": start + timedelta(minutes=90 * n),
+            "updated_at": start + timedelta(minutes=90 * n),
+        }
+        for n in range(ORDERS)
+    ]
+    await db_session.execute(insert(Order), orders)
+    await db_session.execute(insert(OrderItem), [
+        {
+            "order_id": n + 1, "dish_id": seed_menu.id, "dish_name": "Margherita",
+            "base_price": Decimal("30"), "quantity": 2, "item_total": Decimal("60"),
+        }
+        for n in range(ORDERS)
+    ])
+    await db_session.execute(insert(Reservation), [
+        {
+            "table_id": table.id, "user_id": user.id if n % 50 == 0 else admin_user[0].id,
+            "reservation_date": today + timedelta(days=n % 600 - 300),
+            "start_time": "19:00", "guest_name": "Jan", "guest_phone": "123456789",
+            "status": "confirmed" if n % 5 else "cancelled",
+        }
+        for n in range(ORDERS)
+    ])
+    await db_session.execute(insert(Notification), [
+        {
+            "type": "order", "title": f"#{n}", "message": "", "is_read": n < ORDERS - 20,
+            "created_at": start + timedelta(minutes=90 * n),
+        }
+        for n in range(ORDERS)
+    ])
+    await db_session.commit()
+    await db_session.execute(text("ANALYZE"))
+    await db_session.commit()
+
+
+async def table_scans(db_engine, statements) -> list[tuple[str, str]]:
+    """(table, statement) for each statement whose plan reads a whole big table."""
+    postgres = db_engine.dialect.name == "postgresql"
+    scans = []
+    async with db_engine.connect() as conn:
+        for statement, parameters in statements:
+            explain = "EXPLAIN " if postgres else "EXPLAIN QUERY PLAN "
+            rows = (await conn.exec_driver_sql(explain + statement, parameters)).all()
+            for row in rows:
+                line = row[0] if postgres else row[-1]
+                match = (POSTGRES_TABLE_SCAN if postgres else SQLITE_TABLE_SCAN).search(line)
+                if match and match.group(1) in BIG_TABLES:
+                    scans.append((match.group(1), statement))
+    return scans
+
+
+async def test_read_endpoints_use_indexes(client, db_engine, big_dataset, registered_user, admin_user):
+    _, user_token = registered_user
+    _, admin_token = admin_user
+    admin, user = auth_header(admin_token), auth_header(user_token)
+    today = date.today().isoformat()
+    requests = [
+        ("/api/orders/4321", {}),
+        ("/api/my-orders", user),
+        (f"/api/order-slots?date_str={today}", {}),
+        (f"/api/reservations/availability?date_str={today}", user),
+        ("/api/my-reservations", user),
+        ("/api/admin/orders", admin),
+        ("/api/admin/orders?after=3000", admin),
+        ("/api/admin/orders?status=pending", admin),
+        (f"/api/admin/orders?date_from={today}&date_to={today}", admin),
+        ("/api/admin/orders/4321/items", admin),
+        (f"/api/admin/reservations?date_from={today}", admin),
+        ("/api/admin/notifications?unread_only=true", admin),
+        ("/api/admin/stats", admin),
+    ]
+
+    for path, headers in requests:
+        statements = []
+
+        def capture(conn, cursor, statement, parameters, context, executemany):
+            if statement.lstrip().upper().startswith(("SELECT", "WITH")):
+                statements.append((statement, parameters))
+
+        event.listen(db_engine.sync_engine, "before_cursor_execute", capture)
+        try:
+            res = await client.get(path, headers=headers)
+        finally:
+            event.remove(db_engine.sync_engine, "before_cursor_execute", capture)
+        assert res.status_code == 200, path
+        assert statements, path
+        assert await table_scans(db_engine, statements) == [], path
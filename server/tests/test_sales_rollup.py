@@ -0,0 +1,110 @@
+from datetime import date, datetime
+from decimal import Decimal
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+import order_archive
+import sales_rollup
+from conftest import auth_header
+from models import DailyDishSales, DailySales, Order
+from tests.test_admin_orders import place_orders
+from tests.test_orders import order_payload
+
+
+async def rollups(db_session):
+    db_session.expire_all()
+    days = (await db_session.execute(select(DailySales).order_by(DailySales.day))).scalars().all()
+    dishes = (await db_session.execute(
+        select(DailyDishSales).order_by(DailyDishSales.day, DailyDishSales.dish_id)
+    )).scalars().all()
+    return (
+        [(d.day, d.orders, d.completed, d.cancelled, d.revenue, d.discount,
+          d.delivery_orders, d.pickup_orders) for d in days],
+        [(d.day, d.dish_id, d.quantity, d.revenue) for d in dishes],
+    )
+
+
+async def test_orders_and_status_changes_kept_in_rollup(client, seed_menu, admin_user, db_session):
+    _, token = admin_user
+    dish_id = seed_menu.id
+    first, _ = await place_orders(client, dish_id, 2)
+    await client.post("/api/orders", json=order_payload(
+        dish_id, delivery_mode="pickup", coupon_code="SZAMMA10",
+        city=None, street=None, house_number=None,
+    ))
+    day = sales_rollup.business_day((await db_session.get(Order, first)).created_at)
+    # The dashboard's "today" comes from the same clock
+    assert await sales_rollup.today(db_session) == day
+
+    days, dishes = await rollups(db_session)
+    # 60 + 60 + 54 (10% off the pickup order)
+    assert days == [(day, 3, 0, 0, Decimal("174"), Decimal("6"), 2, 1)]
+    assert dishes == [(day, dish_id, 6, Decimal("180"))]
+
+    async def set_status(status):
+        await client.patch(
+            f"/api/admin/orders/{first}", json={"status": status}, headers=auth_header(token),
+        )
+
+    await set_status("completed")
+    assert (await rollups(db_session))[0] == [(day, 3, 1, 0, Decimal("174"), Decimal("6"), 2, 1)]
+    await set_status("cancelled")
+    days, dishes = await rollups(db_session)
+    assert days == [(day, 2, 0, 1, Decimal("114"), Decimal("6"), 1, 1)]
+    assert dishes == [(day, dish_id, 4, Decimal("120"))]
+    await set_status("pending")
+    assert (await rollups(db_session))[0] == [(day, 3, 0, 0, Decimal("174"), Decimal("6"), 2, 1)]
+
+
+async def test_backfill_matches_incremental(client, seed_menu, admin_user, db_session):
+    _, token = admin_user
+    dish_id = seed_menu.id
+    ids = await place_orders(client, dish_id, 3)
+    await client.patch(
+        f"/api/admin/orders/{ids[0]}", json={"status": "cancelled"}, headers=auth_header(token),
+    )
+    await client.patch(
+        f"/api/admin/orders/{ids[1]}", json={"status": "completed"}, headers=auth_header(token),
+    )
+    # Placed before the rollups existed
+    await db_session.execute(
+        update(Order).where(Order.id == ids[2]).values(created_at=datetime(2025, 3, 1, 12))
+    )
+    await db_session.commit()
+    kept = await rollups(db_session)
+
+    assert await sales_rollup.backfill(db_session) == 2
+    await db_session.commit()
+    days, dishes = await rollups(db_session)
+    assert days[0] == (date(2025, 3, 1), 1, 0, 0, Decimal("60"), Decimal("0"), 1, 0)
+    # The incremental rows for today agree with the recomputed ones
+    assert days[1] == kept[0][0][:1] + (1, 1, 1, Decimal("60"), Decimal("0"), 1, 0)
+    assert dishes[1] == (days[1][0], dish_id, 2, Decimal("60"))
+
+    # A range only touches its own days
+    assert await sales_rollup.backfill(db_session, date(2025, 3, 1), date(2025, 3, 1)) == 1
+    await db_session.commit()
+    assert await rollups(db_session) == (days, dishes)
+
+
+async def test_backfill_counts_archived_orders(client, seed_menu, admin_user, db_session, db_engine):
+    _, token = admin_user
+    ids = await place_orders(client, seed_menu.id, 3)
+    for order_id, status in [(ids[0], "completed"), (ids[1], "cancelled")]:
+        await client.patch(
+            f"/api/admin/orders/{order_id}", json={"status": status}, headers=auth_header(token),
+        )
+    await db_session.execute(
+        update(Order).where(Order.id.in_(ids[:2])).values(created_at=datetime(2025, 3, 1, 12))
+    )
+    await db_session.commit()
+    await sales_rollup.backfill(db_session)
+    await db_session.commit()
+    before = await rollups(db_session)
+
+    moved = await order_archive.archive(async_sessionmaker(db_engine, expire_on_commit=False), days=30)
+    assert moved == 2
+    await sales_rollup.backfill(db_session)
+    await db_session.commit()
+    assert await rollups(db_session) == before